@@ -7,6 +7,8 @@ import os
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 OUTPUT_DIR = os.path.join(PROJECT_ROOT, "output")
 SHARED_DIR = os.path.join(PROJECT_ROOT, "shared")
+# Banco GeoPackage com todas as camadas baixadas (uma tabela por camada, com índices).
+STORE_PATH = os.path.join(OUTPUT_DIR, "0-brasil.gpkg")
 sys.path.insert(0, PROJECT_ROOT)
 
 # =============================================================================
@@ -25,6 +27,18 @@ try:
     )
     # <--- NOVO: Importa a nova função genérica com um alias claro
     from use_cases.map_generators.generate_clipped_regions_map import execute as gerar_mapa_regioes_recortadas
+    from use_cases.map_generators.generate_tiles import execute as gerar_tiles
+    from use_cases.map_generators.generate_national_municipalities_map import execute as gerar_mapa_nacional_municipios
+    from use_cases.map_generators.generate_dot_density_map import execute as gerar_mapa_densidade_pontos
+    from use_cases.map_generators.generate_grid_map import execute as gerar_mapa_grade
+    from use_cases.map_server import MapServerUseCase
+    from use_cases.aggregate_points import AggregatePointsUseCase
+    from use_cases.spatial_analysis import SpatialAnalysisUseCase
+    from use_cases.crawl_municipalities import CrawlMunicipalitiesUseCase
+    from shared.dataset_store import prefer_store
+    from shared.file_utils import dataset_exists
+    # Lista os arquivos de municípios em qualquer formato aceito (.geojson, .geojson.gz, .geojson.zst).
+    from shared.region_dissolver import find_municipality_files
 
 except ImportError as e:
     print(f"ERRO DE IMPORTAÇÃO: {e}\nVerifique se todas as pastas e arquivos '__init__.py' estão corretos.")
@@ -51,7 +65,7 @@ def run_states():
         if input(f"   -> Arquivo já existe. Baixar novamente? (s/n): ").lower() != 's':
             print("     Download pulado."); return
     uc = FetchStatesUseCase()
-    uc.execute(output_filename=output_filename)
+    uc.execute(output_filename=output_filename, store_path=STORE_PATH)
     print("--- Tarefa Concluída! ---")
 
 def run_municipalities():
@@ -63,7 +77,7 @@ def run_municipalities():
         if input(f"   -> Arquivo já existe. Baixar novamente? (s/n): ").lower() != 's':
             print("     Download pulado."); return
     uc = FetchMunicipalitiesUseCase()
-    uc.execute(state_abbreviation=uf, output_filename=output_filename)
+    uc.execute(state_abbreviation=uf, output_filename=output_filename, store_path=STORE_PATH)
     print("--- Tarefa Concluída! ---")
 
 def run_immediate_regions():
@@ -72,8 +86,11 @@ def run_immediate_regions():
     if os.path.exists(output_filename):
         if input(f"   -> Arquivo já existe. Baixar novamente? (s/n): ").lower() != 's':
             print("     Download pulado."); return
+    modo = 'api'
+    if input("   -> Gerar a partir dos municípios já baixados, sem baixar as malhas? (s/n): ").lower() == 's':
+        modo = 'dissolve'
     uc = FetchImmediateRegionsUseCase()
-    uc.execute(output_filename=output_filename)
+    uc.execute(output_filename=output_filename, mode=modo, municipalities_dir=OUTPUT_DIR, store_path=STORE_PATH)
     print("--- Tarefa Concluída! ---")
 
 def run_intermediate_regions():
@@ -82,8 +99,24 @@ def run_intermediate_regions():
     if os.path.exists(output_filename):
         if input(f"   -> Arquivo já existe. Baixar novamente? (s/n): ").lower() != 's':
             print("     Download pulado."); return
+    modo = 'api'
+    if input("   -> Gerar a partir dos municípios já baixados, sem baixar as malhas? (s/n): ").lower() == 's':
+        modo = 'dissolve'
     uc = FetchIntermediateRegionsUseCase()
-    uc.execute(output_filename=output_filename)
+    uc.execute(output_filename=output_filename, mode=modo, municipalities_dir=OUTPUT_DIR, store_path=STORE_PATH)
+    print("--- Tarefa Concluída! ---")
+
+def run_crawl_municipalities():
+    ufs = input("   -> Siglas dos Estados separadas por vírgula (Enter para todos): ").upper()
+    estados = [uf.strip() for uf in ufs.split(',') if uf.strip()] or None
+    if estados and any(len(uf) != 2 for uf in estados): print("   -> Sigla inválida."); return
+    processos = input("   -> Número de processos (Enter para 1): ") or "1"
+    if not processos.isdigit() or int(processos) < 1: print("   -> Número inválido."); return
+    repetir = input("   -> Tentar de novo os jobs que falharam antes? (s/n): ").lower() == 's'
+    print("\n--- Tarefa: RASTREAMENTO RETOMÁVEL DOS MUNICÍPIOS ---")
+    print("   -> Se for interrompido, execute novamente: o rastreamento continua de onde parou.")
+    uc = CrawlMunicipalitiesUseCase()
+    uc.execute(queue_path=os.path.join(OUTPUT_DIR, "0-crawl-queue.sqlite"), output_dir=OUTPUT_DIR, states=estados, processes=int(processos), store_path=STORE_PATH, retry_failed=repetir)
     print("--- Tarefa Concluída! ---")
 
 # --- Controladores de Mapa (adicionando o novo controlador) ---
@@ -102,7 +135,8 @@ def run_map_zoom_controller():
     caminhos = {'sulamerica': os.path.join(SHARED_DIR, "south_america.geojson"), 'estados': os.path.join(OUTPUT_DIR, "1-complete-data-states.geojson"), 'municipios': os.path.join(OUTPUT_DIR, f"2-complete-data-municipalities-{uf.lower()}.geojson"), 'saida': os.path.join(OUTPUT_DIR, f"mapa_zoom_municipios_{uf.lower()}.png")}
     if not os.path.exists(caminhos['estados']): print("\nAVISO: Arquivo de estados não encontrado (Opção 1)."); return
     if not os.path.exists(caminhos['municipios']): print(f"\nAVISO: Arquivo de municípios para {uf} não encontrado (Opção 2)."); return
-    gerar_mapa_zoom(uf, caminhos)
+    rotulos = input("   -> Mostrar os nomes dos municípios? (s/n): ").lower() == 's'
+    gerar_mapa_zoom(uf, prefer_store(caminhos, STORE_PATH, uf), rotulos=rotulos)
 
 def run_all_maps_for_state_controller():
     if not MAPS_AVAILABLE: print("Funcionalidade de mapas indisponível."); return
@@ -129,7 +163,8 @@ def run_municipalities_choropleth_controller():
     caminhos = {'sulamerica': os.path.join(SHARED_DIR, "south_america.geojson"), 'estados': os.path.join(OUTPUT_DIR, "1-complete-data-states.geojson"), 'municipios': os.path.join(OUTPUT_DIR, f"2-complete-data-municipalities-{uf.lower()}.geojson"), 'saida': os.path.join(OUTPUT_DIR, f"mapa_coropleth_municipios_{uf.lower()}_{coluna}.png")}
     if not os.path.exists(caminhos['estados']): print("\nAVISO: Arquivo de estados não encontrado (Opção 1)."); return
     if not os.path.exists(caminhos['municipios']): print(f"\nAVISO: Arquivo de municípios para {uf} não encontrado (Opção 2)."); return
-    gerar_mapa_municipios_coropleth(uf, coluna, caminhos)
+    rotulos = input("   -> Mostrar os nomes dos municípios? (s/n): ").lower() == 's'
+    gerar_mapa_municipios_coropleth(uf, coluna, prefer_store(caminhos, STORE_PATH, uf, columns=[coluna]), rotulos=rotulos)
 
 def run_states_choropleth_controller():
     if not MAPS_AVAILABLE: print("Funcionalidade de mapas indisponível."); return
@@ -160,7 +195,9 @@ def run_state_regional_map_controller():
             print(f"   -> Por favor, execute a '{opcao}' no menu principal primeiro.")
             arquivos_faltando = True
     if arquivos_faltando: return
-    gerar_mapa_regional_estado(uf, caminhos)
+    rotulos = input("   -> Mostrar os nomes das regiões imediatas? (s/n): ").lower() == 's'
+    # Camadas já presentes no banco são lidas dele: só as linhas do estado saem do disco.
+    gerar_mapa_regional_estado(uf, prefer_store(caminhos, STORE_PATH, uf), rotulos=rotulos)
 
 # <--- NOVO: Controlador para a nova função de mapa de regiões recortadas
 def run_clipped_regions_map_controller():
@@ -196,7 +233,137 @@ def run_clipped_regions_map_controller():
         print(f"   -> ERRO: Arquivo de '{required_file}' não foi encontrado. Execute a '{required_option}'."); return
 
     # Chama a função importada
-    gerar_mapa_regioes_recortadas(uf=uf, caminhos=caminhos, region_type=region_type)
+    gerar_mapa_regioes_recortadas(uf=uf, caminhos=prefer_store(caminhos, STORE_PATH, uf), region_type=region_type)
+
+def run_tiles_controller():
+    if not MAPS_AVAILABLE: print("Funcionalidade de mapas indisponível."); return
+    formato = input("   -> Formato dos tiles? (1 para PNG, 2 para vetorial/MVT): ")
+    if formato not in ('1', '2'): print("   -> Escolha inválida. Use 1 ou 2."); return
+    formato = 'png' if formato == '1' else 'pbf'
+    try:
+        zoom_min = int(input("   -> Zoom mínimo (ex: 3): "))
+        zoom_max = int(input("   -> Zoom máximo (ex: 8): "))
+    except ValueError:
+        print("   -> Zoom inválido."); return
+    caminhos = {
+        'sulamerica': os.path.join(SHARED_DIR, "south_america.geojson"),
+        'estados': os.path.join(OUTPUT_DIR, "1-complete-data-states.geojson"),
+        'saida': os.path.join(OUTPUT_DIR, f"tiles-brasil-{formato}.mbtiles")
+    }
+    if not os.path.exists(caminhos['estados']):
+        print("   -> ERRO: Arquivo de 'estados' não foi encontrado. Execute a 'Opção 1'."); return
+    # Camadas opcionais: entram na pirâmide apenas se já tiverem sido baixadas.
+    municipios = list(find_municipality_files(OUTPUT_DIR).values())
+    if municipios: caminhos['municipios'] = municipios
+    for key, filename in (('imediatas', "3-immediate-regions.geojson"), ('intermediarias', "4-intermediate-regions.geojson")):
+        if os.path.exists(os.path.join(OUTPUT_DIR, filename)):
+            caminhos[key] = os.path.join(OUTPUT_DIR, filename)
+    if not os.path.exists(caminhos['sulamerica']): del caminhos['sulamerica']
+    gerar_tiles(caminhos, zoom_min=zoom_min, zoom_max=zoom_max, formato=formato)
+
+def run_map_server_controller():
+    if not MAPS_AVAILABLE: print("Funcionalidade de mapas indisponível."); return
+    porta = input("   -> Porta do servidor (Enter para 8000): ") or "8000"
+    if not porta.isdigit(): print("   -> Porta inválida."); return
+    MapServerUseCase(output_dir=OUTPUT_DIR, shared_dir=SHARED_DIR).execute(port=int(porta))
+
+def run_national_municipalities_map_controller():
+    if not MAPS_AVAILABLE: print("Funcionalidade de mapas indisponível."); return
+    coluna = input("   -> Coluna dos municípios para as cores (Enter para nenhuma): ").strip().lower() or None
+    caminhos = {
+        'sulamerica': os.path.join(SHARED_DIR, "south_america.geojson"),
+        'estados': os.path.join(OUTPUT_DIR, "1-complete-data-states.geojson"),
+        'rede_fronteiras': os.path.join(OUTPUT_DIR, "0-border-network.npz"),
+        'saida': os.path.join(OUTPUT_DIR, f"mapa_municipios_brasil{'_' + coluna if coluna else ''}.png")
+    }
+    if not os.path.exists(caminhos['estados']):
+        print("   -> ERRO: Arquivo de 'estados' não foi encontrado. Execute a 'Opção 1'."); return
+    caminhos['municipios'] = list(find_municipality_files(OUTPUT_DIR).values())
+    if not caminhos['municipios']:
+        print("   -> ERRO: Nenhum arquivo de municípios encontrado. Execute a 'Opção 2'."); return
+    gerar_mapa_nacional_municipios(caminhos, coluna=coluna)
+
+def run_dot_density_map_controller():
+    if not MAPS_AVAILABLE: print("Funcionalidade de mapas indisponível."); return
+    uf = input("   -> Sigla do Estado para o mapa de pontos (ex: PE): ").upper()
+    if not uf or len(uf) != 2: print("   -> Sigla inválida."); return
+    pessoas = input("   -> Habitantes por ponto (Enter para 100): ") or "100"
+    if not pessoas.isdigit() or int(pessoas) < 1: print("   -> Número inválido."); return
+    caminhos = {'sulamerica': os.path.join(SHARED_DIR, "south_america.geojson"), 'estados': os.path.join(OUTPUT_DIR, "1-complete-data-states.geojson"), 'municipios': os.path.join(OUTPUT_DIR, f"2-complete-data-municipalities-{uf.lower()}.geojson"), 'saida': os.path.join(OUTPUT_DIR, f"mapa_pontos_populacao_{uf.lower()}.png")}
+    if not os.path.exists(caminhos['estados']): print("\nAVISO: Arquivo de estados não encontrado (Opção 1)."); return
+    if not os.path.exists(caminhos['municipios']): print(f"\nAVISO: Arquivo de municípios para {uf} não encontrado (Opção 2)."); return
+    gerar_mapa_densidade_pontos(uf, prefer_store(caminhos, STORE_PATH, uf), pessoas_por_ponto=int(pessoas))
+
+def run_grid_map_controller():
+    if not MAPS_AVAILABLE: print("Funcionalidade de mapas indisponível."); return
+    uf = input("   -> Sigla do Estado para o mapa em grade (ex: PE): ").upper()
+    if not uf or len(uf) != 2: print("   -> Sigla inválida."); return
+    coluna = input(f"   -> Qual coluna dos municípios de {uf} usar? (ex: population): ").lower()
+    if not coluna: print("   -> Nome da coluna não pode ser vazio."); return
+    formato = input("   -> Formato das células? (1 para Hexágonos, 2 para Quadrados): ")
+    if formato not in ('1', '2'): print("   -> Escolha inválida. Use 1 ou 2."); return
+    formato = 'hex' if formato == '1' else 'square'
+    try:
+        tamanho = float(input("   -> Tamanho da célula em km (Enter para 10): ") or "10")
+    except ValueError:
+        print("   -> Tamanho inválido."); return
+    if tamanho <= 0: print("   -> Tamanho inválido."); return
+    # Contagens (ex: população) viram densidade por km²; taxas e médias viram média ponderada por área.
+    extensiva = input(f"   -> '{coluna}' é uma contagem (s) ou uma taxa/média (n)? (s/n): ").lower() != 'n'
+    caminhos = {
+        'sulamerica': os.path.join(SHARED_DIR, "south_america.geojson"),
+        'estados': os.path.join(OUTPUT_DIR, "1-complete-data-states.geojson"),
+        'municipios': os.path.join(OUTPUT_DIR, f"2-complete-data-municipalities-{uf.lower()}.geojson"),
+        'grade': os.path.join(OUTPUT_DIR, f"0-grid-{uf.lower()}-{formato}-{tamanho:g}km.npz"),
+        'saida': os.path.join(OUTPUT_DIR, f"mapa_grade_{formato}_{uf.lower()}_{coluna}.png")
+    }
+    if not os.path.exists(caminhos['estados']): print("\nAVISO: Arquivo de estados não encontrado (Opção 1)."); return
+    if not os.path.exists(caminhos['municipios']): print(f"\nAVISO: Arquivo de municípios para {uf} não encontrado (Opção 2)."); return
+    gerar_mapa_grade(uf, coluna, prefer_store(caminhos, STORE_PATH, uf, columns=[coluna]), formato=formato, tamanho_km=tamanho, extensiva=extensiva)
+
+def run_aggregate_points_controller():
+    uf = input("   -> Sigla do Estado dos municípios (ex: PE): ").upper()
+    if not uf or len(uf) != 2: print("   -> Sigla inválida."); return
+    caminho_municipios = os.path.join(OUTPUT_DIR, f"2-complete-data-municipalities-{uf.lower()}.geojson")
+    if not os.path.exists(caminho_municipios): print(f"\nAVISO: Arquivo de municípios para {uf} não encontrado (Opção 2)."); return
+    caminho_registros = input("   -> Caminho do arquivo de registros (.csv ou .parquet): ").strip()
+    if not os.path.exists(caminho_registros): print("   -> Arquivo não encontrado."); return
+    coluna_codigo = input("   -> Coluna com o código IBGE do município (Enter para pular): ").strip() or None
+    coluna_nome, coluna_uf = None, None
+    if not coluna_codigo:
+        coluna_nome = input("   -> Coluna com o nome do município (Enter para usar lon/lat): ").strip() or None
+        if coluna_nome:
+            coluna_uf = input("   -> Coluna com a UF (Enter se não houver): ").strip() or None
+    agregacao = input("   -> Agregação (count, sum, count_rate, sum_rate): ").strip().lower()
+    coluna_valor = None
+    if agregacao in ('sum', 'sum_rate'):
+        coluna_valor = input("   -> Coluna a ser somada: ").strip()
+    coluna_saida = input("   -> Nome da nova coluna (ex: casos_por_100k): ").strip().lower()
+    if not coluna_saida: print("   -> Nome da coluna não pode ser vazio."); return
+    uc = AggregatePointsUseCase()
+    cache_localizador = os.path.join(OUTPUT_DIR, f"0-locator-{uf.lower()}.pkl")
+    uc.execute(caminho_registros, caminho_municipios, coluna_saida, aggregation=agregacao, value_column=coluna_valor, code_column=coluna_codigo, name_column=coluna_nome, uf_column=coluna_uf, locator_cache_path=cache_localizador)
+    print(f"   -> Use a Opção 9 com a coluna '{coluna_saida}' para gerar o mapa.")
+
+def run_spatial_analysis_controller():
+    uf = input("   -> Sigla do Estado (ex: PE) ou Enter para o Brasil inteiro: ").upper()
+    if uf and len(uf) != 2: print("   -> Sigla inválida."); return
+    if uf:
+        arquivos = [os.path.join(OUTPUT_DIR, f"2-complete-data-municipalities-{uf.lower()}.geojson")]
+        if not dataset_exists(arquivos[0]): print(f"\nAVISO: Arquivo de municípios para {uf} não encontrado (Opção 2)."); return
+    else:
+        arquivos = list(find_municipality_files(OUTPUT_DIR).values())
+        if not arquivos: print("\nAVISO: Nenhum arquivo de municípios encontrado (Opção 2 ou 17)."); return
+    coluna = input("   -> Qual coluna analisar? (ex: population): ").strip().lower()
+    if not coluna: print("   -> Nome da coluna não pode ser vazio."); return
+    regra = input("   -> Vizinhança? (1 para Rainha - qualquer ponto, 2 para Torre - aresta): ")
+    if regra not in ('1', '2'): print("   -> Escolha inválida. Use 1 ou 2."); return
+    regra = 'queen' if regra == '1' else 'rook'
+    # O grafo de vizinhança é salvo em disco e reaproveitado para qualquer outra coluna.
+    cache = os.path.join(OUTPUT_DIR, f"0-contiguity-{uf.lower() or 'brasil'}-{regra}.npz")
+    uc = SpatialAnalysisUseCase()
+    uc.execute(arquivos, coluna, rule=regra, cache_path=cache, store_path=STORE_PATH)
+    print(f"   -> Use a Opção 9 com a coluna '{coluna}_lisa_cluster' para mapear os agrupamentos.")
 
 # =============================================================================
 # SEÇÃO 4: INTERFACE COM O USUÁRIO E LOOP PRINCIPAL
@@ -211,6 +378,9 @@ def display_menu():
     print("|  3. Baixar Dados das Regiões Imediatas               |")
     print("|  4. Baixar Dados das Regiões Intermediárias          |")
     print("|  5. EXECUTAR TODOS OS FETCHS em sequência            |")
+    print("| 15. Agregar Registros por Município (CSV/Parquet)    |")
+    print("| 17. Baixar Municípios do Brasil (retomável)          |")
+    print("| 20. Análise Espacial por Município (Moran/LISA)      |")
     if MAPS_AVAILABLE:
         print("+------------------------------------------------------+")
         print("| MAPAS                                                |")
@@ -221,6 +391,11 @@ def display_menu():
         print("| 10. Gerar Mapa Coroplético dos Estados               |")
         print("| 11. Gerar Mapa de Divisões de um Estado              |")
         print("| 12. Gerar Mapa de Regiões Recortadas (Imed./Interm.) |") # <--- NOVO
+        print("| 13. Gerar Tiles do Brasil (MBTiles)                  |")
+        print("| 14. Iniciar Servidor Local de Mapas (HTTP)           |")
+        print("| 16. Gerar Mapa Nacional de Municípios (Fronteiras)   |")
+        print("| 18. Gerar Mapa de Densidade de Pontos (População)    |")
+        print("| 19. Gerar Mapa em Grade (Hexágonos/Quadrados)        |")
     print("+------------------------------------------------------+")
     print("|  0. Sair do programa                                 |")
     print("+------------------------------------------------------+")
@@ -248,6 +423,14 @@ if __name__ == "__main__":
             elif choice == '11' and MAPS_AVAILABLE: run_state_regional_map_controller()
             # <--- NOVO: Adiciona a chamada ao novo controlador
             elif choice == '12' and MAPS_AVAILABLE: run_clipped_regions_map_controller()
+            elif choice == '13' and MAPS_AVAILABLE: run_tiles_controller()
+            elif choice == '14' and MAPS_AVAILABLE: run_map_server_controller()
+            elif choice == '15': run_aggregate_points_controller()
+            elif choice == '17': run_crawl_municipalities()
+            elif choice == '20': run_spatial_analysis_controller()
+            elif choice == '16' and MAPS_AVAILABLE: run_national_municipalities_map_controller()
+            elif choice == '18' and MAPS_AVAILABLE: run_dot_density_map_controller()
+            elif choice == '19' and MAPS_AVAILABLE: run_grid_map_controller()
             elif choice == '0':
                 print("Saindo do programa. Até logo!"); break
             else:
@@ -0,0 +1,212 @@
+import os
+import sqlite3
+
+import pandas as pd
+import geopandas as gpd
+
+from shared.feature_accumulator import FeatureAccumulator
+from shared.file_utils import layer_path, resolve_dataset_path
+from shared.layer_loader import load_layer
+
+try:
+    import pyogrio
+    PYOGRIO_AVAILABLE = True
+except ImportError:
+    PYOGRIO_AVAILABLE = False
+
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "output", "0-brasil.gpkg")
+
+# Camada -> coluna que identifica cada linha (chave do upsert).
+LAYER_KEYS = {
+    'states': 'codarea',
+    'municipalities': 'codarea',
+    'immediate_regions': 'immediate_region_id',
+    'intermediate_regions': 'intermediate_region_id',
+}
+# Colunas que recebem índice de atributo, quando existem na camada.
+INDEXED_COLUMNS = ('codarea', 'abbreviation', 'state_abbreviation', 'immediate_region_id', 'intermediate_region_id')
+# Chaves dos dicionários `caminhos` dos geradores de mapa -> camada do banco.
+CAMINHOS_LAYERS = {
+    'estados': 'states',
+    'municipios': 'municipalities',
+    'imediatas': 'immediate_regions',
+    'intermediarias': 'intermediate_regions',
+}
+
+
+def _require_pyogrio():
+    if not PYOGRIO_AVAILABLE:
+        raise RuntimeError("The 'pyogrio' package is required for the GeoPackage store.")
+
+
+class DatasetStore:
+    """
+    The local GeoPackage database holding every fetched layer, one table per
+    layer (states, municipalities, immediate_regions, intermediate_regions).
+
+    Each table has an R-tree spatial index (created by GDAL) plus attribute
+    indexes on the id, UF and region code columns, so reading the features of
+    one state, by bbox/mask or by a `where` condition, is an indexed lookup
+    instead of a full-file scan. Any layer can also be handed to load_layer
+    (and so to every map generator) as the path 'file.gpkg#layer'.
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+
+    def layer_path(self, layer: str, **filters) -> str:
+        """
+        The load_layer path of a layer, e.g. 'output/0-brasil.gpkg#municipalities', with
+        optional equality filters (state_abbreviation='PE' reads only that state's rows).
+        """
+        return layer_path(self.path, layer, **filters)
+
+    def layers(self) -> list:
+        """The layers present in the store (empty if it does not exist yet)."""
+        if not os.path.exists(self.path):
+            return []
+        _require_pyogrio()
+        return [str(name) for name, _ in pyogrio.list_layers(self.path)]
+
+    def count(self, layer: str, **filters) -> int:
+        """Counts the rows of a layer matching the equality filters (e.g. state_abbreviation='PE')."""
+        if layer not in self.layers():
+            return 0
+        where, params = self._where(filters)
+        with sqlite3.connect(self.path) as connection:
+            return connection.execute(f'SELECT COUNT(*) FROM "{layer}"' + (f" WHERE {where}" if where else ""), params).fetchone()[0]
+
+    @staticmethod
+    def _where(filters: dict) -> tuple:
+        clauses = [f'"{column}" = ?' for column in filters]
+        return " AND ".join(clauses), [str(v) for v in filters.values()]
+
+    def upsert(self, layer: str, data, key: str = None) -> int:
+        """
+        Inserts or replaces the rows of a layer, matched by their key column.
+
+        :param layer: The layer (table) name, e.g. 'municipalities'.
+        :param data: A GeoDataFrame, a FeatureAccumulator or a list of GeoJSON features (EPSG:4326).
+        :param key: The key column. Defaults to LAYER_KEYS[layer].
+        :return: The number of rows written.
+        """
+        _require_pyogrio()
+        key = key or LAYER_KEYS[layer]
+        if isinstance(data, FeatureAccumulator):
+            gdf = data.to_geodataframe()
+        elif isinstance(data, gpd.GeoDataFrame):
+            gdf = data
+        else:
+            gdf = gpd.GeoDataFrame.from_features(list(data), crs="EPSG:4326")
+        if gdf.empty:
+            return 0
+        gdf = gdf.copy()
+        gdf[key] = gdf[key].astype(str)
+
+        options = {'driver': 'GPKG', 'promote_to_multi': True, 'layer_options': {'SPATIAL_INDEX': 'YES'}}
+        if layer not in self.layers():
+            pyogrio.write_dataframe(gdf, self.path, layer=layer, **options)
+        else:
+            info = pyogrio.read_info(self.path, layer=layer)
+            fields = set(info['fields'])
+            new_columns = set(gdf.columns) - {gdf.geometry.name}
+            if new_columns <= fields:
+                self._append_replacing(layer, gdf, key, info.get('fid_column') or 'fid', options)
+            else:
+                # Colunas novas: a tabela é reescrita com o esquema combinado.
+                existing = pyogrio.read_dataframe(self.path, layer=layer)
+                existing = existing[~existing[key].astype(str).isin(gdf[key])]
+                combined = gpd.GeoDataFrame(pd.concat([existing, gdf], ignore_index=True), geometry=gdf.geometry.name, crs=gdf.crs)
+                pyogrio.write_dataframe(combined, self.path, layer=layer, **options)
+        self.create_indexes(layer)
+        return len(gdf)
+
+    def _append_replacing(self, layer: str, gdf: gpd.GeoDataFrame, key: str, fid: str, options: dict) -> None:
+        """
+        Same-schema upsert: appends the new rows first and only then deletes the
+        old rows of the same keys, in one transaction, so a failed append never
+        loses the rows that were already in the store.
+        """
+        with sqlite3.connect(self.path) as connection:
+            last_fid = connection.execute(f'SELECT COALESCE(MAX("{fid}"), 0) FROM "{layer}"').fetchone()[0]
+        try:
+            pyogrio.write_dataframe(gdf, self.path, layer=layer, append=True, **options)
+        except Exception:
+            # Desfaz o que a escrita pela metade deixou: as linhas antigas continuam intactas.
+            with sqlite3.connect(self.path) as connection:
+                connection.execute(f'DELETE FROM "{layer}" WHERE "{fid}" > ?', (last_fid,))
+            raise
+        # As novas linhas têm fid > last_fid: só as antigas das mesmas chaves saem.
+        with sqlite3.connect(self.path) as connection:
+            connection.executemany(
+                f'DELETE FROM "{layer}" WHERE "{key}" = ? AND "{fid}" <= ?', [(k, last_fid) for k in gdf[key]]
+            )
+
+    def create_indexes(self, layer: str) -> None:
+        """Creates the attribute indexes (INDEXED_COLUMNS) of a layer."""
+        with sqlite3.connect(self.path) as connection:
+            columns = {row[1] for row in connection.execute(f'PRAGMA table_info("{layer}")')}
+            for column in INDEXED_COLUMNS:
+                if column in columns:
+                    connection.execute(f'CREATE INDEX IF NOT EXISTS "idx_{layer}_{column}" ON "{layer}" ("{column}")')
+
+    def read(self, layer: str, projection: str = None, bbox: tuple = None, mask=None, columns: list = None, **filters) -> gpd.GeoDataFrame:
+        """
+        Reads only the rows of a layer that are needed, through load_layer (so the
+        result is cached in memory like any other layer).
+
+        :param filters: Equality filters on indexed columns, e.g. state_abbreviation='PE'.
+        """
+        return load_layer(self.layer_path(layer, **filters), projection, bbox=bbox, mask=mask, columns=columns)
+
+
+def upsert_into_store(layer: str, data, store_path: str = None) -> None:
+    """
+    Upserts the output of a fetch use case into the store, reporting (instead of
+    raising) any failure, since the GeoJSON file was already saved.
+    """
+    if not store_path:
+        return
+    try:
+        written = DatasetStore(store_path).upsert(layer, data)
+        print(f"Store '{os.path.basename(store_path)}': {written} rows upserted into '{layer}'.")
+    except (RuntimeError, OSError, sqlite3.Error, ValueError) as e:
+        print(f"WARNING: Could not update the store '{store_path}': {e}")
+
+
+def _loose_file_is_newer(path: str, store_path: str) -> bool:
+    """Tells whether a loose layer file was modified after the store (e.g. a column was added in place)."""
+    path = resolve_dataset_path(path)
+    return os.path.exists(path) and os.path.getmtime(path) > os.path.getmtime(store_path)
+
+
+def prefer_store(caminhos: dict, store_path: str = DEFAULT_STORE_PATH, uf: str = None, columns: list = None) -> dict:
+    """
+    Returns a copy of a generator's `caminhos` where every layer available in the
+    store is read from it ('file.gpkg#layer') instead of its loose file. The
+    municipalities are only taken from the store when it has rows for `uf`.
+
+    A layer keeps its loose file when that file is newer than the store, or (for
+    the municipalities) when the store lacks one of `columns`: the use cases that
+    add a column in place (aggregation, spatial analysis) write the GeoJSON, and
+    the map must show that column.
+    """
+    store = DatasetStore(store_path)
+    try:
+        layers = set(store.layers())
+    except (RuntimeError, OSError, sqlite3.Error):
+        return dict(caminhos)
+    result = dict(caminhos)
+    for name, layer in CAMINHOS_LAYERS.items():
+        if name not in caminhos or layer not in layers:
+            continue
+        if _loose_file_is_newer(caminhos[name], store_path):
+            continue
+        if name == 'municipios':
+            if not uf or not store.count(layer, state_abbreviation=uf.upper()):
+                continue
+            if columns and not set(columns) <= set(pyogrio.read_info(store_path, layer=layer)['fields']):
+                continue
+        # Os municípios de um estado são lidos pelo índice de UF, não pela interseção com o contorno.
+        result[name] = store.layer_path(layer, state_abbreviation=uf.upper()) if name == 'municipios' else store.layer_path(layer)
+    return result
@@ -0,0 +1,152 @@
+from array import array
+
+import numpy as np
+import geopandas as gpd
+import shapely
+from shapely.geometry import mapping, shape
+
+from shared.file_utils import save_geojson
+
+# Tipos aceitos no esquema -> código do array.array que guarda a coluna.
+COLUMN_TYPES = {'int64': 'q', 'float64': 'd'}
+PARQUET_SUFFIXES = (".parquet", ".geoparquet")
+
+
+class FeatureAccumulator:
+    """
+    Compact, columnar store for the features produced by a fetch use case.
+
+    Each feature is converted as soon as it arrives: the geometry becomes WKB
+    and every property goes to a column, so the crawl never holds thousands of
+    nested GeoJSON dicts (and their lists of coordinate lists) at once. Columns
+    declared in the schema are backed by typed arrays (array.array); the others
+    are plain lists. The result is written directly as GeoJSON, GeoParquet or
+    a GeoDataFrame.
+
+    The accumulator is iterable (yielding GeoJSON features), so it can be
+    passed wherever a list of features was expected, e.g. save_geojson.
+    """
+
+    __slots__ = ('_wkb', '_columns', '_schema', '_count')
+
+    def __init__(self, schema: dict = None):
+        """
+        :param schema: Optional property name -> 'int64' or 'float64'. Missing values are
+            stored as 0 (int64) or NaN (float64); undeclared properties keep their Python values.
+        """
+        self._wkb = []
+        self._columns = {}
+        self._schema = dict(schema or {})
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __bool__(self) -> bool:
+        return self._count > 0
+
+    def _new_column(self, name: str):
+        typecode = COLUMN_TYPES.get(self._schema.get(name))
+        if typecode is None:
+            return [None] * self._count
+        return array(typecode, [0 if typecode == 'q' else np.nan]) * self._count
+
+    def append(self, feature: dict, **properties) -> None:
+        """
+        Adds one GeoJSON feature (plus extra properties), converting it right away.
+
+        :param feature: A GeoJSON feature, e.g. from an IBGE mesh response.
+        :param properties: Properties that override or extend feature['properties'].
+        """
+        geometry = feature.get('geometry')
+        self._wkb.append(shapely.to_wkb(shape(geometry)) if geometry else None)
+        values = {**(feature.get('properties') or {}), **properties}
+
+        for name, value in values.items():
+            column = self._columns.get(name)
+            if column is None:
+                column = self._columns[name] = self._new_column(name)
+            if isinstance(column, array):
+                if column.typecode == 'q':
+                    value = int(value) if value is not None else 0
+                else:
+                    value = float(value) if value is not None else np.nan
+            column.append(value)
+        self._count += 1
+
+        # Colunas que esta feição não tem recebem o valor ausente.
+        for name, column in self._columns.items():
+            if len(column) < self._count:
+                column.append(None if not isinstance(column, array) else (0 if column.typecode == 'q' else np.nan))
+
+    def geometries(self) -> np.ndarray:
+        """Decodes all geometries at once (vectorized) into an object array."""
+        return shapely.from_wkb(np.array(self._wkb, dtype=object))
+
+    def set_geometries(self, geometries) -> None:
+        """Replaces all geometries (e.g. after a repair)."""
+        geometries = np.asarray(geometries, dtype=object)
+        if len(geometries) != self._count:
+            raise ValueError(f"Expected {self._count} geometries, got {len(geometries)}.")
+        self._wkb = list(shapely.to_wkb(geometries))
+
+    def column(self, name: str) -> np.ndarray:
+        """Returns a property column as a NumPy array (None where it is missing)."""
+        column = self._columns.get(name)
+        if column is None:
+            return np.full(self._count, None, dtype=object)
+        if isinstance(column, array):
+            return np.frombuffer(column, dtype=np.int64 if column.typecode == 'q' else np.float64).copy()
+        return np.array(column, dtype=object)
+
+    def set_column(self, name: str, values) -> None:
+        """Sets (or replaces) a whole property column, e.g. metrics computed for the layer."""
+        values = np.asarray(values)
+        if len(values) != self._count:
+            raise ValueError(f"Expected {self._count} values for '{name}', got {len(values)}.")
+        if values.dtype.kind == 'f':
+            self._columns[name] = array('d', values.astype(np.float64).tobytes())
+        elif values.dtype.kind in 'iu':
+            self._columns[name] = array('q', values.astype(np.int64).tobytes())
+        else:
+            self._columns[name] = values.tolist()
+
+    def __iter__(self):
+        """Yields the features as GeoJSON dicts, one at a time."""
+        geometries = self.geometries()
+        names = list(self._columns)
+        columns = []
+        for column in self._columns.values():
+            values = column
+            if isinstance(column, array):
+                values = column.tolist()
+                if column.typecode == 'd':
+                    values = [None if v != v else v for v in values]  # NaN -> null
+            columns.append(values)
+        for i, geometry in enumerate(geometries):
+            yield {
+                'type': 'Feature',
+                'geometry': mapping(geometry) if geometry is not None else None,
+                'properties': {name: values[i] for name, values in zip(names, columns)},
+            }
+
+    def to_geodataframe(self, crs: str = "EPSG:4326") -> gpd.GeoDataFrame:
+        """Builds a GeoDataFrame straight from the columns (no intermediate dicts)."""
+        # Colunas tipadas viram arrays NumPy sem cópia de valores; as demais têm o tipo inferido pelo pandas.
+        data = {name: self.column(name) if isinstance(column, array) else column for name, column in self._columns.items()}
+        return gpd.GeoDataFrame(data, geometry=gpd.GeoSeries(self.geometries(), crs=crs), crs=crs)
+
+    def save(self, output_filename: str) -> None:
+        """
+        Saves the features. Names ending in '.parquet'/'.geoparquet' are written as
+        GeoParquet; anything else goes through save_geojson (plain or compressed).
+        """
+        if output_filename.endswith(PARQUET_SUFFIXES):
+            try:
+                self.to_geodataframe().to_parquet(output_filename, index=False)
+                print(f"\nFile '{output_filename}' saved successfully!")
+                print(f"Total features saved: {self._count}")
+            except (IOError, ImportError) as e:
+                print(f"\nError saving file '{output_filename}': {e}")
+            return
+        save_geojson(self, output_filename)
@@ -0,0 +1,91 @@
+import numpy as np
+import shapely
+from shapely.geometry import shape
+
+from shared.feature_accumulator import FeatureAccumulator
+from shared.reprojection import reproject_geometries
+
+# South America Albers Equal Area Conic: áreas corretas para todo o território brasileiro.
+EQUAL_AREA_CRS = "ESRI:102033"
+SOURCE_CRS = "EPSG:4326"
+
+AREA_PROPERTY = 'area_km2'
+PERIMETER_PROPERTY = 'perimeter_km'
+DENSITY_PROPERTY = 'population_density'
+REPRESENTATIVE_POINT_PROPERTIES = ('representative_lon', 'representative_lat')
+BBOX_PROPERTIES = ('bbox_minx', 'bbox_miny', 'bbox_maxx', 'bbox_maxy')
+
+
+def compute_metrics(geometries: np.ndarray, population: np.ndarray = None) -> dict:
+    """
+    Computes derived metrics for a whole layer with vectorized array operations.
+
+    :param geometries: An object array of shapely geometries in EPSG:4326 (lon/lat).
+    :param population: Optional population of each geometry, for the density.
+    :return: Property name -> float64 array (NaN where a value does not exist).
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    # Reprojeta todas as coordenadas da camada de uma vez (em blocos paralelos se for grande).
+    projected = reproject_geometries(geometries, SOURCE_CRS, EQUAL_AREA_CRS)
+
+    area_km2 = shapely.area(projected) / 1e6
+    metrics = {
+        AREA_PROPERTY: area_km2,
+        PERIMETER_PROPERTY: shapely.length(projected) / 1e3,
+    }
+
+    points = shapely.point_on_surface(geometries)
+    metrics[REPRESENTATIVE_POINT_PROPERTIES[0]] = shapely.get_x(points)
+    metrics[REPRESENTATIVE_POINT_PROPERTIES[1]] = shapely.get_y(points)
+
+    bounds = shapely.bounds(geometries)
+    for i, name in enumerate(BBOX_PROPERTIES):
+        metrics[name] = bounds[:, i]
+
+    if population is not None:
+        population = np.asarray(population, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            metrics[DENSITY_PROPERTY] = np.where(area_km2 > 0, population / area_km2, np.nan)
+    return metrics
+
+
+def _population_values(values) -> np.ndarray:
+    """Converts population values to float64; a population of 0 is real (density 0), only a missing one becomes NaN."""
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+def enrich_features(features: list, population_property: str = None) -> list:
+    """
+    Adds derived metrics to GeoJSON features at fetch time: area (km², equal-area
+    CRS), perimeter (km), a representative point inside the polygon, the bounding
+    box and, when a population property is given, the population density (inhabitants/km²).
+
+    :param features: The GeoJSON features produced by a fetch use case (lon/lat), as a
+        list or a FeatureAccumulator.
+    :param population_property: The population property (e.g. 'population'), or None.
+    :return: The same features, updated in place.
+    """
+    if not features:
+        return features
+    rounding = {AREA_PROPERTY: 4, PERIMETER_PROPERTY: 4, DENSITY_PROPERTY: 4}
+    if isinstance(features, FeatureAccumulator):
+        population = None
+        if population_property:
+            # Coluna float: NaN já marca a ausência; coluna sem esquema: None vira NaN (0 continua 0).
+            # Uma coluna int64 não tem como marcar ausência, por isso os fetches declaram a população como float64.
+            population = _population_values(features.column(population_property))
+        for name, values in compute_metrics(features.geometries(), population).items():
+            features.set_column(name, np.round(values, rounding.get(name, 6)))
+        return features
+
+    geometries = np.array([shape(f['geometry']) if f.get('geometry') else None for f in features], dtype=object)
+    population = None
+    if population_property:
+        population = _population_values([f['properties'].get(population_property) for f in features])
+
+    metrics = compute_metrics(geometries, population)
+    for name, values in metrics.items():
+        values = np.round(values, rounding.get(name, 6))
+        for feature, value in zip(features, values.tolist()):
+            feature['properties'][name] = None if np.isnan(value) else value
+    return features
@@ -1,21 +1,145 @@
-import json
+import gzip
+import io
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from urllib.parse import parse_qsl, urlencode
+
+from shared.json_codec import dump_feature_collection
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Extensões aceitas: a compressão é escolhida pelo sufixo do arquivo.
+GEOJSON_SUFFIXES = (".geojson", ".geojson.gz", ".geojson.zst")
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".zst": "zstd"}
+ZSTD_LEVEL = 10
+COPY_CHUNK_BYTES = 1024 * 1024
+# Separa o arquivo da camada em caminhos de bancos com várias camadas (ex: 'output/0-brasil.gpkg#municipalities').
+LAYER_SEPARATOR = "#"
+
+
+def compression_of(path: str):
+    """Returns 'gzip', 'zstd' or None, according to the file extension."""
+    return COMPRESSION_SUFFIXES.get(os.path.splitext(path)[1].lower())
+
+
+def split_layer_path(path: str) -> tuple:
+    """
+    Splits a layer path into (file, layer, SQL condition). A layer of a multi-layer
+    database is given as 'file.gpkg#layer', optionally restricted by equality
+    filters: 'file.gpkg#municipalities?state_abbreviation=PE'. Plain paths give (path, None, None).
+    """
+    file_path, separator, layer = path.partition(LAYER_SEPARATOR)
+    if not separator or not layer:
+        return file_path, None, None
+    layer, _, query = layer.partition("?")
+    conditions = [f'"{column}" = \'{value.replace(chr(39), chr(39) * 2)}\'' for column, value in parse_qsl(query)]
+    return file_path, layer, " AND ".join(conditions) or None
+
+
+def layer_path(file_path: str, layer: str, **filters) -> str:
+    """Builds a layer path (see split_layer_path), e.g. layer_path('0-brasil.gpkg', 'municipalities', state_abbreviation='PE')."""
+    query = f"?{urlencode(filters)}" if filters else ""
+    return f"{file_path}{LAYER_SEPARATOR}{layer}{query}"
+
+
+def _require_zstd():
+    if not ZSTD_AVAILABLE:
+        raise RuntimeError("The 'zstandard' package is required for .zst files.")
+
+
+def open_dataset(path: str, mode: str = 'r', binary: bool = False):
+    """
+    Opens a dataset as a UTF-8 text stream (or a binary one), compressing or
+    decompressing on the fly according to the extension (.gz, .zst or plain).
+    Data flows through the stream in chunks, so the full uncompressed text is
+    never held in memory.
+
+    :param path: The file path.
+    :param mode: 'r' to read or 'w' to write.
+    :param binary: Return a binary stream instead of a text one.
+    """
+    compression = compression_of(path)
+    if compression == 'gzip':
+        return gzip.open(path, mode + 'b') if binary else gzip.open(path, mode + 't', encoding='utf-8')
+    if compression == 'zstd':
+        _require_zstd()
+        raw = open(path, mode + 'b')
+        if mode == 'w':
+            stream = zstandard.ZstdCompressor(level=ZSTD_LEVEL, threads=-1).stream_writer(raw, closefd=True)
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        return stream if binary else io.TextIOWrapper(stream, encoding='utf-8')
+    return open(path, mode + 'b') if binary else open(path, mode, encoding='utf-8')
+
+
+def resolve_dataset_path(path: str) -> str:
+    """
+    Returns `path` if it exists, otherwise a compressed variant of it
+    ('.gz' or '.zst' appended) when one exists. Lets every reader accept a
+    compressed copy of a file transparently. A layer suffix ('#layer') is kept.
+    """
+    if split_layer_path(path)[1] is not None:
+        return path
+    if os.path.exists(path):
+        return path
+    for suffix in COMPRESSION_SUFFIXES:
+        if os.path.exists(path + suffix):
+            return path + suffix
+    return path
+
+
+def dataset_exists(path: str) -> bool:
+    """Tells whether a dataset path (plain, compressed or 'file#layer') points to an existing file."""
+    return os.path.exists(split_layer_path(resolve_dataset_path(path))[0])
+
+
+@contextmanager
+def readable_dataset_path(path: str):
+    """
+    Yields a path that GDAL/pyogrio can read for any dataset. Gzip files are read
+    by GDAL's streaming '/vsigzip/' handler; zstd files, which GDAL cannot read,
+    are stream-decompressed chunk by chunk into a temporary file.
+    """
+    path = resolve_dataset_path(path)
+    compression = compression_of(path)
+    if compression == 'gzip':
+        yield '/vsigzip/' + os.path.abspath(path)
+    elif compression == 'zstd':
+        _require_zstd()
+        suffix = os.path.splitext(os.path.splitext(path)[0])[1] or ".geojson"
+        fd, temporary_path = tempfile.mkstemp(suffix=suffix)
+        try:
+            with open(path, 'rb') as source, os.fdopen(fd, 'wb') as target:
+                with zstandard.ZstdDecompressor().stream_reader(source) as reader:
+                    shutil.copyfileobj(reader, target, COPY_CHUNK_BYTES)
+            yield temporary_path
+        finally:
+            os.remove(temporary_path)
+    else:
+        yield path
+
 
 def save_geojson(features: list, output_filename: str):
     """
     Creates a FeatureCollection object and saves it to a .geojson file.
+    Names ending in '.geojson.gz' or '.geojson.zst' are compressed while writing.
+    Features are encoded one at a time, so `features` may also be a generator.
     """
-    if not output_filename.endswith(".geojson"):
+    if not output_filename.endswith(GEOJSON_SUFFIXES):
         output_filename += ".geojson"
 
-    feature_collection = {
-        "type": "FeatureCollection",
-        "features": features
-    }
-
+    # Arquivos comprimidos não precisam da indentação (só aumentaria o texto a comprimir).
+    indent = compression_of(output_filename) is None
     try:
-        with open(output_filename, "w", encoding="utf-8") as f:
-            json.dump(feature_collection, f, ensure_ascii=False, indent=2)
+        with open_dataset(output_filename, "w", binary=True) as f:
+            total = dump_feature_collection(features, f, indent=indent)
         print(f"\nFile '{output_filename}' saved successfully!")
-        print(f"Total features saved: {len(features)}")
+        print(f"Total features saved: {total}")
     except IOError as e:
-        print(f"\nError saving file '{output_filename}': {e}")
\ No newline at end of file
+        print(f"\nError saving file '{output_filename}': {e}")
@@ -0,0 +1,152 @@
+import os
+
+import numpy as np
+import geopandas as gpd
+import shapely
+
+from shared.file_utils import readable_dataset_path
+from shared.reprojection import reproject
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+GEOMETRY_STORE_SUFFIX = ".arrow"
+GEOMETRY_COLUMN = "geometry"
+# Colunas com a caixa envolvente de cada feição: permitem filtrar linhas sem decodificar o WKB.
+BOUNDS_COLUMNS = ("__minx", "__miny", "__maxx", "__maxy")
+
+
+def _source_stamp(path: str) -> str:
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def _require_arrow():
+    if not ARROW_AVAILABLE:
+        raise RuntimeError("The 'pyarrow' package is required for the geometry store.")
+
+
+def build_geometry_store(source_path: str, store_path: str = None, projection: str = None, force: bool = False) -> str:
+    """
+    Converts a geographic layer, once, into a memory-mappable Arrow IPC file.
+
+    The file holds the geometries as WKB, their bounding boxes and every
+    attribute column, uncompressed, so any number of processes can map it
+    and read it zero-copy. Invalid geometries are repaired here with
+    make_valid (see shared.geometry_validation.repair_geometries), so readers
+    don't have to repeat it. The store is rebuilt only when the source file
+    changed (or when force=True).
+
+    :param source_path: The source layer (e.g. a .geojson).
+    :param store_path: The output file. Defaults to source_path + '.arrow'.
+    :param projection: The CRS to store the geometries in (e.g. 'epsg:3857'). None keeps the source CRS.
+    :param force: Rebuild even if the store is up to date.
+    :return: The path of the store.
+    """
+    _require_arrow()
+    store_path = store_path or source_path + GEOMETRY_STORE_SUFFIX
+    stamp = _source_stamp(source_path)
+
+    if not force and os.path.exists(store_path):
+        with pa.memory_map(store_path) as source:
+            metadata = pa.ipc.open_file(source).schema.metadata or {}
+        if metadata.get(b'source_stamp', b'').decode() == stamp and metadata.get(b'projection', b'').decode() == (projection or ''):
+            return store_path
+
+    with readable_dataset_path(source_path) as readable:
+        gdf = gpd.read_file(readable)
+    if projection is not None:
+        gdf = reproject(gdf, projection)
+    # Import local: geometry_validation importa este módulo (GEOMETRY_STORE_SUFFIX).
+    from shared.geometry_validation import repair_geometries
+    geometries = repair_geometries(gdf.geometry.values)[0]
+
+    attributes = gdf.drop(columns=gdf.geometry.name)
+    table = pa.Table.from_pandas(attributes, preserve_index=False)
+    bounds = shapely.bounds(np.asarray(geometries, dtype=object))
+    for i, name in enumerate(BOUNDS_COLUMNS):
+        table = table.append_column(name, pa.array(bounds[:, i], type=pa.float64()))
+    table = table.append_column(GEOMETRY_COLUMN, pa.array(shapely.to_wkb(np.asarray(geometries, dtype=object)), type=pa.binary()))
+
+    crs = gdf.crs.to_wkt() if gdf.crs is not None else ''
+    table = table.replace_schema_metadata({'crs': crs, 'source_stamp': stamp, 'projection': projection or ''})
+
+    temporary_path = store_path + ".tmp"
+    with pa.OSFile(temporary_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(temporary_path, store_path)  # Troca atômica: leitores nunca veem um arquivo pela metade.
+    return store_path
+
+
+class GeometryStore:
+    """
+    A read-only, memory-mapped view of a layer converted by `build_geometry_store`.
+
+    Attaching does not copy anything: the Arrow buffers point straight into the
+    mapped file, which the operating system shares between every process that
+    maps it. Rows are selected on the (zero-copy) bounding box columns and only
+    the selected WKB values are decoded into shapely geometries.
+    """
+
+    def __init__(self, store_path: str):
+        _require_arrow()
+        self.path = store_path
+        self._source = pa.memory_map(store_path)
+        self.table = pa.ipc.open_file(self._source).read_all()
+        metadata = self.table.schema.metadata or {}
+        self.crs = metadata.get(b'crs', b'').decode() or None
+        self.attribute_columns = [c for c in self.table.column_names if c != GEOMETRY_COLUMN and c not in BOUNDS_COLUMNS]
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def rows_in_bbox(self, bbox: tuple) -> np.ndarray:
+        """Returns the indices of the rows whose bounding box intersects bbox (in the store's CRS)."""
+        minx, miny, maxx, maxy = (self.table.column(c).to_numpy() for c in BOUNDS_COLUMNS)
+        return np.flatnonzero((minx <= bbox[2]) & (maxx >= bbox[0]) & (miny <= bbox[3]) & (maxy >= bbox[1]))
+
+    def to_geodataframe(self, bbox: tuple = None, mask=None, columns: list = None) -> gpd.GeoDataFrame:
+        """
+        Materializes (a subset of) the layer as a GeoDataFrame.
+
+        :param bbox: Only rows intersecting this (minx, miny, maxx, maxy), in the store's CRS.
+        :param mask: Only rows intersecting this shapely geometry, in the store's CRS.
+        :param columns: Only these attribute columns. None returns all of them.
+        :return: A GeoDataFrame that does not reference the mapped file, so the store can be closed.
+        """
+        table = self.table
+        if mask is not None:
+            bbox = mask.bounds
+        if bbox is not None:
+            rows = self.rows_in_bbox(bbox)
+        else:
+            rows = np.arange(table.num_rows)
+        # take copia os buffers: to_pandas sozinho pode devolver colunas (ex: texto Arrow) apontando para o mmap.
+        table = table.take(pa.array(rows))
+
+        selected = self.attribute_columns if columns is None else [c for c in columns if c in self.attribute_columns]
+        geometries = shapely.from_wkb(table.column(GEOMETRY_COLUMN).to_numpy(zero_copy_only=False))
+        gdf = gpd.GeoDataFrame(table.select(selected).to_pandas(), geometry=geometries, crs=self.crs)
+
+        if mask is not None:
+            gdf = gdf[gdf.intersects(mask)]
+        return gdf
+
+    def close(self):
+        self.table = None
+        self._source.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def attach_geometry_store(store_path: str) -> GeometryStore:
+    """Maps a geometry store file (zero-copy) and returns its reader."""
+    return GeometryStore(store_path)
@@ -0,0 +1,137 @@
+import numpy as np
+import geopandas as gpd
+import shapely
+from shapely.geometry import mapping, shape
+
+from shared.feature_accumulator import FeatureAccumulator
+from shared.file_utils import readable_dataset_path, resolve_dataset_path, split_layer_path
+from shared.geometry_store import GEOMETRY_STORE_SUFFIX
+from shared.layer_loader import file_version
+
+try:
+    import pyogrio
+    PYOGRIO_AVAILABLE = True
+except ImportError:
+    PYOGRIO_AVAILABLE = False
+
+# Propriedades de diagnóstico gravadas em cada feição pela validação.
+VALID_PROPERTY = 'geometry_valid'
+ISSUE_PROPERTY = 'geometry_issue'
+AREA_CHANGE_PROPERTY = 'geometry_repair_area_change'
+
+_VALIDATED_CACHE: dict = {}
+
+
+def repair_geometries(geometries: np.ndarray) -> tuple:
+    """
+    Repairs an array of polygonal geometries with vectorized operations.
+
+    Invalid geometries go through make_valid, which keeps every part (unlike
+    buffer(0), which may silently drop or distort them); only the polygonal
+    parts of its result are kept, since the layers are area layers.
+
+    :param geometries: An object array of shapely geometries.
+    :return: (repaired geometries, original validity mask, validity reasons,
+        relative area change of each repaired geometry).
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    valid = shapely.is_valid(geometries)
+    reasons = np.where(valid, None, shapely.is_valid_reason(geometries))
+    repaired = geometries.copy()
+    area_change = np.zeros(len(geometries))
+
+    invalid = np.flatnonzero(~valid & ~shapely.is_missing(geometries))
+    if len(invalid):
+        fixed = shapely.make_valid(geometries[invalid])
+        # make_valid pode devolver coleções com linhas/pontos: mantém só os polígonos, por feição.
+        members, owner = shapely.get_parts(fixed, return_index=True)
+        polygons, polygon_owner = shapely.get_parts(members, return_index=True)
+        polygon_owner = owner[polygon_owner]
+        is_polygon = shapely.get_type_id(polygons) == 3
+        polygons, polygon_owner = polygons[is_polygon], polygon_owner[is_polygon]
+
+        counts = np.bincount(polygon_owner, minlength=len(invalid))
+        rebuilt = np.full(len(invalid), None, dtype=object)
+        if len(polygons):
+            # Feições sem parte poligonal (ex: polígono colapsado) deixam buracos nos índices: compacta antes de montar.
+            owners, dense_owner = np.unique(polygon_owner, return_inverse=True)
+            rebuilt[owners] = shapely.multipolygons(polygons, indices=dense_owner)
+        single = counts == 1
+        rebuilt[single] = shapely.get_geometry(rebuilt[single], 0)
+
+        original_area = shapely.area(geometries[invalid])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            area_change[invalid] = np.where(original_area > 0, (shapely.area(rebuilt) - original_area) / original_area, 0.0)
+        repaired[invalid] = rebuilt
+    return repaired, valid, reasons, area_change
+
+
+def validate_features(features: list) -> list:
+    """
+    Validates and repairs the geometries of GeoJSON features, once, at ingest.
+
+    Each feature gets the clean geometry plus the diagnostic properties
+    'geometry_valid', 'geometry_issue' and 'geometry_repair_area_change',
+    which also mark the layer as validated for the map generators.
+
+    :param features: The GeoJSON features produced by a fetch use case (a list or a FeatureAccumulator).
+    :return: The same features, updated in place.
+    """
+    if not features:
+        return features
+    if isinstance(features, FeatureAccumulator):
+        repaired, valid, reasons, area_change = repair_geometries(features.geometries())
+        features.set_geometries(repaired)
+        features.set_column(VALID_PROPERTY, valid)
+        features.set_column(ISSUE_PROPERTY, reasons)
+        features.set_column(AREA_CHANGE_PROPERTY, np.round(area_change, 8))
+    else:
+        valid = _validate_feature_dicts(features)
+
+    n_invalid = int((~valid).sum())
+    print(f"Geometry validation: {len(features) - n_invalid} valid, {n_invalid} repaired.")
+    return features
+
+
+def _validate_feature_dicts(features: list) -> np.ndarray:
+    """Applies the validation to a list of GeoJSON dicts; returns the original validity mask."""
+    geometries = np.array([shape(f['geometry']) if f.get('geometry') else None for f in features], dtype=object)
+    repaired, valid, reasons, area_change = repair_geometries(geometries)
+    for i, feature in enumerate(features):
+        properties = feature.setdefault('properties', {})
+        properties[VALID_PROPERTY] = bool(valid[i])
+        properties[ISSUE_PROPERTY] = reasons[i]
+        properties[AREA_CHANGE_PROPERTY] = round(float(area_change[i]), 8)
+        if not valid[i]:
+            feature['geometry'] = mapping(repaired[i]) if repaired[i] is not None else None
+    return valid
+
+
+def layer_is_validated(path: str) -> bool:
+    """
+    Tells whether a layer file was written with validated geometries, reading
+    only its field list (geometry stores are always cleaned when built).
+    """
+    path, layer, _ = split_layer_path(resolve_dataset_path(path))
+    if path.endswith(GEOMETRY_STORE_SUFFIX):
+        return True
+    key = (path, layer, file_version(path))
+    if key not in _VALIDATED_CACHE:
+        with readable_dataset_path(path) as readable:
+            if PYOGRIO_AVAILABLE:
+                fields = list(pyogrio.read_info(readable, layer=layer)['fields'])
+            else:
+                fields = list(gpd.read_file(readable, layer=layer, rows=1).columns)
+        _VALIDATED_CACHE[key] = VALID_PROPERTY in fields
+    return _VALIDATED_CACHE[key]
+
+
+def ensure_valid(geodataframe: gpd.GeoDataFrame, path: str) -> gpd.GeoDataFrame:
+    """
+    Returns the layer read from `path` with valid geometries: as-is if the file
+    was validated at ingest, otherwise cleaned with buffer(0) (older files).
+    """
+    if layer_is_validated(path):
+        return geodataframe
+    geodataframe['geometry'] = geodataframe.geometry.buffer(0)
+    return geodataframe
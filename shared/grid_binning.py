@@ -0,0 +1,232 @@
+import os
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from shapely import STRtree
+
+from shared.feature_enrichment import EQUAL_AREA_CRS
+from shared.geometry_validation import ensure_valid
+from shared.layer_loader import load_layer, dataset_version
+from shared.reprojection import reproject_geometries
+
+try:
+    from scipy import sparse
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+GRID_FORMAT_VERSION = 1
+GRID_KINDS = ('hex', 'square')
+
+_GRID_CACHE: dict = {}
+
+
+def grid_cells(bounds: tuple, kind: str = 'hex', cell_size: float = 10_000.0) -> np.ndarray:
+    """
+    Builds a regular grid covering `bounds`, all at once.
+
+    :param bounds: (minx, miny, maxx, maxy), in an equal-area CRS.
+    :param kind: 'hex' (flat-top hexagons) or 'square'.
+    :param cell_size: The side of a square with the same area as each cell, in CRS units,
+        so hex and square grids of the same size have cells of the same area.
+    :return: An object array of polygons.
+    """
+    if kind not in GRID_KINDS:
+        raise ValueError(f"Unknown grid kind '{kind}'. Use one of {GRID_KINDS}.")
+    minx, miny, maxx, maxy = bounds
+    if kind == 'square':
+        xs = np.arange(minx, max(maxx, minx + cell_size), cell_size)
+        ys = np.arange(miny, max(maxy, miny + cell_size), cell_size)
+        x0, y0 = (a.ravel() for a in np.meshgrid(xs, ys))
+        return shapely.box(x0, y0, x0 + cell_size, y0 + cell_size)
+
+    # Hexágono de lado `side` com a mesma área do quadrado: 3√3/2 · side² = cell_size².
+    side = cell_size * np.sqrt(2 / (3 * np.sqrt(3)))
+    height = np.sqrt(3) * side
+    columns = np.arange(int(np.ceil((maxx - minx) / (1.5 * side))) + 2)
+    rows = np.arange(int(np.ceil((maxy - miny) / height)) + 2)
+    column, row = (a.ravel() for a in np.meshgrid(columns, rows))
+    centers_x = minx + column * 1.5 * side
+    centers_y = miny + row * height + (column % 2) * height / 2
+    angles = np.deg2rad(np.arange(0, 360, 60))
+    vertices = np.stack([
+        centers_x[:, None] + side * np.cos(angles)[None, :],
+        centers_y[:, None] + side * np.sin(angles)[None, :],
+    ], axis=-1)
+    return shapely.polygons(vertices)
+
+
+class GridBinning:
+    """
+    An equal-area grid over a mask (e.g. a state) and its overlap with a
+    polygon layer (e.g. the municipalities), as a sparse matrix.
+
+    `overlap[i, j]` is the area shared by cell i and polygon j. Building it
+    costs one STRtree query and one vectorized intersection; afterwards any
+    variable of the polygons is moved to the cells with a single sparse
+    matrix-vector product (see apportion), so mapping another column never
+    touches the geometry again.
+    """
+
+    def __init__(self, cells: np.ndarray, source_codes: np.ndarray, rows: np.ndarray, columns: np.ndarray,
+                 areas: np.ndarray, source_areas: np.ndarray, version: str = None):
+        """
+        :param cells: The grid cells clipped to the mask (equal-area CRS).
+        :param source_codes: The code (e.g. IBGE 'codarea') of each source polygon, in column order.
+        :param rows, columns, areas: The non-zero overlaps (cell index, polygon index, shared area).
+        :param source_areas: The full area of each source polygon.
+        :param version: The version of the source files (see dataset_version).
+        """
+        self.cells = np.asarray(cells, dtype=object)
+        self.source_codes = np.asarray(source_codes, dtype=np.int64)
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.columns = np.asarray(columns, dtype=np.int64)
+        self.areas = np.asarray(areas, dtype=np.float64)
+        self.source_areas = np.asarray(source_areas, dtype=np.float64)
+        self.version = version
+        shape = (len(self.cells), len(self.source_codes))
+        self.overlap = sparse.csr_matrix((self.areas, (self.rows, self.columns)), shape=shape) if SCIPY_AVAILABLE else None
+        # Área de cada célula coberta pelos polígonos de origem.
+        self.covered_area = self._multiply(np.ones(shape[1]))
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    @classmethod
+    def build(cls, mask, geometries, codes, kind: str = 'hex', cell_size: float = 10_000.0, version: str = None) -> "GridBinning":
+        """
+        Builds the grid over a mask and its overlap with a polygon layer.
+
+        :param mask: The area to cover (a shapely geometry), in an equal-area CRS.
+        :param geometries: The source polygons, in the same CRS.
+        :param codes: The code of each source polygon.
+        :param kind: 'hex' or 'square'.
+        :param cell_size: The side of a square with the area of one cell, in CRS units.
+        """
+        geometries = np.asarray(geometries, dtype=object)
+        cells = grid_cells(shapely.bounds(mask), kind, cell_size)
+        # Só as células que tocam a máscara, recortadas por ela (as da borda ficam parciais).
+        cells = shapely.intersection(cells[STRtree(cells).query(mask, predicate='intersects')], mask)
+        cells = cells[shapely.area(cells) > 0]
+
+        cell_index, source_index = STRtree(geometries).query(cells, predicate='intersects')
+        areas = shapely.area(shapely.intersection(cells[cell_index], geometries[source_index]))
+        keep = areas > 0
+        return cls(cells, codes, cell_index[keep], source_index[keep], areas[keep], shapely.area(geometries), version=version)
+
+    @classmethod
+    def from_layers(cls, uf: str, states_path: str, municipalities_path: str, kind: str = 'hex', cell_size_km: float = 10.0) -> "GridBinning":
+        """
+        Builds the grid of a state from the files written by the fetch use cases.
+
+        :param uf: The state abbreviation (e.g. 'PE').
+        :param states_path: The states file.
+        :param municipalities_path: The municipality file of the state.
+        :param kind: 'hex' or 'square'.
+        :param cell_size_km: The side of a square with the area of one cell, in km.
+        """
+        states = load_layer(states_path, EQUAL_AREA_CRS, columns=['abbreviation'])
+        state = states[states['abbreviation'] == uf.upper()]
+        if state.empty:
+            raise ValueError(f"State '{uf}' not found.")
+        mask = ensure_valid(state.copy(), states_path).geometry.union_all()
+
+        municipalities = load_layer(municipalities_path, EQUAL_AREA_CRS, mask=mask, columns=['codarea'])
+        municipalities = ensure_valid(municipalities, municipalities_path)
+        municipalities = municipalities[municipalities['codarea'].notna()]
+        return cls.build(
+            mask, municipalities.geometry.values, municipalities['codarea'].astype(np.int64).to_numpy(),
+            kind, cell_size_km * 1000, version=dataset_version([states_path, municipalities_path]),
+        )
+
+    @classmethod
+    def build_or_load(cls, cache_path: str, uf: str, states_path: str, municipalities_path: str,
+                      kind: str = 'hex', cell_size_km: float = 10.0) -> "GridBinning":
+        """
+        Returns the grid of (state, kind, cell size) from memory or from `cache_path`
+        (if given), rebuilding (and persisting) it when the source files changed.
+        """
+        version = f"{dataset_version([states_path, municipalities_path])}:{uf.upper()}:{kind}:{float(cell_size_km)}"
+        key = cache_path or version
+        grid = _GRID_CACHE.get(key)
+        if grid is None and cache_path and os.path.exists(cache_path):
+            grid = cls.load(cache_path)
+        if grid is None or grid.version != version:
+            grid = cls.from_layers(uf, states_path, municipalities_path, kind, cell_size_km)
+            grid.version = version
+            if cache_path:
+                grid.save(cache_path)
+        _GRID_CACHE[key] = grid
+        return grid
+
+    def save(self, path: str) -> None:
+        """Persists the grid as a compressed .npz file (cells as concatenated WKB)."""
+        wkb = shapely.to_wkb(self.cells)
+        offsets = np.zeros(len(wkb) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(w) for w in wkb])
+        np.savez_compressed(
+            path, format_version=GRID_FORMAT_VERSION, version=np.array(self.version or ""),
+            cells_wkb=np.frombuffer(b"".join(wkb), dtype=np.uint8), cells_offsets=offsets,
+            source_codes=self.source_codes, rows=self.rows, columns=self.columns,
+            areas=self.areas, source_areas=self.source_areas,
+        )
+
+    @classmethod
+    def load(cls, path: str):
+        """Loads a persisted grid, or returns None if the file has an old format."""
+        with np.load(path) as data:
+            if int(data['format_version']) != GRID_FORMAT_VERSION:
+                return None
+            blob, offsets = data['cells_wkb'].tobytes(), data['cells_offsets']
+            cells = shapely.from_wkb(np.array([blob[a:b] for a, b in zip(offsets[:-1], offsets[1:])], dtype=object))
+            return cls(cells, data['source_codes'], data['rows'], data['columns'], data['areas'],
+                       data['source_areas'], version=str(data['version']))
+
+    def _multiply(self, vector: np.ndarray) -> np.ndarray:
+        """overlap @ vector (with SciPy when available, otherwise with np.bincount)."""
+        if self.overlap is not None:
+            return self.overlap @ vector
+        return np.bincount(self.rows, weights=self.areas * vector[self.columns], minlength=len(self.cells))
+
+    def align(self, codes, values) -> np.ndarray:
+        """Orders a variable given per code (e.g. a municipality column) as the matrix columns; missing codes get NaN."""
+        series = pd.Series(np.asarray(values, dtype=np.float64), index=np.asarray(codes, dtype=np.int64))
+        series = series[~series.index.duplicated()]
+        return series.reindex(self.source_codes).to_numpy()
+
+    def apportion(self, values: np.ndarray, extensive: bool = True) -> np.ndarray:
+        """
+        Moves a polygon variable (aligned with source_codes, see align) to the cells.
+
+        :param extensive: True for counts (e.g. population): each polygon's total is split
+            among the cells by shared area, so totals are preserved (NaN counts as nothing).
+            False for rates and averages: each cell gets the area-weighted mean of the
+            polygons with data covering it (NaN polygons are left out of the mean, not
+            taken as 0).
+        :return: One value per cell (NaN for cells without data, when intensive).
+        """
+        values = np.asarray(values, dtype=np.float64)
+        has_data = ~np.isnan(values)
+        values = np.where(has_data, values, 0.0)
+        if extensive:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                shares = np.where(self.source_areas > 0, values / self.source_areas, 0.0)
+            return self._multiply(shares)
+        # Média ponderada só pelos polígonos com dado: o peso de cada célula é a área coberta por eles.
+        weights = self._multiply(has_data.astype(np.float64))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(weights > 0, self._multiply(values) / weights, np.nan)
+
+    def cell_areas_km2(self) -> np.ndarray:
+        """The area of each (clipped) cell in km²."""
+        return shapely.area(self.cells) / 1e6
+
+    def to_geodataframe(self, columns: dict = None, crs: str = None) -> gpd.GeoDataFrame:
+        """
+        Returns the cells as a GeoDataFrame with the given columns (name -> one value per cell),
+        reprojected to `crs` when given.
+        """
+        cells = self.cells if crs is None else reproject_geometries(self.cells, EQUAL_AREA_CRS, crs)
+        return gpd.GeoDataFrame(columns or {}, geometry=gpd.GeoSeries(cells, crs=crs or EQUAL_AREA_CRS))
@@ -1,22 +1,214 @@
+import threading
+import time
+from contextlib import contextmanager
+
 import requests
 import pandas as pd
 
+from shared.json_codec import iter_features, loads
+
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 }
 API_TIMEOUT = 30
+MAX_RETRIES = 3
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Malhas de municípios (em lote e individuais) sempre pela mesma versão da API.
+MESH_API_V3_URL = "https://servicodados.ibge.gov.br/api/v3/malhas"
 
-def _fetch_request(url: str):
-    """Helper function to make GET requests with standardized error handling."""
-    try:
-        response = requests.get(url, headers=HEADERS, timeout=API_TIMEOUT)
+
+class CircuitBreaker:
+    """
+    Pauses every request while the API is down (network errors and 5xx; 429 is left to the AIMD controller).
+
+    After `failure_threshold` consecutive failures the circuit opens and requests
+    wait `open_seconds`; then a single probe request is let through (half-open).
+    A successful probe closes the circuit, a failed one reopens it for twice as
+    long (up to `max_open_seconds`). A throttled probe (429) says nothing about
+    availability: it just releases the probe slot and reopens for the same time.
+    """
+
+    def __init__(self, failure_threshold: int = 5, open_seconds: float = 5.0, max_open_seconds: float = 120.0):
+        self.failure_threshold = failure_threshold
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.open_seconds = open_seconds
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def wait_until_allowed(self) -> None:
+        """Blocks while the circuit is open; in half-open state lets a single probe through."""
+        while True:
+            with self._lock:
+                if self.state == 'closed':
+                    return
+                remaining = self.opened_at + self.open_seconds - time.monotonic()
+                if remaining <= 0 and not self._probe_in_flight:
+                    self.state = 'half-open'
+                    self._probe_in_flight = True
+                    return
+            time.sleep(max(0.05, min(remaining, 1.0)))
+
+    def release_probe(self) -> None:
+        """
+        Ends a probe without a verdict (e.g. a 429): the circuit goes back to open
+        for the current `open_seconds`, so another probe is let through later.
+        """
+        with self._lock:
+            if self._probe_in_flight:
+                self._probe_in_flight = False
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def record(self, success: bool) -> None:
+        with self._lock:
+            self._probe_in_flight = False
+            if success:
+                self.state = 'closed'
+                self.consecutive_failures = 0
+                self.open_seconds = self.base_open_seconds
+                return
+            self.consecutive_failures += 1
+            if self.state == 'half-open':
+                self.open_seconds = min(self.open_seconds * 2, self.max_open_seconds)
+            if self.state == 'half-open' or self.consecutive_failures >= self.failure_threshold:
+                if self.state != 'open':
+                    print(f"\nIBGE API unavailable: pausing requests for {self.open_seconds:.0f}s.")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+class AdaptiveConcurrencyController:
+    """
+    AIMD (additive increase, multiplicative decrease) limit on concurrent requests.
+
+    Every healthy response (fast, not throttled) grows the limit by 1/limit, i.e.
+    about +1 per "round" of requests; a 429/5xx, a network error or a latency
+    spike (above `spike_factor` times the smoothed latency) halves it, at most
+    once per smoothed latency window so one burst of failures counts as one signal.
+    """
+
+    def __init__(self, initial_limit: float = 2.0, min_limit: float = 1.0, max_limit: float = 16.0,
+                 decrease_factor: float = 0.5, spike_factor: float = 3.0):
+        self.limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.spike_factor = spike_factor
+        self.in_flight = 0
+        self.latency_ewma = None
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def slot(self):
+        """Waits for a free slot under the current limit and holds it during the request."""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def record(self, latency: float, success: bool, throttled: bool = False) -> None:
+        """Updates the limit with the outcome of one request."""
+        with self._condition:
+            self.requests += 1
+            self.errors += 0 if success else 1
+            self.throttled += 1 if throttled else 0
+            spike = self.latency_ewma is not None and latency > self.spike_factor * self.latency_ewma
+            if success and not spike:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            else:
+                now = time.monotonic()
+                if now - self._last_decrease > (self.latency_ewma or 1.0):
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+            if success:
+                self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+            self._condition.notify_all()
+
+    def metrics(self) -> dict:
+        with self._condition:
+            return {
+                'limit': round(self.limit, 2), 'in_flight': self.in_flight, 'requests': self.requests,
+                'errors': self.errors, 'throttled': self.throttled,
+                'latency_ms': round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+            }
+
+
+_CONTROLLER = AdaptiveConcurrencyController()
+_BREAKER = CircuitBreaker()
+
+
+def get_request_metrics() -> dict:
+    """Returns the request metrics, including the current concurrency limit and the circuit state."""
+    metrics = _CONTROLLER.metrics()
+    metrics['circuit'] = _BREAKER.state
+    return metrics
+
+
+def max_concurrency() -> int:
+    """The highest concurrency the controller may reach (size thread pools with it)."""
+    return int(_CONTROLLER.max_limit)
+
+
+def _fetch_request(url: str, stream_features: bool = False):
+    """
+    Helper function to make GET requests with standardized error handling.
+    Safe to call from many threads: the adaptive controller decides how many run at once.
+
+    :param stream_features: For large FeatureCollection responses: parse the body
+        incrementally while it downloads and return only the list of features.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        _BREAKER.wait_until_allowed()
+        with _CONTROLLER.slot():
+            start = time.perf_counter()
+            try:
+                response, error = requests.get(url, headers=HEADERS, timeout=API_TIMEOUT, stream=stream_features), None
+            except requests.exceptions.RequestException as e:
+                response, error = None, e
+            latency = time.perf_counter() - start
+
+        if response is None or response.status_code in RETRY_STATUS_CODES:
+            throttled = response is not None and response.status_code == 429
+            _CONTROLLER.record(latency, success=False, throttled=throttled)
+            if throttled:
+                _BREAKER.release_probe()  # 429 é limitação de taxa, tratada pelo AIMD: só libera a sonda, se for ela.
+            else:
+                _BREAKER.record(success=False)
+            if attempt == MAX_RETRIES:
+                print(f"\nAPI ERROR at URL {url}: {error or f'HTTP {response.status_code}'}")
+                return None
+            retry_after = response.headers.get('Retry-After', '') if response is not None else ''
+            time.sleep(float(retry_after) if retry_after.isdigit() else 0.5 * 2 ** attempt)
+            continue
+
+        _CONTROLLER.record(latency, success=True)
+        _BREAKER.record(success=True)
         if response.status_code == 404:
             return None
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"\nAPI ERROR at URL {url}: {e}")
-        return None
+        try:
+            response.raise_for_status()
+            if stream_features:
+                response.raw.decode_content = True  # Descomprime o gzip do HTTP durante a leitura.
+                return list(iter_features(response.raw))
+            return loads(response.content)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"\nAPI ERROR at URL {url}: {e}")
+            return None
+    return None
 
 def fetch_states():
     """Fetches all Brazilian states and returns them as a DataFrame."""
@@ -51,16 +243,59 @@ def fetch_regions_by_state(state_id: str, region_type: str):
         return df
     return None
 
+def _optional_id(locality: dict):
+    """The id of a nested locality as a string, or None when it is missing (never '', which would group)."""
+    return str(locality['id']) if locality.get('id') is not None else None
+
+def fetch_municipality_region_mapping():
+    """
+    Fetches, in a single request, every municipality with its immediate region,
+    intermediate region and state, and returns them as a DataFrame.
+    """
+    data = _fetch_request("https://servicodados.ibge.gov.br/api/v1/localidades/municipios")
+    if not data:
+        return None
+
+    rows = []
+    for municipality in data:
+        immediate = municipality.get('regiao-imediata') or {}
+        intermediate = immediate.get('regiao-intermediaria') or {}
+        state = intermediate.get('UF') or {}
+        rows.append({
+            'municipality_id': str(municipality['id']),
+            'municipality_name': municipality['nome'],
+            'immediate_region_id': _optional_id(immediate),
+            'immediate_region_name': immediate.get('nome'),
+            'intermediate_region_id': _optional_id(intermediate),
+            'intermediate_region_name': intermediate.get('nome'),
+            'state_id': _optional_id(state),
+            'state_abbreviation': state.get('sigla'),
+            'state_name': state.get('nome'),
+        })
+    return pd.DataFrame(rows)
+
 def fetch_geojson_mesh(locality_type: str, locality_id: str):
     """Gets the GeoJSON mesh for any type of locality."""
     # locality_type: 'estados', 'municipios', 'regioes-imediatas', 'regioes-intermediarias'
     base_url = "https://servicodados.ibge.gov.br/api/v2/malhas"
+    if locality_type == "municipios":
+        # Mesma versão (v3) da malha em lote: as duas fontes são mescladas no mesmo arquivo.
+        return _fetch_request(f"{MESH_API_V3_URL}/municipios/{locality_id}?formato=application/vnd.geo+json")
     if locality_type.startswith("regioes"):
         base_url = "https://servicodados.ibge.gov.br/api/v4/malhas" # API v4 for regions
         return _fetch_request(f"{base_url}/{locality_type}/{locality_id}?formato=application/vnd.geo+json")
     
     return _fetch_request(f"{base_url}/{locality_id}?formato=application/vnd.geo+json")
 
+def fetch_bulk_mesh(state_id: str, subdivision: str = "municipio"):
+    """
+    Gets, in a single request, the meshes of every subdivision of a state
+    (e.g. all of its municipalities) as a list of GeoJSON features, each with
+    its 'codarea'. The response is parsed incrementally while it downloads.
+    """
+    url = f"{MESH_API_V3_URL}/estados/{state_id}?formato=application/vnd.geo+json&intrarregiao={subdivision}"
+    return _fetch_request(url, stream_features=True)
+
 def fetch_population(locality_level: str, locality_id: str):
     """Gets the population for a given level (N3=state, N6=municipality) and ID."""
     url = f"https://servicodados.ibge.gov.br/api/v3/agregados/6579/periodos/2021/variaveis/9324?localidades={locality_level}[{locality_id}]"
@@ -0,0 +1,213 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+from collections import namedtuple
+from contextlib import contextmanager
+
+from shared import json_codec
+
+# Estados de um job.
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 5
+BUSY_TIMEOUT_MS = 30_000
+
+Job = namedtuple('Job', ['locality_type', 'locality_id', 'endpoint', 'payload', 'attempts'])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    locality_type TEXT NOT NULL,
+    locality_id   TEXT NOT NULL,
+    endpoint      TEXT NOT NULL,
+    payload       TEXT,
+    status        TEXT NOT NULL DEFAULT 'pending',
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    lease_expires REAL,
+    worker        TEXT,
+    result        BLOB,
+    error         TEXT,
+    updated_at    REAL,
+    PRIMARY KEY (locality_type, locality_id, endpoint)
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, lease_expires);
+"""
+
+
+def default_worker_id() -> str:
+    """A worker id that is unique across hosts, processes and threads (host:pid:thread)."""
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+class JobQueue:
+    """
+    A durable job queue stored in a local SQLite file.
+
+    Each job is one (locality type, id, endpoint) request. Workers claim jobs
+    with a lease: a claimed job that is not completed before its lease expires
+    (e.g. because the worker process died) becomes claimable again, so a crawl
+    resumes exactly where it stopped. Results are committed one by one, so
+    nothing already downloaded is lost.
+
+    Any number of processes may share the file; claims run inside an IMMEDIATE
+    transaction, so a job is never handed to two workers at once. Workers on
+    other hosts need the file on a shared file system with working locks; use
+    journal_mode='DELETE' there, since WAL requires shared memory on one host.
+    One JobQueue (one connection) per thread.
+    """
+
+    def __init__(self, path: str, journal_mode: str = 'WAL', max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        """
+        :param path: The SQLite file (created if it does not exist).
+        :param journal_mode: 'WAL' (one host) or 'DELETE' (a file shared between hosts).
+        :param max_attempts: Attempts before a job is marked as failed.
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        # isolation_level=None: as transações são abertas explicitamente (BEGIN IMMEDIATE).
+        self._connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+        self._connection.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        self._connection.execute(f"PRAGMA journal_mode = {journal_mode}")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def enqueue(self, jobs) -> int:
+        """
+        Adds jobs; jobs that already exist (in any status) are left untouched, so
+        seeding the same crawl again is harmless.
+
+        :param jobs: An iterable of (locality_type, locality_id, endpoint, payload dict or None).
+        :return: The number of new jobs.
+        """
+        rows = [(t, str(i), e, json.dumps(p, ensure_ascii=False) if p is not None else None, time.time()) for t, i, e, p in jobs]
+        with self._transaction():
+            before = self._connection.total_changes
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO jobs (locality_type, locality_id, endpoint, payload, updated_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            return self._connection.total_changes - before
+
+    def claim(self, worker_id: str = None, limit: int = 1, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> list:
+        """
+        Claims up to `limit` pending jobs (or leased jobs whose lease expired).
+        An expired job that already used all its attempts (e.g. it crashes its
+        worker every time) is marked as failed instead of being handed out again.
+
+        :return: A list of Job records, empty when there is nothing to claim right now.
+        """
+        worker_id = worker_id or default_worker_id()
+        now = time.time()
+        with self._transaction():
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                (FAILED, "lease expired on the last attempt", now, LEASED, now, self.max_attempts),
+            )
+            rows = self._connection.execute(
+                """SELECT locality_type, locality_id, endpoint, payload, attempts FROM jobs
+                   WHERE status = ? OR (status = ? AND lease_expires < ?)
+                   LIMIT ?""",
+                (PENDING, LEASED, now, limit),
+            ).fetchall()
+            self._connection.executemany(
+                """UPDATE jobs SET status = ?, worker = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ?
+                   WHERE locality_type = ? AND locality_id = ? AND endpoint = ?""",
+                [(LEASED, worker_id, now + lease_seconds, now, t, i, e) for t, i, e, _, _ in rows],
+            )
+        return [Job(t, i, e, json.loads(p) if p else None, attempts + 1) for t, i, e, p, attempts in rows]
+
+    def complete(self, job: Job, result=None, worker_id: str = None) -> bool:
+        """
+        Stores a job's result (any JSON value, compressed) and marks it done.
+        Returns False if the lease was lost (the job was reclaimed by another worker).
+        """
+        blob = zlib.compress(json_codec.dumps(result)) if result is not None else None
+        return self._finish(job, worker_id, "status = ?, result = ?, error = NULL", (DONE, blob))
+
+    def fail(self, job: Job, error: str, worker_id: str = None) -> bool:
+        """Records a failed attempt: the job goes back to the queue, or to 'failed' after max_attempts."""
+        status = FAILED if job.attempts >= self.max_attempts else PENDING
+        return self._finish(job, worker_id, "status = ?, error = ?, lease_expires = NULL", (status, str(error)))
+
+    def _finish(self, job: Job, worker_id: str, assignments: str, values: tuple) -> bool:
+        worker_id = worker_id or default_worker_id()
+        with self._transaction():
+            cursor = self._connection.execute(
+                f"""UPDATE jobs SET {assignments}, updated_at = ?
+                    WHERE locality_type = ? AND locality_id = ? AND endpoint = ? AND status = ? AND worker = ?""",
+                values + (time.time(), job.locality_type, job.locality_id, job.endpoint, LEASED, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def retry_failed(self) -> int:
+        """Puts every failed job back in the queue with a fresh attempt count."""
+        with self._transaction():
+            cursor = self._connection.execute(
+                "UPDATE jobs SET status = ?, attempts = 0, error = NULL, updated_at = ? WHERE status = ?",
+                (PENDING, time.time(), FAILED),
+            )
+            return cursor.rowcount
+
+    def counts(self) -> dict:
+        """Number of jobs per status."""
+        counts = dict.fromkeys((PENDING, LEASED, DONE, FAILED), 0)
+        counts.update(self._connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return counts
+
+    def result(self, locality_type: str, locality_id, endpoint: str):
+        """Returns the result of one finished job, or None if it is not done."""
+        row = self._connection.execute(
+            "SELECT result FROM jobs WHERE locality_type = ? AND locality_id = ? AND endpoint = ? AND status = ?",
+            (locality_type, str(locality_id), endpoint, DONE),
+        ).fetchone()
+        return json_codec.loads(zlib.decompress(row[0])) if row and row[0] is not None else None
+
+    def results(self, endpoint: str, locality_type: str = None):
+        """
+        Yields (locality_id, payload, result) for the finished jobs of an endpoint,
+        ordered by id. Results are decompressed one at a time.
+        """
+        query = "SELECT locality_id, payload, result FROM jobs WHERE endpoint = ? AND status = ?"
+        params = [endpoint, DONE]
+        if locality_type is not None:
+            query += " AND locality_type = ?"
+            params.append(locality_type)
+        for locality_id, payload, blob in self._connection.execute(query + " ORDER BY locality_id", params):
+            yield locality_id, json.loads(payload) if payload else None, json_codec.loads(zlib.decompress(blob)) if blob is not None else None
+
+    def jobs(self, endpoint: str, locality_type: str = None):
+        """Yields (locality_id, payload, status) for every job of an endpoint, ordered by id."""
+        query = "SELECT locality_id, payload, status FROM jobs WHERE endpoint = ?"
+        params = [endpoint]
+        if locality_type is not None:
+            query += " AND locality_type = ?"
+            params.append(locality_type)
+        for locality_id, payload, status in self._connection.execute(query + " ORDER BY locality_id", params):
+            yield locality_id, json.loads(payload) if payload else None, status
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT/ROLLBACK: takes the write lock up front, so claims never race."""
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._connection
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
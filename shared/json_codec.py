@@ -0,0 +1,153 @@
+"""
+JSON codec used on the hot paths (API responses, GeoJSON files).
+
+Uses orjson when it is installed and falls back to the standard library, with
+the same interface either way. `iter_features` parses a FeatureCollection
+incrementally from a stream, yielding one feature at a time, so large files
+and responses are never decoded (or held as text) all at once.
+"""
+
+import codecs
+import json
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+READ_CHUNK_CHARS = 1024 * 1024
+_WHITESPACE = " \t\n\r"
+_DECODER = json.JSONDecoder()
+
+
+def loads(data):
+    """Decodes JSON from bytes or str."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj, indent: bool = False) -> bytes:
+    """Encodes an object as UTF-8 JSON bytes (non-ASCII characters are kept as-is)."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | (orjson.OPT_INDENT_2 if indent else 0))
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode('utf-8')
+
+
+def dump_feature_collection(features, stream, indent: bool = False) -> int:
+    """
+    Writes a FeatureCollection to a binary stream one feature at a time, so the
+    full document is never built in memory.
+
+    :param features: An iterable of GeoJSON features (may be a generator).
+    :param stream: A binary stream opened for writing.
+    :param indent: Pretty-print each feature.
+    :return: The number of features written.
+    """
+    separator = b",\n" if indent else b","
+    stream.write(b'{"type": "FeatureCollection", "features": [\n' if indent else b'{"type":"FeatureCollection","features":[')
+    count = 0
+    for feature in features:
+        if count:
+            stream.write(separator)
+        stream.write(dumps(feature, indent=indent))
+        count += 1
+    stream.write(b"\n]}\n" if indent else b"]}")
+    return count
+
+
+class _StreamBuffer:
+    """A growing text window over a stream, consumed from the left."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+        # Streams binários são decodificados incrementalmente (um caractere UTF-8 pode cruzar dois blocos).
+        self._decoder = None if isinstance(stream.read(0), str) else codecs.getincrementaldecoder('utf-8')()
+
+    def fill(self) -> bool:
+        """Reads one more chunk. Returns False at the end of the stream."""
+        if self.eof:
+            return False
+        chunk = self.stream.read(READ_CHUNK_CHARS)
+        if self._decoder is not None:
+            chunk = self._decoder.decode(chunk, final=not chunk)
+        if not chunk:
+            self.eof = True
+            return False
+        # Descarta o que já foi consumido, para a janela não crescer indefinidamente.
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def skip_whitespace(self) -> str:
+        """Skips whitespace and returns the next character ('' at the end of the stream)."""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        if self.skip_whitespace() != char:
+            raise ValueError(f"Invalid GeoJSON stream: expected '{char}' at offset {self.pos}.")
+        self.pos += 1
+
+    def value(self):
+        """Decodes the next JSON value, reading more chunks while it is incomplete."""
+        self.skip_whitespace()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # Um número no fim da janela pode estar truncado: garante que há algo depois dele.
+            if end == len(self.text) and not self.eof and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_features(stream):
+    """
+    Yields the features of a GeoJSON FeatureCollection read incrementally from a stream.
+
+    Only the feature being decoded (plus one read chunk) is held in memory.
+    Top-level members other than "features" (type, crs, name...) are skipped.
+
+    :param stream: A text or binary stream (e.g. from open_dataset or an HTTP response).
+    """
+    buffer = _StreamBuffer(stream)
+    buffer.expect('{')
+    while True:
+        char = buffer.skip_whitespace()
+        if char == '}' or char == '':
+            return
+        if char == ',':
+            buffer.pos += 1
+            continue
+        key = buffer.value()
+        buffer.expect(':')
+        if key != 'features':
+            buffer.value()
+            continue
+
+        buffer.expect('[')
+        while True:
+            char = buffer.skip_whitespace()
+            if char == ']':
+                buffer.pos += 1
+                break
+            if char == ',':
+                buffer.pos += 1
+                continue
+            if char == '':
+                raise ValueError("Invalid GeoJSON stream: unterminated 'features' array.")
+            yield buffer.value()
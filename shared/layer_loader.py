@@ -0,0 +1,206 @@
+import os
+import hashlib
+from collections import OrderedDict
+
+import geopandas as gpd
+import shapely
+from shapely.geometry import box
+
+from shared.file_utils import readable_dataset_path, resolve_dataset_path, split_layer_path
+from shared.geometry_store import GEOMETRY_STORE_SUFFIX, attach_geometry_store
+from shared.reprojection import reproject
+
+try:
+    import pyogrio
+    PYOGRIO_AVAILABLE = True
+except ImportError:
+    PYOGRIO_AVAILABLE = False
+
+try:
+    import pyarrow  # noqa: F401 (habilita a leitura vetorizada via Arrow no pyogrio)
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+# Cache LRU em memória: (caminho, projeção, filtros) -> (versão do arquivo, GeoDataFrame)
+_LAYER_CACHE: OrderedDict = OrderedDict()
+_LAYER_CACHE_MAX_ENTRIES = 8
+
+# Memo do geometry_version: caminho absoluto -> (versão do arquivo, coluna do código, digest das geometrias)
+_GEOMETRY_VERSIONS: dict = {}
+
+
+def set_layer_cache_size(max_entries: int):
+    """
+    Sets how many layers are kept resident in memory (least recently used are evicted).
+    Long-running processes (e.g. the map server) raise it to hold every layer.
+    """
+    global _LAYER_CACHE_MAX_ENTRIES
+    _LAYER_CACHE_MAX_ENTRIES = max_entries
+    while len(_LAYER_CACHE) > _LAYER_CACHE_MAX_ENTRIES:
+        _LAYER_CACHE.popitem(last=False)
+
+
+def clear_layer_cache():
+    """Drops every layer kept in memory."""
+    _LAYER_CACHE.clear()
+
+
+def file_version(path: str) -> tuple:
+    """Returns a cheap version stamp for a file: (modification time in ns, size)."""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def dataset_version(paths) -> str:
+    """
+    Returns a short digest identifying the current version of a set of files.
+    Missing files are part of the digest too, so creating them changes the version.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for path in sorted(paths):
+        path = split_layer_path(resolve_dataset_path(path))[0]
+        version = file_version(path) if os.path.exists(path) else "missing"
+        digest.update(f"{os.path.abspath(path)}:{version}".encode())
+    return digest.hexdigest()
+
+
+def geometry_version(paths, code_column: str = 'codarea') -> str:
+    """
+    Returns a short digest of the codes and geometries (WKB) of a set of files,
+    ignoring every other attribute. Caches derived from the geometry alone (e.g.
+    a contiguity graph) stay valid when a use case rewrites a file only to add
+    attribute columns. Each file is hashed once per file version.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for path in sorted(paths):
+        file_path = os.path.abspath(split_layer_path(resolve_dataset_path(path))[0])
+        if not os.path.exists(file_path):
+            digest.update(f"{file_path}:missing".encode())
+            continue
+        version = file_version(file_path)
+        memo = _GEOMETRY_VERSIONS.get(file_path)
+        if memo is None or memo[:2] != (version, code_column):
+            gdf = load_layer(path, columns=[code_column])
+            content = hashlib.blake2b(digest_size=16)
+            content.update("\n".join(map(str, gdf[code_column].tolist())).encode())
+            for wkb in shapely.to_wkb(gdf.geometry.values):
+                content.update(wkb or b"")
+            memo = _GEOMETRY_VERSIONS[file_path] = (version, code_column, content.hexdigest())
+        digest.update(f"{file_path}:{memo[2]}".encode())
+    return digest.hexdigest()
+
+
+def _file_crs(path: str, layer: str = None):
+    """Returns the CRS stored in a (readable, see readable_dataset_path) file without reading its features."""
+    if path.endswith(GEOMETRY_STORE_SUFFIX):
+        # Só os metadados são lidos: o mapeamento é desfeito logo em seguida.
+        with attach_geometry_store(path) as store:
+            return store.crs
+    if PYOGRIO_AVAILABLE:
+        return pyogrio.read_info(path, layer=layer)['crs']
+    return gpd.read_file(path, layer=layer, rows=1).crs
+
+
+def _read_filtered(path: str, projection: str, bbox, mask, columns, layer: str = None, where: str = None) -> gpd.GeoDataFrame:
+    """
+    Reads a file, keeping only the features intersecting bbox/mask and only the
+    requested columns (when given). The filters are pushed down to the I/O engine (pyogrio + Arrow when available).
+    Compressed files (.gz, .zst) are read as streams.
+    """
+    if path.endswith(GEOMETRY_STORE_SUFFIX):
+        return _read_readable(path, projection, bbox, mask, columns)
+    with readable_dataset_path(path) as readable:
+        return _read_readable(readable, projection, bbox, mask, columns, layer, where)
+
+
+def _read_readable(path: str, projection: str, bbox, mask, columns, layer: str = None, where: str = None) -> gpd.GeoDataFrame:
+    """Reads a path GDAL can open directly (see readable_dataset_path) with the filters pushed down."""
+    spatial_filter = {}
+    if bbox is not None or mask is not None:
+        file_crs = _file_crs(path, layer)
+        # Os filtros chegam na projeção do mapa; o motor de leitura os espera na projeção do arquivo.
+        geometry = box(*bbox) if mask is None else mask
+        if projection is not None and file_crs is not None:
+            geometry = gpd.GeoSeries([geometry], crs=projection).to_crs(file_crs).iloc[0]
+        if mask is None:
+            spatial_filter['bbox'] = tuple(geometry.bounds)
+        else:
+            spatial_filter['mask'] = geometry
+
+    if path.endswith(GEOMETRY_STORE_SUFFIX):
+        # Camada convertida em store Arrow mapeado em memória: só as linhas filtradas são decodificadas.
+        with attach_geometry_store(path) as store:
+            return store.to_geodataframe(columns=columns, **spatial_filter)
+
+    if PYOGRIO_AVAILABLE:
+        # Em um GeoPackage, bbox/mask usam o índice R-tree e `where` os índices de atributos.
+        return gpd.read_file(path, engine='pyogrio', use_arrow=ARROW_AVAILABLE, layer=layer, where=where, columns=columns, **spatial_filter)
+
+    if where is not None:
+        raise ValueError("Attribute filters (where) require pyogrio.")
+    gdf = gpd.read_file(path, layer=layer, **spatial_filter)
+    if columns is not None:
+        gdf = gdf[[c for c in columns if c in gdf.columns] + [gdf.geometry.name]]
+    return gdf
+
+
+def _filter_in_memory(gdf: gpd.GeoDataFrame, bbox, mask, columns) -> gpd.GeoDataFrame:
+    """Applies the load_layer filters to a layer already in memory, using its spatial index."""
+    if bbox is not None or mask is not None:
+        gdf = gdf.iloc[gdf.sindex.query(box(*bbox) if mask is None else mask, predicate='intersects')]
+    if columns is not None:
+        gdf = gdf[[c for c in columns if c in gdf.columns] + [gdf.geometry.name]]
+    return gdf.copy()
+
+
+def load_layer(path: str, projection: str = None, bbox: tuple = None, mask=None, columns: list = None, where: str = None) -> gpd.GeoDataFrame:
+    """
+    Reads a geographic layer, optionally reprojecting it, keeping the result in memory.
+
+    A repeated call for an unchanged file returns a copy of the cached layer
+    instead of parsing the file again; if the file changed on disk it is reloaded.
+    The bbox/mask/columns filters are applied while reading, so a small state
+    only touches the features (and attributes) it actually needs.
+
+    :param path: The path of the geographic file (e.g. a .geojson, a compressed .geojson.gz/.geojson.zst,
+        or a geometry store '.arrow'). If it doesn't exist, a compressed copy of it is used. A layer
+        of a multi-layer database is given as 'file#layer', optionally with equality filters
+        (e.g. 'output/0-brasil.gpkg#municipalities?state_abbreviation=PE', see split_layer_path).
+    :param projection: The target CRS (e.g. 'epsg:3857'). None keeps the file's CRS.
+    :param bbox: Only read features intersecting this (minx, miny, maxx, maxy), given in `projection`.
+    :param mask: Only read features intersecting this shapely geometry, given in `projection`.
+    :param columns: Only read these attribute columns (the geometry is always read). None reads all.
+    :param where: Only read rows matching this SQL condition (e.g. "state_abbreviation = 'PE'").
+    :return: A GeoDataFrame that the caller is free to modify.
+    """
+    path, layer, layer_where = split_layer_path(resolve_dataset_path(path))
+    if layer_where is not None:
+        where = layer_where if where is None else f"({layer_where}) AND ({where})"
+    mask_key = shapely.to_wkb(mask) if mask is not None else None
+    bbox_key = tuple(float(v) for v in bbox) if bbox is not None else None
+    columns_key = tuple(columns) if columns is not None else None
+    layer_key = (os.path.abspath(path), layer)
+    key = (layer_key, projection, bbox_key, mask_key, columns_key, where)
+    version = file_version(path)
+
+    cached = _LAYER_CACHE.get(key)
+    if cached is not None and cached[0] == version:
+        _LAYER_CACHE.move_to_end(key)
+        return cached[1].copy()
+
+    # Se a camada completa já está residente (ex: servidor de mapas), filtra em memória.
+    full = _LAYER_CACHE.get((layer_key, projection, None, None, None, None))
+    if where is None and full is not None and full[0] == version:
+        return _filter_in_memory(full[1], bbox, mask, columns)
+
+    gdf = _read_filtered(path, projection, bbox, mask, columns, layer, where)
+    if projection is not None:
+        # Memoizado por (conteúdo lido, versão do arquivo, CRS): sobrevive à saída da camada do cache.
+        gdf = reproject(gdf, projection, version_key=key[:1] + key[2:] + (version,))
+
+    _LAYER_CACHE[key] = (version, gdf)
+    _LAYER_CACHE.move_to_end(key)
+    while len(_LAYER_CACHE) > _LAYER_CACHE_MAX_ENTRIES:
+        _LAYER_CACHE.popitem(last=False)
+    return gdf.copy()
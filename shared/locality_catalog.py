@@ -0,0 +1,212 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from shared.ibge_api import fetch_municipality_region_mapping
+
+CATALOG_FORMAT_VERSION = 1
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "output", "0-locality-catalog.npz")
+
+_REGION_TYPES = {'regioes-imediatas': 'immediate', 'regioes-intermediarias': 'intermediate'}
+
+
+class LocalityCatalog:
+    """
+    Indexed, in-memory catalog of the Brazilian locality hierarchy
+    (state > intermediate region > immediate region > municipality).
+
+    It is built from a single bulk '/localidades/municipios' download. The data
+    is kept in compact typed NumPy arrays (one row per municipality, one per
+    region and per state) and dict indexes give O(1) lookups by id, by state and
+    by region. The arrays are persisted in a .npz file for instant reloads.
+    """
+
+    def __init__(self, arrays: dict):
+        """
+        :param arrays: The typed arrays, as written by `save` (see `from_mapping`).
+        """
+        self.arrays = arrays
+        a = arrays
+        self._municipality_row = {int(code): row for row, code in enumerate(a['municipality_id'])}
+        self._state_row = {str(uf): row for row, uf in enumerate(a['state_abbreviation'])}
+        self._state_row.update({str(int(code)): row for row, code in enumerate(a['state_id'])})
+        self._immediate_row = {int(code): row for row, code in enumerate(a['immediate_id'])}
+        self._intermediate_row = {int(code): row for row, code in enumerate(a['intermediate_id'])}
+        self._rows_by_state = self._group_rows(a['municipality_state'])
+        self._rows_by_immediate = self._group_rows(a['municipality_immediate'])
+        self._rows_by_intermediate = self._group_rows(a['municipality_intermediate'])
+
+    @staticmethod
+    def _group_rows(keys: np.ndarray) -> dict:
+        """Returns key -> array of the municipality rows with that key."""
+        order = np.argsort(keys, kind='stable')
+        unique, starts = np.unique(keys[order], return_index=True)
+        return {int(k): rows for k, rows in zip(unique, np.split(order, starts[1:]))}
+
+    @classmethod
+    def from_mapping(cls, mapping: pd.DataFrame) -> "LocalityCatalog":
+        """Builds the catalog from the DataFrame returned by fetch_municipality_region_mapping."""
+        mapping = mapping[mapping['state_id'].notna()].sort_values('municipality_id')
+        states = mapping.drop_duplicates('state_id').sort_values('state_id')
+        immediate = mapping[mapping['immediate_region_id'].notna()].drop_duplicates('immediate_region_id').sort_values('immediate_region_id')
+        intermediate = mapping[mapping['intermediate_region_id'].notna()].drop_duplicates('intermediate_region_id').sort_values('intermediate_region_id')
+
+        def codes(series, dtype):
+            return pd.to_numeric(series).fillna(-1).to_numpy(dtype=dtype)
+
+        arrays = {
+            'format_version': np.array(CATALOG_FORMAT_VERSION),
+            'municipality_id': codes(mapping['municipality_id'], np.int64),
+            'municipality_name': mapping['municipality_name'].to_numpy(dtype=str),
+            'municipality_immediate': codes(mapping['immediate_region_id'], np.int32),
+            'municipality_intermediate': codes(mapping['intermediate_region_id'], np.int32),
+            'municipality_state': codes(mapping['state_id'], np.int16),
+            'immediate_id': codes(immediate['immediate_region_id'], np.int32),
+            'immediate_name': immediate['immediate_region_name'].to_numpy(dtype=str),
+            'immediate_state': codes(immediate['state_id'], np.int16),
+            'intermediate_id': codes(intermediate['intermediate_region_id'], np.int32),
+            'intermediate_name': intermediate['intermediate_region_name'].to_numpy(dtype=str),
+            'intermediate_state': codes(intermediate['state_id'], np.int16),
+            'state_id': codes(states['state_id'], np.int16),
+            'state_abbreviation': states['state_abbreviation'].to_numpy(dtype=str),
+            'state_name': states['state_name'].to_numpy(dtype=str),
+        }
+        return cls(arrays)
+
+    @classmethod
+    def fetch(cls):
+        """Downloads the hierarchy (one request) and builds the catalog. Returns None on failure."""
+        mapping = fetch_municipality_region_mapping()
+        return cls.from_mapping(mapping) if mapping is not None else None
+
+    def save(self, path: str) -> None:
+        """Persists the typed arrays to a .npz file."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temporary_path = path + ".tmp.npz"
+        np.savez(temporary_path, **self.arrays)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        """Loads a persisted catalog, or returns None if the file has an old format."""
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {key: data[key] for key in data.files}
+        if int(arrays.get('format_version', -1)) != CATALOG_FORMAT_VERSION:
+            return None
+        return cls(arrays)
+
+    # --- Consultas ---
+
+    def _state(self, state) -> int:
+        """Returns the state row for an abbreviation ('PE') or an IBGE id ('26' or 26)."""
+        row = self._state_row.get(str(state).upper())
+        if row is None:
+            raise KeyError(f"Unknown state: {state}")
+        return row
+
+    def has_state(self, state) -> bool:
+        return str(state).upper() in self._state_row
+
+    def states(self) -> pd.DataFrame:
+        """All states, with the same columns as ibge_api.fetch_states (id, abbreviation, name)."""
+        a = self.arrays
+        return pd.DataFrame({'id': a['state_id'].astype(str), 'abbreviation': a['state_abbreviation'], 'name': a['state_name']})
+
+    def municipality(self, municipality_id) -> dict:
+        """Returns the full hierarchy of one municipality."""
+        a = self.arrays
+        row = self._municipality_row[int(municipality_id)]
+        state_row = self._state_row[str(int(a['municipality_state'][row]))]
+        immediate_row = self._immediate_row.get(int(a['municipality_immediate'][row]))
+        intermediate_row = self._intermediate_row.get(int(a['municipality_intermediate'][row]))
+        return {
+            'id': str(a['municipality_id'][row]),
+            'name': str(a['municipality_name'][row]),
+            'immediate_region_id': str(a['municipality_immediate'][row]),
+            'immediate_region_name': str(a['immediate_name'][immediate_row]) if immediate_row is not None else None,
+            'intermediate_region_id': str(a['municipality_intermediate'][row]),
+            'intermediate_region_name': str(a['intermediate_name'][intermediate_row]) if intermediate_row is not None else None,
+            'state_id': str(a['state_id'][state_row]),
+            'state_abbreviation': str(a['state_abbreviation'][state_row]),
+        }
+
+    def municipalities_by_state(self, state) -> pd.DataFrame:
+        """The municipalities of a state, with the same columns as ibge_api.fetch_municipalities_by_state (id, name)."""
+        a = self.arrays
+        rows = self._rows_by_state.get(int(a['state_id'][self._state(state)]), np.array([], dtype=np.int64))
+        return pd.DataFrame({'id': a['municipality_id'][rows].astype(str), 'name': a['municipality_name'][rows]})
+
+    def regions_by_state(self, state, region_type: str) -> pd.DataFrame:
+        """
+        The regions of a state, with the same columns as ibge_api.fetch_regions_by_state (id, name).
+
+        :param state: The state abbreviation or IBGE id.
+        :param region_type: 'regioes-imediatas' or 'regioes-intermediarias'.
+        """
+        a = self.arrays
+        prefix = _REGION_TYPES[region_type]
+        mask = a[f'{prefix}_state'] == a['state_id'][self._state(state)]
+        return pd.DataFrame({'id': a[f'{prefix}_id'][mask].astype(str), 'name': a[f'{prefix}_name'][mask]})
+
+    def municipalities_in_region(self, region_id) -> np.ndarray:
+        """The municipality ids (int64) of an immediate (6 digits) or intermediate (4 digits) region."""
+        region_id = int(region_id)
+        rows_index = self._rows_by_immediate if region_id >= 100_000 else self._rows_by_intermediate
+        rows = rows_index.get(region_id, np.array([], dtype=np.int64))
+        return self.arrays['municipality_id'][rows]
+
+    def to_mapping(self) -> pd.DataFrame:
+        """The catalog as the flat DataFrame returned by fetch_municipality_region_mapping."""
+        a = self.arrays
+
+        def ids(codes):
+            # -1 é o código de ausência do catálogo: volta a ser None, como no download.
+            return np.where(codes >= 0, codes.astype(str), None)
+
+        def lookup(values, index, codes):
+            # Códigos ausentes (ou sem linha) viram valor ausente em vez de KeyError.
+            return pd.Series(values, index=index).reindex(codes).to_numpy()
+
+        return pd.DataFrame({
+            'municipality_id': a['municipality_id'].astype(str),
+            'municipality_name': a['municipality_name'],
+            'immediate_region_id': ids(a['municipality_immediate']),
+            'immediate_region_name': lookup(a['immediate_name'], a['immediate_id'], a['municipality_immediate']),
+            'intermediate_region_id': ids(a['municipality_intermediate']),
+            'intermediate_region_name': lookup(a['intermediate_name'], a['intermediate_id'], a['municipality_intermediate']),
+            'state_id': ids(a['municipality_state']),
+            'state_abbreviation': lookup(a['state_abbreviation'], a['state_id'], a['municipality_state']),
+            'state_name': lookup(a['state_name'], a['state_id'], a['municipality_state']),
+        })
+
+
+_CATALOG: dict = {}
+
+
+def get_locality_catalog(path: str = DEFAULT_CATALOG_PATH, refresh: bool = False, download: bool = True):
+    """
+    Returns the shared locality catalog: from memory, else from disk, else
+    downloaded once (and persisted). Returns None if it cannot be obtained.
+
+    :param path: The .npz file of the catalog.
+    :param refresh: Download it again even if a copy exists.
+    :param download: Whether a missing catalog may be downloaded (False only reads the disk).
+    """
+    if not refresh and path in _CATALOG:
+        return _CATALOG[path]
+
+    catalog = None
+    if not refresh and os.path.exists(path):
+        catalog = LocalityCatalog.load(path)
+    if catalog is None and download:
+        print("Downloading the locality catalog (single request)... ", end="", flush=True)
+        catalog = LocalityCatalog.fetch()
+        if catalog is None:
+            print("FAILED")
+            return None
+        catalog.save(path)
+        print("OK")
+    if catalog is not None:
+        _CATALOG[path] = catalog
+    return catalog
@@ -10,9 +10,23 @@ map layers, making them easily accessible for any map generator.
 # Importa as funções do módulo 'core' para o nível do pacote 'map_components'
 # Isso permite fazer "from shared.map_components import create_base_map"
 from .core import (
+    DEFAULT_PROJECTION,
+    OCEAN_COLOR,
+    COUNTRY_FILL_COLOR,
+    COUNTRY_BORDER_COLOR,
+    STATE_FILL_COLOR,
+    STATE_BORDER_COLOR,
+    FINAL_DPI,
+    DRAFT_DPI,
+    MAP_FIGSIZE,
+    draft_tolerance,
+    simplify_layer,
+    save_map,
     create_base_map,
     plot_states_layer,
     plot_highlight_layer,
     plot_polygons_layer,
     plot_choropleth_layer
-)
\ No newline at end of file
+)
+from .raster import plot_choropleth_raster
+from .labels import plot_labels
@@ -0,0 +1,235 @@
+# shared/map_components/borders.py
+"""
+A deduplicated border network for maps with thousands of adjacent polygons.
+
+Plotting municipalities as patches strokes every shared border twice (once
+per neighbor), which is slow and makes the lines look heavy. Here every ring
+of the layer is split into segments, segments are matched by their quantized
+endpoints, and each shared border is kept once. Each border is also tagged
+with the highest level of the territorial hierarchy it separates (state,
+intermediate region, immediate region or municipality), so a single network
+draws all border styles. The network is persisted and rebuilt only when the
+source files change.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely import STRtree
+from matplotlib.axes import Axes
+from matplotlib.collections import LineCollection
+
+from shared.layer_loader import load_layer, dataset_version
+
+BORDER_NETWORK_FORMAT_VERSION = 1
+
+# Níveis da hierarquia, do mais alto (fronteiras mais fortes) ao mais baixo.
+BORDER_LEVELS: tuple = ('state', 'intermediate_region', 'immediate_region', 'municipality')
+# Nível -> (cor, espessura da linha).
+BORDER_STYLES: dict = {
+    'state': ('#4d4d4d', 0.8),
+    'intermediate_region': ('#6e6e6e', 0.45),
+    'immediate_region': ('#8c8c8c', 0.3),
+    'municipality': ('#b3b3b3', 0.12),
+}
+
+_NETWORK_CACHE: dict = {}
+
+
+class BorderNetwork:
+    """
+    The unique border lines of a polygon layer, stored as flat NumPy arrays:
+    `vertices` (n, 2), `offsets` (one more than the number of lines, so line i
+    is vertices[offsets[i]:offsets[i + 1]]) and `rank` (index in BORDER_LEVELS).
+    """
+
+    def __init__(self, vertices: np.ndarray, offsets: np.ndarray, rank: np.ndarray, version: str = None):
+        self.vertices = np.asarray(vertices, dtype=np.float64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.rank = np.asarray(rank, dtype=np.int8)
+        self.version = version
+
+    def __len__(self) -> int:
+        return len(self.rank)
+
+    @classmethod
+    def build(cls, geometries, level_codes: dict, precision: float = 0.01, version: str = None) -> "BorderNetwork":
+        """
+        Builds the network from a polygon layer.
+
+        :param geometries: An object array of (multi)polygons, in a projected CRS.
+        :param level_codes: Level name (from BORDER_LEVELS) -> int64 array with the code of
+            each polygon at that level. Levels that are missing are simply not distinguished.
+        :param precision: Vertices closer than this (in map units) are considered the same.
+        :param version: The version of the source files (see dataset_version).
+        """
+        geometries = np.asarray(geometries, dtype=object)
+        levels = [np.asarray(level_codes[level], dtype=np.int64) for level in BORDER_LEVELS if level in level_codes]
+        level_rank = np.array([BORDER_LEVELS.index(level) for level in BORDER_LEVELS if level in level_codes], dtype=np.int8)
+
+        # Todos os anéis da camada, achatados: cada par de vértices consecutivos de um anel é um segmento.
+        polygons, polygon_owner = shapely.get_parts(geometries, return_index=True)
+        rings, ring_polygon = shapely.get_rings(polygons, return_index=True)
+        coordinates, vertex_ring = shapely.get_coordinates(rings, return_index=True)
+        quantized = np.round(coordinates / precision).astype(np.int64)
+
+        start = np.flatnonzero(vertex_ring[1:] == vertex_ring[:-1])
+        start = start[np.any(quantized[start] != quantized[start + 1], axis=1)]
+        owner = polygon_owner[ring_polygon[vertex_ring[start]]]
+
+        # Chave do segmento independente do sentido: extremidades ordenadas.
+        a, b = quantized[start], quantized[start + 1]
+        swap = (a[:, 0] > b[:, 0]) | ((a[:, 0] == b[:, 0]) & (a[:, 1] > b[:, 1]))
+        keys = np.where(swap[:, None], np.hstack([b, a]), np.hstack([a, b]))
+        _, first, inverse, counts = np.unique(keys, axis=0, return_index=True, return_inverse=True, return_counts=True)
+        inverse = inverse.ravel()
+
+        # Os dois lados de cada segmento único (-1: não tem vizinho com o mesmo segmento).
+        order = np.argsort(inverse, kind='stable')
+        group_start = np.cumsum(counts) - counts
+        side_a = owner[order[group_start]]
+        side_b = np.where(counts > 1, owner[order[np.minimum(group_start + 1, len(order) - 1)]], -1)
+
+        # Segmentos sem par: a divisa vizinha não tem os mesmos vértices (ou é o contorno externo).
+        # Procura o vizinho pela proximidade; cada lado então desenha a sua própria cópia.
+        lonely = np.flatnonzero(side_b < 0)
+        if len(lonely):
+            segment = start[first[lonely]]
+            midpoints = shapely.points((coordinates[segment] + coordinates[segment + 1]) / 2)
+            pairs = STRtree(geometries).query(midpoints, predicate='dwithin', distance=precision)
+            pairs = pairs[:, pairs[1] != side_a[lonely][pairs[0]]]
+            neighbor = np.full(len(lonely), -1, dtype=np.int64)
+            neighbor[pairs[0][::-1]] = pairs[1][::-1]
+            side_b[lonely] = neighbor
+
+        # Nível da fronteira: o mais alto em que os dois lados diferem (o contorno externo é o mais alto).
+        group_rank = np.full(len(counts), -1, dtype=np.int8)
+        shared = side_b >= 0
+        for codes, rank in zip(levels[::-1], level_rank[::-1]):
+            differ = shared & (codes[side_a] != codes[np.where(shared, side_b, 0)])
+            group_rank[differ] = rank
+        group_rank[~shared] = 0
+
+        # Fica só a primeira ocorrência de cada segmento; segmentos internos a um polígono saem.
+        occurrence = np.arange(len(start))
+        kept = np.flatnonzero((first[inverse] == occurrence) & (group_rank[inverse] >= 0))
+        kept_start, kept_rank = start[kept], group_rank[inverse[kept]]
+
+        # Segmentos consecutivos do mesmo anel e do mesmo nível viram uma única linha.
+        new_line = np.ones(len(kept), dtype=bool)
+        new_line[1:] = (kept_start[1:] != kept_start[:-1] + 1) | (kept_rank[1:] != kept_rank[:-1])
+        line_first = np.flatnonzero(new_line)
+        line_last = np.append(line_first[1:], len(kept)) - 1
+        vertex_index = np.insert(kept_start, line_last + 1, kept_start[line_last] + 1)
+        offsets = np.zeros(len(line_first) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(line_last - line_first + 2)
+        return cls(coordinates[vertex_index], offsets, kept_rank[line_first], version=version)
+
+    @classmethod
+    def from_layers(cls, municipality_paths: list, projection: str = "epsg:3857", catalog=None) -> "BorderNetwork":
+        """
+        Builds the network of the municipality files written by the fetch use cases.
+
+        :param municipality_paths: One or more municipality files (e.g. one per state).
+        :param projection: The map projection the network is built in.
+        :param catalog: A LocalityCatalog, used for the region levels (optional).
+        """
+        frames = [load_layer(path, projection, columns=['codarea']) for path in municipality_paths]
+        gdf = pd.concat(frames, ignore_index=True)
+        gdf = gdf[gdf['codarea'].notna()]
+        codes = gdf['codarea'].astype(np.int64).to_numpy()
+        return cls.build(gdf.geometry.values, municipality_level_codes(codes, catalog), version=dataset_version(municipality_paths))
+
+    @classmethod
+    def build_or_load(cls, cache_path: str, municipality_paths: list, projection: str = "epsg:3857", catalog=None) -> "BorderNetwork":
+        """
+        Returns the network from memory or from `cache_path`, rebuilding (and
+        persisting) it when the source files changed.
+        """
+        version = f"{dataset_version(municipality_paths)}:{projection}:{catalog is not None}"
+        network = _NETWORK_CACHE.get(cache_path)
+        if network is None and os.path.exists(cache_path):
+            network = cls.load(cache_path)
+        if network is None or network.version != version:
+            network = cls.from_layers(municipality_paths, projection, catalog)
+            network.version = version
+            network.save(cache_path)
+        _NETWORK_CACHE[cache_path] = network
+        return network
+
+    def save(self, path: str) -> None:
+        """Persists the network as a compressed .npz file."""
+        np.savez_compressed(
+            path, format_version=BORDER_NETWORK_FORMAT_VERSION, version=np.array(self.version or ""),
+            vertices=self.vertices, offsets=self.offsets, rank=self.rank,
+        )
+
+    @classmethod
+    def load(cls, path: str):
+        """Loads a persisted network, or returns None if the file has an old format."""
+        with np.load(path) as data:
+            if int(data['format_version']) != BORDER_NETWORK_FORMAT_VERSION:
+                return None
+            return cls(data['vertices'], data['offsets'], data['rank'], version=str(data['version']))
+
+    def lines(self, tolerance: float = None) -> list:
+        """
+        Returns the border lines as a list of (n, 2) vertex arrays, optionally
+        simplified. Each border is shared by both neighbors, so simplifying it
+        here never opens gaps between them.
+        """
+        vertices, offsets = self.vertices, self.offsets
+        if tolerance:
+            line_ids = np.repeat(np.arange(len(self)), np.diff(offsets))
+            simplified = shapely.simplify(shapely.linestrings(vertices, indices=line_ids), tolerance)
+            vertices, line_ids = shapely.get_coordinates(simplified, return_index=True)
+            offsets = np.searchsorted(line_ids, np.arange(len(self) + 1))
+        return np.split(vertices, offsets[1:-1])
+
+
+def municipality_level_codes(codes: np.ndarray, catalog=None) -> dict:
+    """
+    Returns the codes of each municipality at every level of BORDER_LEVELS.
+    The state is the first two digits of the IBGE code; regions come from the
+    locality catalog and are left out when it is not available.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    level_codes = {'municipality': codes, 'state': codes // 100_000}
+    if catalog is not None:
+        ids = catalog.arrays['municipality_id']
+        order = np.argsort(ids)
+        position = np.clip(np.searchsorted(ids, codes, sorter=order), 0, len(ids) - 1)
+        rows = order[position]
+        found = ids[rows] == codes
+        # Municípios fora do catálogo recebem o próprio código (fronteira apenas municipal).
+        level_codes['immediate_region'] = np.where(found, catalog.arrays['municipality_immediate'][rows], -codes)
+        level_codes['intermediate_region'] = np.where(found, catalog.arrays['municipality_intermediate'][rows], -codes)
+    return level_codes
+
+
+def plot_border_network(ax: Axes, network: BorderNetwork, styles: dict = None, tolerance: float = None, zorder: int = 4) -> None:
+    """
+    Draws the whole border network as a single LineCollection, with the color and
+    width of each line given by its level in the hierarchy.
+
+    Args:
+        ax (Axes): The Matplotlib Axes on which to plot.
+        network (BorderNetwork): The border network (in the map projection).
+        styles (dict, optional): Level -> (color, linewidth). Defaults to BORDER_STYLES.
+        tolerance (float, optional): Simplification tolerance for draft renders. Defaults to None.
+        zorder (int, optional): The stacking order for the plot. Defaults to 4.
+    """
+    styles = {**BORDER_STYLES, **(styles or {})}
+    colors = np.array([styles[level][0] for level in BORDER_LEVELS], dtype=object)
+    widths = np.array([styles[level][1] for level in BORDER_LEVELS], dtype=np.float64)
+
+    # Linhas mais finas primeiro, para as fronteiras mais altas ficarem por cima.
+    order = np.argsort(-network.rank, kind='stable')
+    lines = network.lines(tolerance)
+    collection = LineCollection(
+        [lines[i] for i in order], colors=list(colors[network.rank[order]]),
+        linewidths=widths[network.rank[order]], capstyle='round', joinstyle='round', zorder=zorder,
+    )
+    ax.add_collection(collection)
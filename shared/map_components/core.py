@@ -13,29 +13,92 @@ import matplotlib.colors as mcolors
 from matplotlib.figure import Figure
 from matplotlib.axes import Axes
 
+from shared.layer_loader import load_layer
+
 DEFAULT_PROJECTION: str = "epsg:3857"
 
-def create_base_map(south_america_file_path: str) -> tuple[Figure, Axes]:
+# Paleta do mapa base, compartilhada com outros renderizadores (ex: tiles).
+OCEAN_COLOR: str = '#a6c9e2'
+COUNTRY_FILL_COLOR: str = '#e0e0e0'
+COUNTRY_BORDER_COLOR: str = "#8a8787"
+STATE_FILL_COLOR: str = '#f0e6c2'
+STATE_BORDER_COLOR: str = "#8a8787"
+
+# Resolução da renderização final e do modo rascunho (pré-visualização).
+FINAL_DPI: int = 300
+DRAFT_DPI: int = 60
+MAP_FIGSIZE: tuple = (10, 12)
+
+def draft_tolerance(view_bounds, dpi: int = DRAFT_DPI) -> float:
+    """
+    Returns the size of one output pixel (in map units) for a view, which is the
+    largest simplification tolerance that stays invisible in a draft render.
+
+    Args:
+        view_bounds: The (minx, miny, maxx, maxy) area that will be visible on the map.
+        dpi (int, optional): The DPI of the render. Defaults to DRAFT_DPI.
+    """
+    minx, miny, maxx, maxy = view_bounds
+    return max((maxx - minx) / (MAP_FIGSIZE[0] * dpi), (maxy - miny) / (MAP_FIGSIZE[1] * dpi))
+
+def simplify_layer(geodataframe: gpd.GeoDataFrame, tolerance: float = None) -> gpd.GeoDataFrame:
+    """
+    Simplifies a layer's geometries (preserving topology) for draft renders.
+    With tolerance=None the GeoDataFrame is returned unchanged.
+    """
+    if tolerance is None:
+        return geodataframe
+    simplified = geodataframe.copy()
+    simplified['geometry'] = simplified.geometry.simplify(tolerance, preserve_topology=True)
+    return simplified
+
+def save_map(fig: Figure, output_path: str, draft: bool = False, pad_inches: float = 0.1) -> None:
+    """
+    Saves a map figure, either as the final render or as a fast draft.
+
+    The final render keeps the original behavior (FINAL_DPI, bbox_inches='tight').
+    The draft still crops to the tight box, so the layout is identical, but it
+    measures that box directly with `get_tightbbox`, skipping the full dry-run
+    draw that bbox_inches='tight' performs before saving. Only the pixel
+    density (DRAFT_DPI) and PNG compression effort change.
+
+    Args:
+        fig (Figure): The map figure.
+        output_path (str): The path of the image file.
+        draft (bool, optional): Whether to save a fast draft. Defaults to False.
+        pad_inches (float, optional): The padding around the tight box. Defaults to 0.1.
+    """
+    if not draft:
+        fig.savefig(output_path, dpi=FINAL_DPI, bbox_inches='tight', pad_inches=pad_inches)
+        return
+
+    crop_box = fig.get_tightbbox(fig.canvas.get_renderer()).padded(pad_inches)
+    save_kwargs = {'dpi': DRAFT_DPI, 'bbox_inches': crop_box}
+    if output_path.lower().endswith('.png'):
+        save_kwargs['pil_kwargs'] = {'compress_level': 1}
+    fig.savefig(output_path, **save_kwargs)
+
+def create_base_map(south_america_file_path: str, simplify_tolerance: float = None, bbox: tuple = None) -> tuple[Figure, Axes]:
     """
     Creates the base figure and axes for a map, plotting the South American continent.
 
     Args:
         south_america_file_path (str): The file path to the South America geo data.
+        simplify_tolerance (float, optional): Simplification tolerance for draft renders
+            (see `draft_tolerance`). Defaults to None (full detail).
+        bbox (tuple, optional): The (minx, miny, maxx, maxy) view in the map projection; only
+            the countries intersecting it are read. Defaults to None (the whole continent).
 
     Returns:
         A tuple containing the Matplotlib Figure and Axes objects (fig, ax).
     """
-    ocean_color: str = '#a6c9e2'
-    country_fill_color: str = '#e0e0e0'
-    country_border_color: str = "#8a8787"
-    
-    south_america_gdf: gpd.GeoDataFrame = gpd.read_file(south_america_file_path).to_crs(DEFAULT_PROJECTION)
+    south_america_gdf: gpd.GeoDataFrame = simplify_layer(load_layer(south_america_file_path, DEFAULT_PROJECTION, bbox=bbox), simplify_tolerance)
     
-    fig, ax = plt.subplots(1, 1, figsize=(10, 12))
-    fig.patch.set_facecolor(ocean_color)
-    ax.set_facecolor(ocean_color)
+    fig, ax = plt.subplots(1, 1, figsize=MAP_FIGSIZE)
+    fig.patch.set_facecolor(OCEAN_COLOR)
+    ax.set_facecolor(OCEAN_COLOR)
     
-    south_america_gdf.plot(ax=ax, color=country_fill_color, edgecolor=country_border_color, zorder=1)
+    south_america_gdf.plot(ax=ax, color=COUNTRY_FILL_COLOR, edgecolor=COUNTRY_BORDER_COLOR, zorder=1)
     
     ax.set_axis_off()
     return fig, ax
@@ -49,9 +112,7 @@ def plot_states_layer(ax: Axes, states_gdf: gpd.GeoDataFrame, zorder: int = 2) -
         states_gdf (gpd.GeoDataFrame): The GeoDataFrame containing all Brazilian states.
         zorder (int, optional): The stacking order for the plot. Defaults to 2.
     """
-    fill_color: str = '#f0e6c2'
-    border_color: str = "#8a8787"
-    states_gdf.plot(ax=ax, color=fill_color, edgecolor=border_color, linewidth=0.7, zorder=zorder)
+    states_gdf.plot(ax=ax, color=STATE_FILL_COLOR, edgecolor=STATE_BORDER_COLOR, linewidth=0.7, zorder=zorder)
 
 def plot_highlight_layer(ax: Axes, states_gdf: gpd.GeoDataFrame, state_abbreviation: str, zorder: int = 3) -> None:
     """
@@ -0,0 +1,125 @@
+# shared/map_components/dots.py
+"""
+Vectorized random points inside polygons, for dot-density maps.
+
+Rejection sampling (draw in the bounding box, test, repeat) costs a Python
+point-in-polygon test per candidate and wastes most draws on thin or
+concave shapes. Here every polygon is triangulated once (constrained
+Delaunay), and all dots of the layer are drawn in a few NumPy passes: each
+dot picks a triangle of its polygon with probability proportional to the
+triangle's area, then a uniform point inside that triangle. Triangulations
+are cached per layer, so re-rendering with another dot value is only the
+sampling step.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+import shapely
+from matplotlib.axes import Axes
+
+from shared.map_components.raster import layer_key
+
+TRIANGULATION_CACHE_MAX_ENTRIES: int = 8
+DOT_COLOR: str = '#2b2b2b'
+
+_TRIANGULATION_CACHE: OrderedDict = OrderedDict()
+
+
+def triangulate_polygons(geometries) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Triangulates every (multi)polygon of a layer.
+
+    :param geometries: An object array of (multi)polygons.
+    :return: (triangles as an (n, 3, 2) array of vertices, index of the geometry owning
+        each triangle, area of each triangle). Triangles are grouped by owner, in order.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    key = layer_key(geometries)
+    cached = _TRIANGULATION_CACHE.get(key)
+    if cached is not None:
+        _TRIANGULATION_CACHE.move_to_end(key)
+        return cached
+
+    polygons, polygon_owner = shapely.get_parts(geometries, return_index=True)
+    keep = ~shapely.is_empty(polygons)
+    polygons, polygon_owner = polygons[keep], polygon_owner[keep]
+    # Triangulação restrita às arestas do polígono: nenhum triângulo sai dele, mesmo em formas côncavas.
+    triangles, triangle_polygon = shapely.get_parts(shapely.constrained_delaunay_triangles(polygons), return_index=True)
+    coordinates = shapely.get_coordinates(shapely.get_exterior_ring(triangles)).reshape(-1, 4, 2)[:, :3]
+    owner = polygon_owner[triangle_polygon]
+
+    edge_1 = coordinates[:, 1] - coordinates[:, 0]
+    edge_2 = coordinates[:, 2] - coordinates[:, 0]
+    areas = np.abs(edge_1[:, 0] * edge_2[:, 1] - edge_1[:, 1] * edge_2[:, 0]) / 2
+
+    result = (coordinates, owner, areas)
+    _TRIANGULATION_CACHE[key] = result
+    while len(_TRIANGULATION_CACHE) > TRIANGULATION_CACHE_MAX_ENTRIES:
+        _TRIANGULATION_CACHE.popitem(last=False)
+    return result
+
+
+def sample_points_in_polygons(geometries, counts, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Draws `counts[i]` uniformly distributed random points inside geometry i.
+
+    :param geometries: An object array of (multi)polygons.
+    :param counts: The number of points of each geometry.
+    :param seed: The random seed; the same inputs and seed always give the same points.
+    :return: (an (n, 2) array of points, index of the geometry of each point).
+    """
+    triangles, owner, areas = triangulate_polygons(geometries)
+    counts = np.asarray(counts, dtype=np.int64).copy()
+    # Geometrias sem área (ou sem triângulos) não recebem pontos.
+    total_area = np.bincount(owner, weights=areas, minlength=len(counts))
+    counts[total_area <= 0] = 0
+    rng = np.random.default_rng(seed)
+
+    point_owner = np.repeat(np.arange(len(counts)), counts)
+    if len(point_owner) == 0:
+        return np.empty((0, 2)), point_owner
+
+    # Sorteio do triângulo: posição uniforme na área acumulada dos triângulos do dono de cada ponto.
+    cumulative = np.cumsum(areas)
+    owner_start = np.concatenate(([0.0], np.cumsum(total_area)))[:-1]
+    targets = owner_start[point_owner] + rng.random(len(point_owner)) * total_area[point_owner]
+    first = np.searchsorted(owner, np.arange(len(counts)), side='left')
+    last = np.searchsorted(owner, np.arange(len(counts)), side='right') - 1
+    chosen = np.clip(np.searchsorted(cumulative, targets, side='right'), first[point_owner], last[point_owner])
+
+    # Ponto uniforme no triângulo: (r1, r2) no paralelogramo, refletido quando cai fora do triângulo.
+    r1, r2 = rng.random(len(point_owner)), rng.random(len(point_owner))
+    outside = r1 + r2 > 1
+    r1[outside], r2[outside] = 1 - r1[outside], 1 - r2[outside]
+    a, b, c = triangles[chosen, 0], triangles[chosen, 1], triangles[chosen, 2]
+    points = a + r1[:, None] * (b - a) + r2[:, None] * (c - a)
+    return points, point_owner
+
+
+def dot_counts(values, per_dot: float, seed: int = 0) -> np.ndarray:
+    """
+    Converts values (e.g. population) into dot counts, one dot per `per_dot`. The
+    fractional part is rounded randomly, so totals are unbiased even when many
+    polygons have less than one dot's worth.
+    """
+    values = np.nan_to_num(np.asarray(values, dtype=np.float64), nan=0.0).clip(min=0) / per_dot
+    whole = np.floor(values)
+    rng = np.random.default_rng(seed)
+    return (whole + (rng.random(len(values)) < values - whole)).astype(np.int64)
+
+
+def plot_dot_layer(ax: Axes, points: np.ndarray, color: str = DOT_COLOR, size: float = 0.3, alpha: float = 1.0, zorder: int = 5) -> None:
+    """
+    Draws all dots as a single scatter artist (one marker path, so Agg stamps
+    it at each position instead of building one patch per dot).
+
+    Args:
+        ax (Axes): The map axes.
+        points (np.ndarray): An (n, 2) array of dot positions, in the map projection.
+        color (str, optional): The dot color. Defaults to DOT_COLOR.
+        size (float, optional): The marker area in points². Defaults to 0.3.
+        alpha (float, optional): The dot opacity. Defaults to 1.0.
+        zorder (int, optional): The stacking order of the dots. Defaults to 5.
+    """
+    ax.scatter(points[:, 0], points[:, 1], s=size, c=color, alpha=alpha, marker='o', linewidths=0, zorder=zorder)
@@ -0,0 +1,210 @@
+# shared/map_components/labels.py
+"""
+Fast label placement with collision avoidance for polygon layers.
+
+Adding one `ax.text` per municipality makes Matplotlib lay out every artist
+separately, and the labels pile on top of each other. Here the anchors are
+computed for the whole layer at once (centroid, or a point on the surface
+when the centroid falls outside the polygon), label sizes come from glyph
+widths measured once per font size, and labels are placed greedily by
+priority (e.g. population): a label is kept only if its box does not overlap
+the boxes already placed, which are looked up in a uniform grid. The kept
+labels are drawn as a single PathCollection.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import shapely
+import geopandas as gpd
+from matplotlib.axes import Axes
+from matplotlib.collections import PathCollection
+from matplotlib.font_manager import FontProperties
+from matplotlib.path import Path
+from matplotlib.textpath import TextPath, TextToPath
+from matplotlib.transforms import Affine2D
+import matplotlib.patheffects as path_effects
+
+LABEL_COLOR: str = '#333333'
+LABEL_HALO_COLOR: str = 'white'
+# Posições tentadas para cada rótulo, em múltiplos da altura do texto: no ponto, acima, abaixo.
+LABEL_POSITIONS: tuple = ((0.0, 0.0), (0.0, 1.1), (0.0, -1.1))
+
+_TEXT_TO_PATH = TextToPath()
+
+
+@lru_cache(maxsize=None)
+def _font_metrics(fontsize: float, char: str) -> tuple:
+    """(advance width, height, descent) of one character, in points."""
+    return _TEXT_TO_PATH.get_text_width_height_descent(char, FontProperties(size=fontsize), ismath=False)
+
+
+@lru_cache(maxsize=None)
+def _glyph_path(fontsize: float, char: str) -> tuple:
+    """(vertices, codes) of one character's outline at the origin, in points."""
+    if char.isspace():
+        # Espaços não têm contorno (e o TextPath de um espaço isolado falha).
+        return np.empty((0, 2)), np.empty(0, dtype=Path.code_type)
+    path = TextPath((0, 0), char, prop=FontProperties(size=fontsize))
+    return path.vertices, path.codes
+
+
+def text_path(text: str, fontsize: float, x: float = 0.0, y: float = 0.0) -> Path:
+    """
+    Builds the outline of a text (baseline starting at x, y, in points) from the
+    cached glyph outlines, instead of laying out the whole string again.
+    """
+    vertices, codes = [], []
+    for char in text:
+        glyph_vertices, glyph_codes = _glyph_path(fontsize, char)
+        if len(glyph_vertices):
+            vertices.append(glyph_vertices + (x, y))
+            codes.append(glyph_codes)
+        x += _font_metrics(fontsize, char)[0]
+    if not vertices:
+        return Path(np.empty((0, 2)))
+    return Path(np.concatenate(vertices), np.concatenate(codes))
+
+
+def measure_texts(texts, fontsize: float) -> tuple[np.ndarray, float, float]:
+    """
+    Measures many labels from per-character widths (each glyph is measured once
+    per font size and cached), without creating any Matplotlib artist.
+
+    :return: (widths of each text in points, line height in points, descent in points).
+    """
+    _, height, descent = _font_metrics(fontsize, 'Ág')
+    widths = np.array([sum(_font_metrics(fontsize, char)[0] for char in text) for text in texts], dtype=np.float64)
+    return widths, height, descent
+
+
+def representative_points(geometries) -> np.ndarray:
+    """
+    Returns an (n, 2) array with one anchor per polygon: its centroid, or a point
+    on its surface when the centroid falls outside it (e.g. crescent shapes).
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    anchors = shapely.centroid(geometries)
+    outside = ~shapely.contains_properly(geometries, anchors)
+    anchors[outside] = shapely.point_on_surface(geometries[outside])
+    return shapely.get_coordinates(anchors)
+
+
+def place_labels(boxes: np.ndarray, priorities: np.ndarray, bounds: tuple) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Greedily chooses non-overlapping label boxes, highest priority first.
+
+    :param boxes: (n, k, 4) candidate boxes (minx, miny, maxx, maxy) of each label, one per
+        position, in display units; positions are tried in order.
+    :param priorities: (n,) priority of each label.
+    :param bounds: (minx, miny, maxx, maxy) of the area labels must stay within.
+    :return: (indices of the placed labels, index of the position used by each of them).
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    # Células do tamanho do maior rótulo: cada caixa toca no máximo 4 células.
+    cell = max(float(np.max(boxes[..., 2] - boxes[..., 0])), float(np.max(boxes[..., 3] - boxes[..., 1])), 1.0)
+    inside = (boxes[..., 0] >= bounds[0]) & (boxes[..., 1] >= bounds[1]) & (boxes[..., 2] <= bounds[2]) & (boxes[..., 3] <= bounds[3])
+    cells = np.floor(boxes / cell).astype(np.int64)
+
+    grid = {}
+    placed_boxes = []
+    placed, positions = [], []
+    for i in np.argsort(-np.asarray(priorities, dtype=np.float64), kind='stable'):
+        for k in range(boxes.shape[1]):
+            if not inside[i, k]:
+                continue
+            minx, miny, maxx, maxy = boxes[i, k]
+            cx0, cy0, cx1, cy1 = cells[i, k]
+            neighbors = {j for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1) for j in grid.get((cx, cy), ())}
+            if any(minx < placed_boxes[j][2] and placed_boxes[j][0] < maxx and miny < placed_boxes[j][3] and placed_boxes[j][1] < maxy for j in neighbors):
+                continue
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    grid.setdefault((cx, cy), []).append(len(placed_boxes))
+            placed_boxes.append((minx, miny, maxx, maxy))
+            placed.append(i)
+            positions.append(k)
+            break
+    return np.array(placed, dtype=np.int64), np.array(positions, dtype=np.int64)
+
+
+def plot_labels(ax: Axes, geodataframe: gpd.GeoDataFrame, text_column: str = 'name', priority_column: str = None,
+                fontsize: float = 6.0, color: str = LABEL_COLOR, halo_color: str = LABEL_HALO_COLOR,
+                padding: float = 1.5, zorder: int = 10) -> int:
+    """
+    Labels the polygons of a layer, skipping labels that would overlap.
+
+    Must be called after the map extent (xlim/ylim) is set, since collisions
+    are resolved in display space (the axes aspect is applied first, so the
+    boxes match the saved figure).
+
+    Args:
+        ax (Axes): The map axes.
+        geodataframe (GeoDataFrame): The polygons, in the map projection.
+        text_column (str, optional): The column with the label text. Defaults to 'name'.
+        priority_column (str, optional): Labels with higher values are placed first
+            (e.g. 'population'). Defaults to None (the polygon area).
+        fontsize (float, optional): The font size in points. Defaults to 6.0.
+        color (str, optional): The text color. Defaults to LABEL_COLOR.
+        halo_color (str, optional): The color of the outline that keeps the text
+            readable over any fill; None disables it. Defaults to LABEL_HALO_COLOR.
+        padding (float, optional): The minimum gap between labels, in points. Defaults to 1.5.
+        zorder (int, optional): The stacking order of the labels. Defaults to 10.
+
+    Returns:
+        int: The number of labels drawn.
+    """
+    gdf = geodataframe[geodataframe.geometry.notna() & ~geodataframe.geometry.is_empty]
+    if gdf.empty or text_column not in gdf.columns:
+        return 0
+    # Com aspecto 'equal', a posição real do eixo (ou os limites) só é ajustada no desenho: aplica agora.
+    ax.apply_aspect()
+    texts = gdf[text_column].fillna('').astype(str).to_numpy()
+    if priority_column is not None and priority_column in gdf.columns:
+        priorities = gdf[priority_column].fillna(0).to_numpy(dtype=np.float64)
+    else:
+        priorities = gdf.geometry.area.to_numpy()
+
+    # Âncoras fora da área visível nunca são rotuladas.
+    anchors = representative_points(gdf.geometry.values)
+    (xmin, xmax), (ymin, ymax) = sorted(ax.get_xlim()), sorted(ax.get_ylim())
+    visible = (anchors[:, 0] >= xmin) & (anchors[:, 0] <= xmax) & (anchors[:, 1] >= ymin) & (anchors[:, 1] <= ymax) & (texts != '')
+    texts, priorities, anchors = texts[visible], priorities[visible], anchors[visible]
+    if len(texts) == 0:
+        return 0
+
+    # Caixas candidatas em pixels de tela: tamanho do texto (em pontos) convertido pelo DPI da figura.
+    widths, height, descent = measure_texts(texts, fontsize)
+    points_to_pixels = ax.figure.dpi / 72.0
+    display = ax.transData.transform(anchors)
+    offsets = np.array(LABEL_POSITIONS) * height
+    half_w = (widths / 2 + padding) * points_to_pixels
+    half_h = (height / 2 + padding) * points_to_pixels
+    centers = display[:, None, :] + offsets[None, :, :] * points_to_pixels
+    boxes = np.stack([
+        centers[..., 0] - half_w[:, None], centers[..., 1] - half_h,
+        centers[..., 0] + half_w[:, None], centers[..., 1] + half_h,
+    ], axis=-1)
+    placed, positions = place_labels(boxes, priorities, tuple(ax.bbox.extents))
+    if len(placed) == 0:
+        return 0
+
+    # Um caminho por rótulo, em pontos, centrado na âncora; todos num único artista.
+    paths = [
+        text_path(texts[i], fontsize, -widths[i] / 2 + offsets[k][0], -(height / 2 - descent) + offsets[k][1])
+        for i, k in zip(placed, positions)
+    ]
+    collection = PathCollection(
+        paths,
+        offsets=anchors[placed],
+        offset_transform=ax.transData,
+        transform=Affine2D().scale(1 / 72.0) + ax.figure.dpi_scale_trans,
+        facecolors=color,
+        edgecolors='none',
+        zorder=zorder,
+    )
+    if halo_color is not None:
+        collection.set_path_effects([path_effects.withStroke(linewidth=1.5, foreground=halo_color)])
+    ax.add_collection(collection, autolim=False)
+    return len(placed)
@@ -0,0 +1,264 @@
+# shared/map_components/raster.py
+"""
+A fast NumPy raster backend for choropleth maps.
+
+Instead of drawing one Matplotlib patch per polygon, the projected polygons
+are rasterized once into a "label image" (each pixel holds the 1-based index
+of the polygon covering it) with a vectorized scanline fill. Label images and
+the composited base map are cached per (layer, extent, resolution), so every
+new choropleth variant is only a colormap lookup, `colors[labels]`, plus the
+pre-computed borders. Matplotlib is used only for the image, title and legend.
+"""
+
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+import shapely
+import geopandas as gpd
+import matplotlib
+import matplotlib.colors as mcolors
+from matplotlib.axes import Axes
+from matplotlib.cm import ScalarMappable
+
+RASTER_CACHE_MAX_ENTRIES: int = 32
+FILL_CHUNK_PIXELS: int = 4_000_000
+
+_LABEL_CACHE: OrderedDict = OrderedDict()
+_BASE_CACHE: OrderedDict = OrderedDict()
+
+
+def _cache_get(cache: OrderedDict, key):
+    value = cache.get(key)
+    if value is not None:
+        cache.move_to_end(key)
+    return value
+
+
+def _cache_put(cache: OrderedDict, key, value) -> None:
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > RASTER_CACHE_MAX_ENTRIES:
+        cache.popitem(last=False)
+
+
+def _rgba(color) -> np.ndarray:
+    return (np.array(mcolors.to_rgba(color)) * 255).round().astype(np.uint8)
+
+
+def layer_key(geometries: gpd.GeoSeries) -> str:
+    """Returns a digest of a layer's geometries, used as the raster cache key."""
+    digest = hashlib.blake2b(digest_size=16)
+    for wkb in shapely.to_wkb(np.asarray(geometries, dtype=object)):
+        digest.update(wkb)
+    return digest.hexdigest()
+
+
+def rasterize_labels(geometries: gpd.GeoSeries, extent: tuple, shape: tuple) -> np.ndarray:
+    """
+    Rasterizes polygons into a label image with a vectorized even-odd scanline fill.
+
+    Args:
+        geometries (gpd.GeoSeries): The (projected) polygons to rasterize.
+        extent (tuple): The (minx, miny, maxx, maxy) area covered by the image.
+        shape (tuple): The image size as (width, height) in pixels.
+
+    Returns:
+        np.ndarray: An int32 (height, width) array where 0 is background and
+        i + 1 is the i-th geometry. A pixel belongs to a polygon when its center
+        is inside it.
+    """
+    width, height = shape
+    minx, miny, maxx, maxy = extent
+    labels = np.zeros((height, width), dtype=np.int32)
+
+    # 1. Achata todas as geometrias em anéis e coordenadas, guardando o dono de cada um.
+    parts, part_owner = shapely.get_parts(np.asarray(geometries, dtype=object), return_index=True)
+    is_polygon = shapely.get_type_id(parts) == 3
+    parts, part_owner = parts[is_polygon], part_owner[is_polygon]
+    if len(parts) == 0:
+        return labels
+    rings, ring_part = shapely.get_rings(parts, return_index=True)
+    coords, coord_ring = shapely.get_coordinates(rings, return_index=True)
+    ring_label = (part_owner[ring_part] + 1).astype(np.int32)
+
+    # 2. Arestas em coordenadas de pixel (linha 0 no topo da imagem).
+    px = (coords[:, 0] - minx) * (width / (maxx - minx))
+    py = (maxy - coords[:, 1]) * (height / (maxy - miny))
+    same_ring = coord_ring[1:] == coord_ring[:-1]
+    x0, y0 = px[:-1][same_ring], py[:-1][same_ring]
+    x1, y1 = px[1:][same_ring], py[1:][same_ring]
+    edge_label = ring_label[coord_ring[:-1][same_ring]]
+
+    # 3. Cada aresta cruza as linhas cujo centro (r + 0.5) está em [ymin, ymax).
+    row_start = np.clip(np.ceil(np.minimum(y0, y1) - 0.5), 0, height).astype(np.int64)
+    row_stop = np.clip(np.ceil(np.maximum(y0, y1) - 0.5), 0, height).astype(np.int64)
+    counts = row_stop - row_start
+    total = int(counts.sum())
+    if total == 0:
+        return labels
+
+    edge_idx = np.repeat(np.arange(len(counts)), counts)
+    rows = np.repeat(row_start, counts) + (np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts))
+    t = (rows + 0.5 - y0[edge_idx]) / (y1[edge_idx] - y0[edge_idx])
+    xs = x0[edge_idx] + t * (x1[edge_idx] - x0[edge_idx])
+    crossing_label = edge_label[edge_idx]
+
+    # 4. Ordena os cruzamentos por (rótulo, linha, x): pares consecutivos formam os trechos internos.
+    order = np.lexsort((xs, rows, crossing_label))
+    xs, rows, crossing_label = xs[order], rows[order], crossing_label[order]
+    col_start = np.clip(np.ceil(xs[0::2] - 0.5), 0, width).astype(np.int64)
+    col_stop = np.clip(np.ceil(xs[1::2] - 0.5), 0, width).astype(np.int64)
+    lengths = col_stop - col_start
+    keep = lengths > 0
+    starts = (rows[0::2] * width + col_start)[keep]
+    span_labels = crossing_label[0::2][keep]
+    lengths = lengths[keep]
+    if len(lengths) == 0:
+        return labels
+
+    # 5. Preenche os trechos em blocos, para limitar a memória dos índices expandidos.
+    flat = labels.reshape(-1)
+    cumulative = np.cumsum(lengths)
+    bounds = np.concatenate(([0], np.searchsorted(cumulative, np.arange(FILL_CHUNK_PIXELS, cumulative[-1], FILL_CHUNK_PIXELS)), [len(lengths)]))
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        if a == b:
+            continue
+        chunk = lengths[a:b]
+        offsets = np.arange(int(chunk.sum())) - np.repeat(np.cumsum(chunk) - chunk, chunk)
+        flat[np.repeat(starts[a:b], chunk) + offsets] = np.repeat(span_labels[a:b], chunk)
+    return labels
+
+
+def cached_label_grid(geometries: gpd.GeoSeries, extent: tuple, shape: tuple) -> np.ndarray:
+    """
+    Returns the label image of a layer, rasterizing it only on the first request
+    for a given (layer, extent, resolution).
+    """
+    key = (layer_key(geometries), tuple(float(v) for v in extent), tuple(shape))
+    labels = _cache_get(_LABEL_CACHE, key)
+    if labels is None:
+        labels = rasterize_labels(geometries, extent, shape)
+        _cache_put(_LABEL_CACHE, key, labels)
+    return labels
+
+
+def label_edges(labels: np.ndarray) -> np.ndarray:
+    """
+    Returns a boolean mask of the pixels on either side of a change of label,
+    i.e. the (2-pixel wide) borders between polygons and around them.
+    """
+    edges = np.zeros(labels.shape, dtype=bool)
+    horizontal = labels[:, 1:] != labels[:, :-1]
+    vertical = labels[1:, :] != labels[:-1, :]
+    edges[:, 1:] |= horizontal
+    edges[:, :-1] |= horizontal
+    edges[1:, :] |= vertical
+    edges[:-1, :] |= vertical
+    return edges
+
+
+def rasterize_base(base_layers: list, extent: tuple, shape: tuple, background: str) -> np.ndarray:
+    """
+    Composites the base layers (fill and borders) into a cached RGBA image.
+
+    Args:
+        base_layers (list): A list of (GeoDataFrame, fill color, border color), bottom to top.
+        extent (tuple): The (minx, miny, maxx, maxy) area covered by the image.
+        shape (tuple): The image size as (width, height) in pixels.
+        background (str): The color of pixels not covered by any layer.
+
+    Returns:
+        np.ndarray: A uint8 (height, width, 4) image. Do not modify it in place.
+    """
+    key = (
+        tuple((layer_key(gdf.geometry), fill, border) for gdf, fill, border in base_layers),
+        tuple(float(v) for v in extent), tuple(shape), background
+    )
+    image = _cache_get(_BASE_CACHE, key)
+    if image is not None:
+        return image
+
+    width, height = shape
+    image = np.empty((height, width, 4), dtype=np.uint8)
+    image[:] = _rgba(background)
+    for gdf, fill, border in base_layers:
+        labels = cached_label_grid(gdf.geometry, extent, shape)
+        image[labels > 0] = _rgba(fill)
+        image[label_edges(labels)] = _rgba(border)
+    _cache_put(_BASE_CACHE, key, image)
+    return image
+
+
+def raster_shape_for_axes(ax: Axes, extent: tuple, dpi: int) -> tuple[int, int]:
+    """
+    Returns the (width, height) in pixels that an equal-aspect image of the
+    extent occupies inside the Axes when the figure is saved at `dpi`.
+    """
+    fig_width, fig_height = ax.figure.get_size_inches()
+    position = ax.get_position()
+    available_w = position.width * fig_width * dpi
+    available_h = position.height * fig_height * dpi
+    extent_w, extent_h = extent[2] - extent[0], extent[3] - extent[1]
+    scale = min(available_w / extent_w, available_h / extent_h)
+    return max(1, int(extent_w * scale)), max(1, int(extent_h * scale))
+
+
+def plot_choropleth_raster(ax: Axes, geodataframe: gpd.GeoDataFrame, data_column: str, extent: tuple, base_layers: list = (), background: str = 'white', cmap: str = 'viridis', use_log_scale: bool = True, edgecolor: str = '0.8', dpi: int = 300, zorder: int = 2) -> bool:
+    """
+    Raster equivalent of `plot_choropleth_layer`: draws the base layers and the
+    choropleth as a single image, with a Matplotlib legend.
+
+    Args:
+        ax (Axes): The Matplotlib Axes on which to plot.
+        geodataframe (gpd.GeoDataFrame): The (projected) GeoDataFrame with geometry and data.
+        data_column (str): The name of the column to use for coloring.
+        extent (tuple): The (minx, miny, maxx, maxy) area of the map.
+        base_layers (list, optional): (GeoDataFrame, fill color, border color) drawn below the choropleth.
+        background (str, optional): The color outside every layer. Defaults to 'white'.
+        cmap (str, optional): The name of the colormap to use. Defaults to 'viridis'.
+        use_log_scale (bool, optional): Whether to use a logarithmic scale for colors. Defaults to True.
+        edgecolor (str, optional): The color of the polygon borders. Defaults to '0.8'.
+        dpi (int, optional): The DPI the figure will be saved with. Defaults to 300.
+        zorder (int, optional): The stacking order of the image. Defaults to 2.
+
+    Returns:
+        bool: True if the plot was successful, False otherwise.
+    """
+    if data_column not in geodataframe.columns:
+        print(f"ERROR: The data column '{data_column}' was not found in the GeoDataFrame.")
+        return False
+
+    values = geodataframe[data_column].to_numpy(dtype=float, na_value=np.nan)
+    valid = np.isfinite(values) & (values > 0)
+    if not valid.any():
+        print(f"WARNING: No valid data found in column '{data_column}' to plot.")
+        return False
+
+    if use_log_scale:
+        norm = mcolors.LogNorm(vmin=values[valid].min(), vmax=values[valid].max())
+        legend_label = f"{data_column.replace('_', ' ').capitalize()} (Log Scale)"
+    else:
+        norm = mcolors.Normalize(vmin=values[valid].min(), vmax=values[valid].max())
+        legend_label = data_column.replace('_', ' ').capitalize()
+    colormap = matplotlib.colormaps[cmap]
+
+    # A legenda é criada antes de medir a Axes, pois ela ocupa parte do espaço da figura.
+    ax.figure.colorbar(ScalarMappable(norm=norm, cmap=colormap), ax=ax, label=legend_label, orientation="horizontal", shrink=0.6, pad=0.02)
+    shape = raster_shape_for_axes(ax, extent, dpi)
+
+    labels = cached_label_grid(geodataframe.geometry, extent, shape)
+    colors = np.zeros((len(values) + 1, 4), dtype=np.uint8)
+    colors[1:][valid] = (colormap(norm(values[valid])) * 255).round().astype(np.uint8)
+
+    image = rasterize_base(list(base_layers), extent, shape, background).copy()
+    fill = colors[labels]
+    drawn = fill[..., 3] > 0
+    image[drawn] = fill[drawn]
+    image[label_edges(np.where(drawn, labels, 0))] = _rgba(edgecolor)
+
+    minx, miny, maxx, maxy = extent
+    ax.imshow(image, extent=(minx, maxx, miny, maxy), origin='upper', interpolation='nearest', zorder=zorder)
+    ax.set_xlim(minx, maxx)
+    ax.set_ylim(miny, maxy)
+    return True
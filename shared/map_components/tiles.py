@@ -0,0 +1,298 @@
+# shared/map_components/tiles.py
+"""
+Reusable components for building XYZ tile pyramids.
+
+This module provides the tile math (Web Mercator grid), the per-zoom layer
+preparation (simplification and clipping), the raster (PNG) and vector (MVT)
+encoders, and a small MBTiles writer that remembers a fingerprint of each
+tile's content so unchanged tiles can be skipped on the next run.
+"""
+
+import gzip
+import hashlib
+import io
+import math
+import sqlite3
+from typing import Iterator, Optional
+
+import pandas as pd
+import shapely
+from shapely.geometry import box
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+try:
+    import mapbox_vector_tile
+    MVT_AVAILABLE = True
+except ImportError:
+    MVT_AVAILABLE = False
+
+from .core import (
+    OCEAN_COLOR,
+    COUNTRY_FILL_COLOR,
+    COUNTRY_BORDER_COLOR,
+    plot_states_layer,
+    plot_polygons_layer
+)
+
+TILE_SIZE: int = 256
+MVT_EXTENT: int = 4096
+WEB_MERCATOR_ORIGIN: float = 20037508.342789244
+
+# Incrementar sempre que os estilos mudarem, para forçar a re-renderização de todos os tiles.
+TILE_STYLE_VERSION: str = "1"
+
+# Ordem de desenho das camadas (de baixo para cima) e seus estilos, os mesmos dos geradores.
+TILE_LAYER_ORDER: tuple = ('sulamerica', 'estados', 'municipios', 'imediatas', 'intermediarias')
+TILE_LAYER_STYLES: dict = {
+    'sulamerica': {'color': COUNTRY_FILL_COLOR, 'edgecolor': COUNTRY_BORDER_COLOR, 'zorder': 1},
+    'municipios': {'color': '#f5f5f5', 'edgecolor': '#d3d3d3', 'linewidth': 0.3, 'zorder': 3},
+    'imediatas': {'facecolor': 'none', 'edgecolor': '#0077b6', 'linewidth': 1.0, 'zorder': 4},
+    'intermediarias': {'facecolor': 'none', 'edgecolor': '#d00000', 'linewidth': 1.2, 'zorder': 5},
+}
+
+
+def meters_per_pixel(zoom: int) -> float:
+    """Returns the Web Mercator ground resolution of a pixel at the given zoom."""
+    return (2 * WEB_MERCATOR_ORIGIN) / (TILE_SIZE * 2 ** zoom)
+
+
+def tile_bounds(zoom: int, x: int, y: int) -> tuple[float, float, float, float]:
+    """
+    Returns the (minx, miny, maxx, maxy) bounds of an XYZ tile in EPSG:3857.
+
+    Args:
+        zoom (int): The zoom level.
+        x (int): The tile column.
+        y (int): The tile row (XYZ convention, origin at the top).
+    """
+    span = (2 * WEB_MERCATOR_ORIGIN) / 2 ** zoom
+    minx = -WEB_MERCATOR_ORIGIN + x * span
+    maxy = WEB_MERCATOR_ORIGIN - y * span
+    return minx, maxy - span, minx + span, maxy
+
+
+def tiles_covering(bounds: tuple, zoom: int) -> Iterator[tuple[int, int]]:
+    """
+    Yields the (x, y) of every tile at a zoom level that touches the given bounds.
+
+    Args:
+        bounds (tuple): The (minx, miny, maxx, maxy) area in EPSG:3857.
+        zoom (int): The zoom level.
+    """
+    span = (2 * WEB_MERCATOR_ORIGIN) / 2 ** zoom
+    last = 2 ** zoom - 1
+    minx, miny, maxx, maxy = bounds
+    x0 = max(0, math.floor((minx + WEB_MERCATOR_ORIGIN) / span))
+    x1 = min(last, math.floor((maxx + WEB_MERCATOR_ORIGIN) / span))
+    y0 = max(0, math.floor((WEB_MERCATOR_ORIGIN - maxy) / span))
+    y1 = min(last, math.floor((WEB_MERCATOR_ORIGIN - miny) / span))
+    for x in range(x0, x1 + 1):
+        for y in range(y0, y1 + 1):
+            yield x, y
+
+
+def prepare_layers_for_zoom(layers: dict, zoom: int) -> dict:
+    """
+    Simplifies every layer to the resolution of a zoom level.
+
+    Vertices closer than half a pixel are invisible on the tile, so the
+    geometries are simplified with that tolerance (preserving topology)
+    before any clipping happens.
+
+    Args:
+        layers (dict): Layer name -> GeoDataFrame in EPSG:3857.
+        zoom (int): The zoom level.
+
+    Returns:
+        dict: Layer name -> simplified GeoDataFrame, without empty geometries.
+    """
+    tolerance = meters_per_pixel(zoom) * 0.5
+    prepared = {}
+    for name, gdf in layers.items():
+        simplified = gdf.assign(geometry=gdf.geometry.simplify(tolerance, preserve_topology=True))
+        prepared[name] = simplified[~simplified.geometry.is_empty]
+    return prepared
+
+
+def clip_layers_to_tile(layers: dict, zoom: int, x: int, y: int, buffer_pixels: int = 4) -> dict:
+    """
+    Clips each (already simplified) layer to a tile, with a small buffer so
+    that strokes crossing the tile edge are not cut visibly.
+
+    Args:
+        layers (dict): Layer name -> GeoDataFrame in EPSG:3857.
+        zoom (int): The zoom level.
+        x (int): The tile column.
+        y (int): The tile row.
+        buffer_pixels (int, optional): The clip buffer in pixels. Defaults to 4.
+
+    Returns:
+        dict: Layer name -> clipped GeoDataFrame. Layers without features are omitted.
+    """
+    minx, miny, maxx, maxy = tile_bounds(zoom, x, y)
+    pad = meters_per_pixel(zoom) * buffer_pixels
+    clip_box = (minx - pad, miny - pad, maxx + pad, maxy + pad)
+
+    clipped_layers = {}
+    for name, gdf in layers.items():
+        candidates = gdf.iloc[gdf.sindex.query(box(*clip_box), predicate='intersects')]
+        if candidates.empty:
+            continue
+        clipped = candidates.assign(geometry=candidates.geometry.clip_by_rect(*clip_box))
+        clipped = clipped[~clipped.geometry.is_empty]
+        if not clipped.empty:
+            clipped_layers[name] = clipped
+    return clipped_layers
+
+
+def tile_fingerprint(clipped_layers: dict, tile_format: str) -> str:
+    """
+    Computes a digest of everything that determines a tile's content.
+
+    Two runs that produce the same clipped geometries and attributes for a tile
+    will produce the same fingerprint, which lets the writer skip the render.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{TILE_STYLE_VERSION}:{tile_format}".encode())
+    for name in sorted(clipped_layers):
+        gdf = clipped_layers[name]
+        digest.update(name.encode())
+        for wkb in shapely.to_wkb(gdf.geometry.values):
+            digest.update(wkb)
+        if tile_format == 'pbf':
+            attributes = gdf.drop(columns=gdf.geometry.name)
+            digest.update(pd.util.hash_pandas_object(attributes, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+class RasterTileRenderer:
+    """
+    Renders PNG tiles with the same styles used by the map generators.
+
+    A single off-screen figure is created once and reused for every tile,
+    which avoids the cost of building a new figure per tile.
+    """
+
+    def __init__(self):
+        # Em dpi=72, 1 ponto equivale a 1 pixel: as espessuras de linha dos estilos ficam legíveis.
+        self.fig = Figure(figsize=(TILE_SIZE / 72, TILE_SIZE / 72), dpi=72)
+        FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_axes([0, 0, 1, 1])
+
+    def render(self, clipped_layers: dict, bounds: tuple) -> bytes:
+        """
+        Draws the clipped layers inside the tile bounds and returns the PNG bytes.
+        """
+        ax = self.ax
+        ax.cla()
+        ax.set_axis_off()
+        self.fig.patch.set_facecolor(OCEAN_COLOR)
+
+        for name in TILE_LAYER_ORDER:
+            gdf = clipped_layers.get(name)
+            if gdf is None:
+                continue
+            if name == 'estados':
+                plot_states_layer(ax, gdf, zorder=2)
+            else:
+                plot_polygons_layer(ax, gdf, **TILE_LAYER_STYLES[name])
+
+        ax.set_xlim(bounds[0], bounds[2])
+        ax.set_ylim(bounds[1], bounds[3])
+
+        buffer = io.BytesIO()
+        self.fig.savefig(buffer, format='png', dpi=72)
+        return buffer.getvalue()
+
+
+def encode_vector_tile(clipped_layers: dict, bounds: tuple) -> bytes:
+    """
+    Encodes the clipped layers as a gzip-compressed Mapbox Vector Tile.
+
+    Args:
+        clipped_layers (dict): Layer name -> clipped GeoDataFrame in EPSG:3857.
+        bounds (tuple): The tile bounds in EPSG:3857.
+
+    Returns:
+        bytes: The gzip-compressed protobuf, as expected inside MBTiles.
+    """
+    if not MVT_AVAILABLE:
+        raise RuntimeError("The 'mapbox-vector-tile' package is required to encode vector tiles.")
+
+    layers = []
+    for name in TILE_LAYER_ORDER:
+        gdf = clipped_layers.get(name)
+        if gdf is None:
+            continue
+        attributes = gdf.drop(columns=gdf.geometry.name)
+        # O formato MVT só aceita valores primitivos; nulos são descartados.
+        attributes = attributes.astype(object).where(attributes.notna(), None)
+        features = [
+            {'geometry': geometry, 'properties': {k: v for k, v in record.items() if v is not None}}
+            for geometry, record in zip(gdf.geometry.values, attributes.to_dict('records'))
+        ]
+        layers.append({'name': name, 'features': features})
+
+    data = mapbox_vector_tile.encode(layers, default_options={'quantize_bounds': bounds, 'extents': MVT_EXTENT})
+    return gzip.compress(data)
+
+
+class MBTilesWriter:
+    """
+    Minimal MBTiles 1.3 writer with per-tile content fingerprints.
+
+    Tiles are addressed in XYZ and converted to the TMS rows required by the
+    specification. An extra 'tile_fingerprints' table stores the digest of each
+    tile's inputs so a later run can skip tiles whose content did not change.
+    """
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS tiles (
+                zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB,
+                PRIMARY KEY (zoom_level, tile_column, tile_row)
+            );
+            CREATE TABLE IF NOT EXISTS tile_fingerprints (
+                zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, fingerprint TEXT,
+                PRIMARY KEY (zoom_level, tile_column, tile_row)
+            );
+        """)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def fingerprints(self, zoom: int) -> dict:
+        """Returns {(x, y): fingerprint} for every tile already stored at a zoom level."""
+        last = 2 ** zoom - 1
+        rows = self.conn.execute(
+            "SELECT tile_column, tile_row, fingerprint FROM tile_fingerprints WHERE zoom_level = ?", (zoom,)
+        )
+        return {(column, last - row): fingerprint for column, row, fingerprint in rows}
+
+    def write_tile(self, zoom: int, x: int, y: int, data: Optional[bytes], fingerprint: Optional[str]) -> None:
+        """Stores (or removes, when data is None) a tile and its fingerprint."""
+        tms_row = 2 ** zoom - 1 - y
+        key = (zoom, x, tms_row)
+        if data is None:
+            self.conn.execute("DELETE FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?", key)
+            self.conn.execute("DELETE FROM tile_fingerprints WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?", key)
+            return
+        self.conn.execute("INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)", (*key, sqlite3.Binary(data)))
+        self.conn.execute("INSERT OR REPLACE INTO tile_fingerprints VALUES (?, ?, ?, ?)", (*key, fingerprint))
+
+    def set_metadata(self, metadata: dict) -> None:
+        """Writes (replacing) the MBTiles metadata entries."""
+        self.conn.executemany("INSERT OR REPLACE INTO metadata VALUES (?, ?)", [(k, str(v)) for k, v in metadata.items()])
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,126 @@
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from shared.locality_catalog import LocalityCatalog
+
+NOT_FOUND = -1
+AMBIGUOUS = -2  # O nome existe em mais de um estado e nenhuma UF foi informada.
+
+
+def normalize_names(names) -> pd.Series:
+    """
+    Normalizes municipality names for matching: no accents, lower case, and any
+    run of punctuation/spaces turned into a single space.
+    ("SÃO JOÃO DEL-REI" and "Sao Joao del Rei" both become "sao joao del rei".)
+    """
+    return (
+        pd.Series(names, dtype=object).fillna('').astype(str)
+        .str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+        .str.lower().str.replace(r"[^a-z0-9]+", " ", regex=True).str.strip()
+    )
+
+
+def _trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class MunicipalityNameResolver:
+    """
+    Resolves free-text municipality names (optionally with a UF) to IBGE codes.
+
+    Exact matches use a dict over the normalized names; names that don't match
+    exactly fall back to a trigram index, scored with the Dice coefficient
+    over the trigrams shared with each candidate. Batch calls resolve each
+    distinct (name, UF) pair only once.
+    """
+
+    def __init__(self, catalog: LocalityCatalog, min_similarity: float = 0.75):
+        """
+        :param catalog: The locality catalog (see get_locality_catalog).
+        :param min_similarity: The minimum Dice similarity accepted by the fuzzy match (0 to 1).
+        """
+        self.min_similarity = min_similarity
+        a = catalog.arrays
+        self.codes = a['municipality_id']
+        states = pd.Series(a['state_abbreviation'], index=a['state_id'])
+        self.ufs = states.reindex(a['municipality_state']).to_numpy(dtype=str)
+        self.keys = normalize_names(a['municipality_name']).to_numpy(dtype=str)
+
+        # Índices exatos: (nome, UF) -> linha e nome -> linhas (um nome pode existir em vários estados).
+        self._by_key_uf = {(key, uf): row for row, (key, uf) in enumerate(zip(self.keys, self.ufs))}
+        by_key = defaultdict(list)
+        for row, key in enumerate(self.keys):
+            by_key[key].append(row)
+        self._by_key = {key: np.array(rows) for key, rows in by_key.items()}
+
+        # Índice de trigramas: trigrama -> linhas que o contêm.
+        postings = defaultdict(list)
+        self._trigram_counts = np.zeros(len(self.keys), dtype=np.int32)
+        for row, key in enumerate(self.keys):
+            grams = _trigrams(key)
+            self._trigram_counts[row] = len(grams)
+            for gram in grams:
+                postings[gram].append(row)
+        self._postings = {gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()}
+
+    def _fuzzy(self, key: str, uf: str) -> int:
+        """Returns the row of the most similar name (restricted to the UF, if given), or -1."""
+        grams = _trigrams(key)
+        hits = [self._postings[g] for g in grams if g in self._postings]
+        if not hits:
+            return -1
+        shared = np.bincount(np.concatenate(hits), minlength=len(self.keys))
+        scores = 2.0 * shared / (len(grams) + self._trigram_counts)
+        if uf:
+            scores[self.ufs != uf] = 0.0
+        best = int(np.argmax(scores))
+        if scores[best] < self.min_similarity:
+            return -1
+        # Empate entre estados diferentes sem UF: não há como escolher. Empates dentro de um
+        # mesmo estado ficam com o primeiro candidato, como quando a UF é informada.
+        if not uf and len(np.unique(self.ufs[scores == scores[best]])) > 1:
+            return AMBIGUOUS
+        return best
+
+    def _resolve_key(self, key: str, uf: str) -> int:
+        if not key:
+            return NOT_FOUND
+        if uf:
+            row = self._by_key_uf.get((key, uf))
+            if row is not None:
+                return int(self.codes[row])
+        else:
+            rows = self._by_key.get(key)
+            if rows is not None:
+                return int(self.codes[rows[0]]) if len(rows) == 1 else AMBIGUOUS
+        row = self._fuzzy(key, uf)
+        return int(self.codes[row]) if row >= 0 else (AMBIGUOUS if row == AMBIGUOUS else NOT_FOUND)
+
+    def resolve(self, name: str, uf: str = None) -> int:
+        """Resolves a single name. Returns the IBGE code, NOT_FOUND or AMBIGUOUS."""
+        return int(self.resolve_batch([name], [uf] if uf else None)[0])
+
+    def resolve_batch(self, names, ufs=None) -> np.ndarray:
+        """
+        Resolves many names at once.
+
+        :param names: Array-like of municipality names.
+        :param ufs: Optional array-like of state abbreviations, aligned with names.
+        :return: An int64 array of IBGE codes (NOT_FOUND or AMBIGUOUS where unresolved).
+        """
+        keys = normalize_names(names)
+        if ufs is None:
+            ufs = pd.Series('', index=keys.index)
+        else:
+            ufs = pd.Series(ufs, dtype=object, index=keys.index).fillna('').astype(str).str.strip().str.upper()
+
+        # Cada par (nome, UF) distinto é resolvido uma única vez.
+        pair_codes, uniques = pd.factorize(keys + '|' + ufs)
+        resolved = np.empty(len(uniques), dtype=np.int64)
+        for i, pair in enumerate(uniques):
+            key, uf = pair.rsplit('|', 1)
+            resolved[i] = self._resolve_key(key, uf)
+        return resolved[pair_codes]
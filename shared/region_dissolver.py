@@ -0,0 +1,109 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import mapping
+
+from shared.file_utils import GEOJSON_SUFFIXES
+from shared.layer_loader import load_layer
+from shared.geometry_validation import ensure_valid
+
+# Nível -> (coluna do código, coluna do nome, prefixo das propriedades no GeoJSON de saída)
+REGION_LEVELS = {
+    'immediate': ('immediate_region_id', 'immediate_region_name', 'immediate_region'),
+    'intermediate': ('intermediate_region_id', 'intermediate_region_name', 'intermediate_region'),
+    'state': ('state_id', 'state_abbreviation', None),
+}
+
+MUNICIPALITY_FILE_PREFIX = "2-complete-data-municipalities-"
+
+
+def find_municipality_files(directory: str) -> dict:
+    """Returns state abbreviation -> path for every municipality file downloaded into directory."""
+    files = {}
+    # Ordem reversa: o .geojson simples vence as cópias comprimidas do mesmo estado.
+    for f in sorted(os.listdir(directory), reverse=True):
+        if f.startswith(MUNICIPALITY_FILE_PREFIX) and f.endswith(GEOJSON_SUFFIXES):
+            uf = f[len(MUNICIPALITY_FILE_PREFIX):].split('.')[0].upper()
+            files[uf] = os.path.join(directory, f)
+    return dict(sorted(files.items()))
+
+
+def _grouped_union(geometries: np.ndarray, groups: np.ndarray) -> tuple:
+    """Unites the geometries of each group. Returns (group keys, united geometries)."""
+    keys, inverse = np.unique(groups, return_inverse=True)
+    order = np.argsort(inverse, kind='stable')
+    splits = np.cumsum(np.bincount(inverse, minlength=len(keys)))[:-1]
+    united = [shapely.union_all(part) for part in np.split(geometries[order], splits)]
+    return keys, united
+
+
+def _dissolve_state(municipalities_path: str, mapping_records: list, levels: tuple) -> tuple:
+    """
+    Dissolves the municipalities of one state file into its region polygons.
+    Runs in a worker process; returns (features per level, unmatched municipality count).
+    """
+    gdf = ensure_valid(load_layer(municipalities_path, "epsg:4326", columns=['codarea']), municipalities_path)
+    regions = pd.DataFrame(mapping_records)
+    merged = gdf.assign(municipality_id=gdf['codarea'].astype(str)).merge(regions, on='municipality_id', how='left')
+    unmatched = int(merged['immediate_region_id'].isna().sum())
+    merged = merged[merged['immediate_region_id'].notna()]
+
+    features = {}
+    for level in levels:
+        id_column, name_column, prefix = REGION_LEVELS[level]
+        # Municípios sem código neste nível ficam de fora (em vez de formarem um grupo "sem código").
+        level_rows = merged[merged[id_column].notna()]
+        names = level_rows.drop_duplicates(id_column).set_index(id_column)
+        geometries = np.asarray(level_rows.geometry.values, dtype=object)
+        keys, united = _grouped_union(geometries, level_rows[id_column].to_numpy())
+        level_features = []
+        for key, geometry in zip(keys, united):
+            row = names.loc[key]
+            if prefix is None:
+                properties = {'codarea': key, 'abbreviation': row['state_abbreviation']}
+            else:
+                properties = {
+                    'codarea': key,
+                    f'{prefix}_id': key,
+                    f'{prefix}_name': row[name_column],
+                    'state_abbreviation': row['state_abbreviation'],
+                }
+            level_features.append({'type': 'Feature', 'properties': properties, 'geometry': mapping(geometry)})
+        features[level] = level_features
+    return features, unmatched
+
+
+def dissolve_municipalities(municipality_paths: dict, region_mapping: pd.DataFrame, levels: tuple = ('immediate', 'intermediate', 'state'), workers: int = None) -> dict:
+    """
+    Builds region polygons by dissolving the already-downloaded municipality
+    geometries, so region borders coincide exactly with municipality borders.
+    Regions never cross state borders, so every state is dissolved independently
+    in a pool of worker processes.
+
+    :param municipality_paths: State abbreviation -> municipality GeoJSON of that state.
+    :param region_mapping: The DataFrame returned by fetch_municipality_region_mapping.
+    :param levels: The levels to build ('immediate', 'intermediate' and/or 'state').
+    :param workers: The number of worker processes. None uses every CPU.
+    :return: Level -> list of GeoJSON features, ordered by state.
+    """
+    results = {level: [] for level in levels}
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=min(workers, max(1, len(municipality_paths)))) as executor:
+        futures = {
+            uf: executor.submit(
+                _dissolve_state, path,
+                region_mapping[region_mapping['state_abbreviation'] == uf].to_dict('records'),
+                tuple(levels)
+            )
+            for uf, path in sorted(municipality_paths.items())
+        }
+        for uf, future in futures.items():
+            features, unmatched = future.result()
+            counts = ", ".join(f"{len(features[level])} {level}" for level in levels)
+            print(f"  Dissolved {uf}: {counts}" + (f" ({unmatched} municipalities without region)" if unmatched else ""))
+            for level in levels:
+                results[level].extend(features[level])
+    return results
@@ -0,0 +1,122 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import geopandas as gpd
+import shapely
+from pyproj import CRS, Transformer
+
+# Abaixo disso, dividir em blocos custa mais do que economiza.
+PARALLEL_MIN_COORDINATES = 200_000
+REPROJECTION_CACHE_MAX_ENTRIES = 16
+
+_LOCAL = threading.local()  # O Transformer do pyproj não é thread-safe: um cache por thread.
+_CRS_CACHE: dict = {}
+_REPROJECTED: OrderedDict = OrderedDict()
+_REPROJECTED_LOCK = threading.Lock()
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def _crs_key(crs) -> str:
+    """Normalizes any CRS input ('epsg:3857', a pyproj CRS, WKT...) into a hashable key."""
+    key = crs if isinstance(crs, str) else None
+    if key is not None and key in _CRS_CACHE:
+        return _CRS_CACHE[key]
+    normalized = CRS.from_user_input(crs).to_wkt()
+    if key is not None:
+        _CRS_CACHE[key] = normalized
+    return normalized
+
+
+def get_transformer(source_crs, target_crs) -> Transformer:
+    """Returns a cached (per thread) always_xy Transformer for a CRS pair."""
+    cache = getattr(_LOCAL, 'transformers', None)
+    if cache is None:
+        cache = _LOCAL.transformers = {}
+    key = (_crs_key(source_crs), _crs_key(target_crs))
+    transformer = cache.get(key)
+    if transformer is None:
+        transformer = cache[key] = Transformer.from_crs(key[0], key[1], always_xy=True)
+    return transformer
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="reprojection")
+        return _POOL
+
+
+def transform_coordinates(coordinates: np.ndarray, source_crs, target_crs) -> np.ndarray:
+    """
+    Projects a flat (n, 2) array of coordinates. Large arrays are split into
+    chunks projected in parallel threads (PROJ releases the GIL).
+    """
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    result = np.empty_like(coordinates)
+
+    def project(start: int, stop: int) -> None:
+        transformer = get_transformer(source_crs, target_crs)
+        x, y = transformer.transform(coordinates[start:stop, 0], coordinates[start:stop, 1])
+        result[start:stop, 0] = x
+        result[start:stop, 1] = y
+
+    n = len(coordinates)
+    workers = os.cpu_count() or 1
+    if n < PARALLEL_MIN_COORDINATES or workers == 1:
+        project(0, n)
+        return result
+
+    bounds = np.linspace(0, n, workers + 1, dtype=np.int64)
+    futures = [_pool().submit(project, a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+    for future in futures:
+        future.result()
+    return result
+
+
+def reproject_geometries(geometries, source_crs, target_crs) -> np.ndarray:
+    """Reprojects an array of shapely geometries, working on their flattened coordinates."""
+    geometries = np.asarray(geometries, dtype=object)
+    coordinates = shapely.get_coordinates(geometries)
+    projected = transform_coordinates(coordinates, source_crs, target_crs)
+    return shapely.set_coordinates(geometries.copy(), projected)
+
+
+def reproject(geodataframe: gpd.GeoDataFrame, target_crs, version_key=None) -> gpd.GeoDataFrame:
+    """
+    Fast replacement for GeoDataFrame.to_crs.
+
+    :param geodataframe: The layer to reproject (it must have a CRS).
+    :param target_crs: The target CRS (e.g. 'epsg:3857').
+    :param version_key: Optional key identifying this exact layer content (e.g. file
+        path, filters and file version). Reprojected geometries are memoized by
+        (version_key, target CRS), so a repeated request skips the projection.
+    :return: A new GeoDataFrame in the target CRS.
+    """
+    if geodataframe.crs is None:
+        raise ValueError("Cannot reproject a layer without a CRS.")
+    if _crs_key(geodataframe.crs) == _crs_key(target_crs):
+        return geodataframe.copy()
+
+    memo_key = (version_key, _crs_key(target_crs)) if version_key is not None else None
+    geometries = None
+    if memo_key is not None:
+        with _REPROJECTED_LOCK:
+            geometries = _REPROJECTED.get(memo_key)
+            if geometries is not None:
+                _REPROJECTED.move_to_end(memo_key)
+    if geometries is None or len(geometries) != len(geodataframe):
+        geometries = reproject_geometries(geodataframe.geometry.values, geodataframe.crs, target_crs)
+        if memo_key is not None:
+            with _REPROJECTED_LOCK:
+                _REPROJECTED[memo_key] = geometries
+                while len(_REPROJECTED) > REPROJECTION_CACHE_MAX_ENTRIES:
+                    _REPROJECTED.popitem(last=False)
+
+    result = geodataframe.copy()
+    result = result.set_geometry(gpd.GeoSeries(geometries, index=result.index, crs=target_crs), crs=target_crs)
+    return result
@@ -0,0 +1,168 @@
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely import STRtree
+
+from shared.layer_loader import load_layer, geometry_version
+
+LOCATOR_FORMAT_VERSION = 1
+NOT_FOUND = -1
+
+# Nível hierárquico -> coluna com o código IBGE em cada camada baixada pelos use cases de fetch.
+LEVEL_CODE_COLUMNS = {
+    'municipality': 'codarea',
+    'immediate_region': 'immediate_region_id',
+    'intermediate_region': 'intermediate_region_id',
+}
+
+
+def _level_sources(municipality_paths: list, immediate_path: str = None, intermediate_path: str = None) -> dict:
+    """Level name -> the files of that level."""
+    sources = {'municipality': list(municipality_paths)}
+    if immediate_path:
+        sources['immediate_region'] = [immediate_path]
+    if intermediate_path:
+        sources['intermediate_region'] = [intermediate_path]
+    return sources
+
+
+def _sources_version(sources: dict) -> str:
+    """
+    The version of the source layers. It depends only on the codes and geometries,
+    so a file rewritten with new columns (e.g. by AggregatePointsUseCase) keeps it.
+    """
+    return ":".join(geometry_version(paths, LEVEL_CODE_COLUMNS[level]) for level, paths in sources.items())
+
+
+class MunicipalityLocator:
+    """
+    Batch point-in-polygon lookup over the municipality and region layers.
+
+    One STRtree per level (municipality, immediate region, intermediate region)
+    is built over the fetched polygons, which are also "prepared" so the
+    point-in-polygon predicate is evaluated against cached GEOS indexes.
+    Queries are vectorized and processed in chunks to keep memory bounded.
+    """
+
+    def __init__(self, levels: dict, version: str = None):
+        """
+        :param levels: Level name -> (array of shapely polygons, int64 array of IBGE codes).
+        :param version: The version of the source layers (see geometry_version).
+        """
+        self.version = version
+        self.levels = {}
+        for level, (geometries, codes) in levels.items():
+            geometries = np.asarray(geometries, dtype=object)
+            shapely.prepare(geometries)
+            self.levels[level] = (STRtree(geometries), geometries, np.asarray(codes, dtype=np.int64))
+
+    @classmethod
+    def from_layers(cls, municipality_paths: list, immediate_path: str = None, intermediate_path: str = None) -> "MunicipalityLocator":
+        """
+        Builds the locator from the GeoJSON files written by the fetch use cases.
+
+        :param municipality_paths: One or more municipality files (e.g. one per state).
+        :param immediate_path: The immediate regions file (optional).
+        :param intermediate_path: The intermediate regions file (optional).
+        """
+        sources = _level_sources(municipality_paths, immediate_path, intermediate_path)
+        levels = {}
+        for level, paths in sources.items():
+            code_column = LEVEL_CODE_COLUMNS[level]
+            frames = [load_layer(path, "epsg:4326", columns=[code_column]) for path in paths]
+            gdf = pd.concat(frames, ignore_index=True)
+            gdf = gdf[gdf[code_column].notna()]
+            levels[level] = (gdf.geometry.values, gdf[code_column].astype(np.int64).to_numpy())
+
+        return cls(levels, version=_sources_version(sources))
+
+    @classmethod
+    def build_or_load(cls, cache_path: str, municipality_paths: list, immediate_path: str = None, intermediate_path: str = None) -> "MunicipalityLocator":
+        """
+        Loads a persisted locator, rebuilding (and persisting) it when the source geometries changed.
+        """
+        if os.path.exists(cache_path):
+            locator = cls.load(cache_path)
+            if locator is not None and locator.version == _sources_version(_level_sources(municipality_paths, immediate_path, intermediate_path)):
+                return locator
+        locator = cls.from_layers(municipality_paths, immediate_path, intermediate_path)
+        locator.save(cache_path)
+        return locator
+
+    def save(self, path: str) -> None:
+        """
+        Persists the locator. Geometries are stored as WKB; the STRtree itself
+        cannot be serialized, so it is rebuilt on load (a bulk O(n log n) step).
+        """
+        payload = {
+            'format_version': LOCATOR_FORMAT_VERSION,
+            'version': self.version,
+            'levels': {level: (shapely.to_wkb(geoms), codes) for level, (_, geoms, codes) in self.levels.items()},
+        }
+        with open(path, 'wb') as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str):
+        """Loads a persisted locator, or returns None if the file has an old format."""
+        with open(path, 'rb') as f:
+            payload = pickle.load(f)
+        if payload.get('format_version') != LOCATOR_FORMAT_VERSION:
+            return None
+        levels = {level: (shapely.from_wkb(wkb), codes) for level, (wkb, codes) in payload['levels'].items()}
+        return cls(levels, version=payload['version'])
+
+    def locate(self, lon, lat, chunk_size: int = 500_000) -> dict:
+        """
+        Finds, for each point, the code of the polygon containing it at every level.
+
+        :param lon: Array-like of longitudes (EPSG:4326).
+        :param lat: Array-like of latitudes (EPSG:4326).
+        :param chunk_size: Points processed per batch (bounds the temporary memory).
+        :return: Level name -> int64 array of IBGE codes (NOT_FOUND where no polygon matched).
+        """
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        results = {level: np.full(len(lon), NOT_FOUND, dtype=np.int64) for level in self.levels}
+
+        for start in range(0, len(lon), chunk_size):
+            stop = min(start + chunk_size, len(lon))
+            points = shapely.points(lon[start:stop], lat[start:stop])
+            for level, (tree, _, codes) in self.levels.items():
+                # 'intersects' também aceita pontos exatamente sobre a divisa entre dois polígonos.
+                point_idx, polygon_idx = tree.query(points, predicate='intersects')
+                results[level][start + point_idx] = codes[polygon_idx]
+        return results
+
+
+def benchmark_locator(locator: MunicipalityLocator, n_points: int = 1_000_000, chunk_size: int = 500_000, seed: int = 42) -> dict:
+    """
+    Measures the batch throughput of `locate` with random points inside the
+    municipality layer's bounding box.
+
+    :return: A dict with the number of points, elapsed seconds, points per second
+        and the share of points matched at the municipality level.
+    """
+    _, geometries, _ = locator.levels['municipality']
+    minx, miny, maxx, maxy = shapely.total_bounds(geometries)
+    rng = np.random.default_rng(seed)
+    lon = rng.uniform(minx, maxx, n_points)
+    lat = rng.uniform(miny, maxy, n_points)
+
+    start = time.perf_counter()
+    results = locator.locate(lon, lat, chunk_size=chunk_size)
+    elapsed = time.perf_counter() - start
+
+    report = {
+        'points': n_points,
+        'seconds': elapsed,
+        'points_per_second': n_points / elapsed if elapsed > 0 else float('inf'),
+        'matched_share': float(np.mean(results['municipality'] != NOT_FOUND)),
+    }
+    print(f"Located {n_points:,} points in {elapsed:.2f}s ({report['points_per_second']:,.0f} points/s, "
+          f"{report['matched_share']:.1%} inside a municipality)")
+    return report
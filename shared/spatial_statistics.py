@@ -0,0 +1,273 @@
+import os
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely import STRtree
+
+from shared.geometry_validation import ensure_valid
+from shared.layer_loader import load_layer, geometry_version
+
+CONTIGUITY_FORMAT_VERSION = 1
+CONTIGUITY_RULES = ('queen', 'rook')
+# Fronteiras mais próximas que isso (em metros, EPSG:3857) contam como encostadas: as malhas do IBGE têm frestas mínimas.
+DEFAULT_SNAP_DISTANCE = 1.0
+PERMUTATION_CHUNK_VALUES = 4_000_000
+
+# Quadrantes do diagrama de Moran (convenção do PySAL); 0 = não significativo.
+LISA_NOT_SIGNIFICANT = 0
+LISA_HIGH_HIGH = 1
+LISA_LOW_HIGH = 2
+LISA_LOW_LOW = 3
+LISA_HIGH_LOW = 4
+LISA_LABELS = {0: 'Not significant', 1: 'High-High', 2: 'Low-High', 3: 'Low-Low', 4: 'High-Low'}
+
+_GRAPH_CACHE: dict = {}
+
+
+class ContiguityGraph:
+    """
+    The adjacency graph of a polygon layer (e.g. the municipalities of a state
+    or of the whole country) as a CSR sparse matrix: the neighbors of polygon
+    i are indices[indptr[i]:indptr[i + 1]].
+
+    Every statistic below uses the row-standardized weights (each neighbor of
+    i weighs 1 / degree(i)), so a spatial lag is one bincount over the CSR
+    arrays and never a Python loop over polygons.
+    """
+
+    def __init__(self, codes: np.ndarray, indptr: np.ndarray, indices: np.ndarray, rule: str = 'queen', version: str = None):
+        self.codes = np.asarray(codes, dtype=np.int64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.rule = rule
+        self.version = version
+        self.degree = np.diff(self.indptr)
+        self._rows = np.repeat(np.arange(len(self.codes)), self.degree)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @classmethod
+    def build(cls, geometries, codes, rule: str = 'queen', snap_distance: float = DEFAULT_SNAP_DISTANCE, version: str = None) -> "ContiguityGraph":
+        """
+        Builds the graph from a polygon layer with one STRtree query.
+
+        :param geometries: The polygons, in a projected CRS (units of snap_distance).
+        :param codes: The code of each polygon (e.g. the IBGE 'codarea').
+        :param rule: 'queen' (sharing any boundary point) or 'rook' (sharing a boundary segment).
+        :param snap_distance: Polygons closer than this are considered to touch.
+        """
+        if rule not in CONTIGUITY_RULES:
+            raise ValueError(f"Unknown contiguity rule '{rule}'. Use one of {CONTIGUITY_RULES}.")
+        geometries = np.asarray(geometries, dtype=object)
+        left, right = STRtree(geometries).query(geometries, predicate='dwithin', distance=snap_distance)
+        keep = left < right
+        left, right = left[keep], right[keep]
+
+        if rule == 'rook' and len(left):
+            # Torre: a fronteira comum precisa ter comprimento (encostar em um único vértice não basta).
+            boundaries = shapely.boundary(geometries)
+            shared = shapely.intersection(boundaries[left], shapely.buffer(boundaries[right], snap_distance))
+            keep = shapely.length(shared) > 2 * snap_distance
+            left, right = left[keep], right[keep]
+
+        # Matriz simétrica: cada par entra nas duas linhas.
+        rows = np.concatenate([left, right])
+        columns = np.concatenate([right, left])
+        order = np.lexsort((columns, rows))
+        indptr = np.zeros(len(geometries) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(rows, minlength=len(geometries)))
+        return cls(codes, indptr, columns[order], rule=rule, version=version)
+
+    @classmethod
+    def from_layers(cls, municipality_paths: list, rule: str = 'queen') -> "ContiguityGraph":
+        """
+        Builds the graph of the municipality files written by the fetch use cases
+        (one state, or many for a nationwide graph).
+        """
+        frames = []
+        for path in municipality_paths:
+            frames.append(ensure_valid(load_layer(path, "epsg:3857", columns=['codarea']), path))
+        gdf = pd.concat(frames, ignore_index=True)
+        gdf = gdf[gdf['codarea'].notna()].drop_duplicates('codarea')
+        return cls.build(gdf.geometry.values, gdf['codarea'].astype(np.int64).to_numpy(), rule=rule)
+
+    @classmethod
+    def build_or_load(cls, cache_path: str, municipality_paths: list, rule: str = 'queen') -> "ContiguityGraph":
+        """
+        Returns the graph from memory or from `cache_path` (if given), rebuilding
+        (and persisting) it when the source geometries changed.
+        """
+        # Versão pelo conteúdo geométrico: a análise regrava os arquivos com novas colunas, não novas geometrias.
+        version = f"{geometry_version(municipality_paths)}:{rule}"
+        key = cache_path or version
+        graph = _GRAPH_CACHE.get(key)
+        if graph is None and cache_path and os.path.exists(cache_path):
+            graph = cls.load(cache_path)
+        if graph is None or graph.version != version:
+            graph = cls.from_layers(municipality_paths, rule)
+            graph.version = version
+            if cache_path:
+                graph.save(cache_path)
+        _GRAPH_CACHE[key] = graph
+        return graph
+
+    def save(self, path: str) -> None:
+        """Persists the graph (CSR arrays) as a compressed .npz file."""
+        np.savez_compressed(
+            path, format_version=CONTIGUITY_FORMAT_VERSION, version=np.array(self.version or ""), rule=np.array(self.rule),
+            codes=self.codes, indptr=self.indptr, indices=self.indices,
+        )
+
+    @classmethod
+    def load(cls, path: str):
+        """Loads a persisted graph, or returns None if the file has an old format."""
+        with np.load(path) as data:
+            if int(data['format_version']) != CONTIGUITY_FORMAT_VERSION:
+                return None
+            return cls(data['codes'], data['indptr'], data['indices'], rule=str(data['rule']), version=str(data['version']))
+
+    def to_scipy(self):
+        """The row-standardized weights as a scipy.sparse CSR matrix (requires SciPy)."""
+        from scipy import sparse
+        with np.errstate(divide='ignore'):
+            weights = 1.0 / self.degree[self._rows]
+        return sparse.csr_matrix((weights, self.indices, self.indptr), shape=(len(self), len(self)))
+
+    def align(self, codes, values) -> np.ndarray:
+        """Orders a variable given per code as the graph nodes; missing codes get NaN."""
+        series = pd.Series(np.asarray(values, dtype=np.float64), index=np.asarray(codes, dtype=np.int64))
+        series = series[~series.index.duplicated()]
+        return series.reindex(self.codes).to_numpy()
+
+    def spatial_lag(self, values: np.ndarray) -> np.ndarray:
+        """The mean of each node's neighbors (0 for nodes without neighbors)."""
+        values = np.asarray(values, dtype=np.float64)
+        sums = np.bincount(self._rows, weights=values[self.indices], minlength=len(self))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.degree > 0, sums / self.degree, 0.0)
+
+
+def _standardize(graph: ContiguityGraph, values: np.ndarray) -> tuple[np.ndarray, np.ndarray, float]:
+    """Deviations from the mean of the nodes that have data and neighbors (others become 0)."""
+    values = np.asarray(values, dtype=np.float64)
+    used = ~np.isnan(values) & (graph.degree > 0)
+    z = np.zeros(len(values))
+    mean = float(values[used].mean()) if used.any() else 0.0
+    z[used] = values[used] - mean
+    return z, used, mean
+
+
+def _folded_p_value(permuted_ge, permuted_le, permutations: int):
+    """
+    Pseudo p-value of a permutation test: the share of permutations at least as
+    extreme as the observed value, in the tail it lies in (>= or <=, so ties count
+    as extreme and a value equal to every permutation gets p = 1).
+    """
+    extreme = np.minimum(permuted_ge, permuted_le)
+    return (extreme + 1.0) / (permutations + 1.0)
+
+
+def global_morans_i(graph: ContiguityGraph, values: np.ndarray, permutations: int = 999, seed: int = 0) -> dict:
+    """
+    Global Moran's I with a permutation test.
+
+    All permutations are evaluated as matrices (permutation x node) in chunks,
+    so the test costs a few bincounts instead of one Python loop per permutation.
+
+    :return: {'I', 'expected_I', 'p_value', 'z_score', 'n'}.
+    """
+    z, used, mean = _standardize(graph, values)
+    n = int(used.sum())
+    if n < 3:
+        raise ValueError("Moran's I needs at least 3 polygons with data and neighbors.")
+    # Vizinhos sem dado entram com desvio 0 (neutros), como no tratamento usual de valores ausentes.
+    denominator = float(z @ z)
+    observed = float(z @ graph.spatial_lag(z)) / denominator
+
+    rng = np.random.default_rng(seed)
+    used_index = np.flatnonzero(used)
+    chunk = max(1, PERMUTATION_CHUNK_VALUES // max(len(graph.indices), 1))
+    simulated = []
+    for start in range(0, permutations, chunk):
+        size = min(chunk, permutations - start)
+        shuffled = np.zeros((size, len(z)))
+        shuffled[:, used_index] = rng.permuted(np.broadcast_to(z[used_index], (size, n)), axis=1)
+        # Defasagem de todas as permutações de uma vez: soma por linha da matriz CSR via bincount 2D.
+        row_offsets = (np.arange(size)[:, None] * len(z) + graph._rows[None, :]).ravel()
+        sums = np.bincount(row_offsets, weights=shuffled[:, graph.indices].ravel(), minlength=size * len(z)).reshape(size, len(z))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lags = np.where(graph.degree > 0, sums / graph.degree, 0.0)
+        simulated.append(np.einsum('ij,ij->i', shuffled, lags) / denominator)
+    simulated = np.concatenate(simulated) if simulated else np.empty(0)
+
+    p_value = float(_folded_p_value(int((simulated >= observed).sum()), int((simulated <= observed).sum()), permutations)) if permutations else np.nan
+    std = simulated.std() if permutations else np.nan
+    return {
+        'I': observed,
+        'expected_I': -1.0 / (n - 1),
+        'p_value': p_value,
+        'z_score': float((observed - simulated.mean()) / std) if permutations and std > 0 else np.nan,
+        'n': n,
+    }
+
+
+def local_morans_i(graph: ContiguityGraph, values: np.ndarray, permutations: int = 999, seed: int = 0,
+                   significance: float = 0.05) -> dict:
+    """
+    Local Moran's I (LISA) with a conditional permutation test: for each node,
+    its neighbors' values are replaced by random draws from the other nodes.
+
+    As in PySAL's conditional randomization, one set of random draws is shared
+    by all nodes (node i takes the first degree(i) draws, skipping itself), so
+    nodes with the same degree are tested together as one array operation.
+
+    :return: {'I', 'p_value', 'lag', 'cluster'}, one value per graph node ('lag' is the
+        neighbors' mean of the original values). 'cluster' is
+        LISA_HIGH_HIGH/LOW_HIGH/LOW_LOW/HIGH_LOW when p <= significance, else LISA_NOT_SIGNIFICANT
+        (always for values equal to the mean).
+    """
+    z, used, mean = _standardize(graph, values)
+    n = int(used.sum())
+    if n < 3:
+        raise ValueError("Local Moran's I needs at least 3 polygons with data and neighbors.")
+    m2 = float(z @ z) / n
+    lag = graph.spatial_lag(z)
+    local_i = z * lag / m2
+
+    rng = np.random.default_rng(seed)
+    used_index = np.flatnonzero(used)
+    max_degree = int(graph.degree[used].max())
+    # Sorteios compartilhados: cada linha são max_degree posições distintas entre os outros n - 1 nós.
+    draws = np.argsort(rng.random((permutations, n - 1)), axis=1)[:, :min(max_degree, n - 1)] if permutations else None
+
+    p_values = np.full(len(z), np.nan)
+    position = np.full(len(z), -1)
+    position[used_index] = np.arange(n)
+    for degree in np.unique(graph.degree[used]):
+        k = min(int(degree), n - 1)
+        nodes = used_index[graph.degree[used_index] == degree]
+        if permutations == 0 or k == 0:
+            continue
+        chunk = max(1, PERMUTATION_CHUNK_VALUES // (permutations * k))
+        for start in range(0, len(nodes), chunk):
+            block = nodes[start:start + chunk]
+            own = position[block][:, None, None]
+            # Pula o próprio nó: sorteios >= sua posição avançam uma casa.
+            picked = draws[None, :, :k] + (draws[None, :, :k] >= own)
+            simulated = z[block][:, None] * z[used_index][picked].mean(axis=2) / m2
+            observed = local_i[block][:, None]
+            p_values[block] = _folded_p_value((simulated >= observed).sum(axis=1), (simulated <= observed).sum(axis=1), permutations)
+
+    cluster = np.full(len(z), LISA_NOT_SIGNIFICANT, dtype=np.int64)
+    # Valor igual à média (z = 0) não pertence a nenhum quadrante.
+    significant = used & (z != 0) & (p_values <= significance)
+    high, high_lag = z > 0, lag > 0
+    cluster[significant & high & high_lag] = LISA_HIGH_HIGH
+    cluster[significant & ~high & high_lag] = LISA_LOW_HIGH
+    cluster[significant & ~high & ~high_lag] = LISA_LOW_LOW
+    cluster[significant & high & ~high_lag] = LISA_HIGH_LOW
+    local_i[~used] = np.nan
+    # Defasagem na escala original (vizinhos sem dado contam como a média).
+    return {'I': local_i, 'p_value': p_values, 'lag': lag + mean, 'cluster': cluster}
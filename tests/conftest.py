@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Os testes importam 'shared' e 'use_cases' a partir da raiz do projeto, como o run_use_case.py.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
@@ -0,0 +1,40 @@
+import json
+
+import shapely
+from shapely.geometry import mapping
+
+from use_cases.aggregate_points.index import AggregatePointsUseCase
+
+
+def _municipalities(path):
+    features = [
+        {'type': 'Feature', 'geometry': mapping(shapely.box(0, 0, 1, 1)), 'properties': {'codarea': '2800100'}},
+        {'type': 'Feature', 'geometry': mapping(shapely.box(1, 0, 2, 1)), 'properties': {'codarea': '2800200'}},
+        # Sem codarea: não pode receber os registros sem município.
+        {'type': 'Feature', 'geometry': mapping(shapely.box(5, 5, 6, 6)), 'properties': {}},
+    ]
+    path.write_text(json.dumps({'type': 'FeatureCollection', 'features': features}))
+    return str(path)
+
+
+def _counts(path):
+    return [f['properties'].get('n') for f in json.loads(open(path).read())['features']]
+
+
+def test_unmatched_records_do_not_land_on_features_without_code(tmp_path):
+    municipalities = _municipalities(tmp_path / "m.geojson")
+    records = tmp_path / "records.csv"
+    records.write_text("code\n2800100\n280020\n\nabc\n9999999\n")
+    AggregatePointsUseCase().execute(str(records), municipalities, 'n', code_column='code')
+    assert _counts(municipalities) == [1, 1, None]
+
+
+def test_points_join_with_a_persisted_locator(tmp_path):
+    municipalities = _municipalities(tmp_path / "m.geojson")
+    records = tmp_path / "records.csv"
+    records.write_text("lon,lat\n0.5,0.5\n1.5,0.5\n1.5,0.2\n50,50\n")
+    cache = str(tmp_path / "locator.pkl")
+    for _ in range(2):
+        # A segunda execução relê o arquivo regravado pela primeira e reaproveita o localizador.
+        AggregatePointsUseCase().execute(str(records), municipalities, 'n', locator_cache_path=cache)
+        assert _counts(municipalities) == [1, 2, None]
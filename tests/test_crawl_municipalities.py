@@ -0,0 +1,20 @@
+from shared.job_queue import JobQueue, DONE, FAILED
+from use_cases.crawl_municipalities import index as crawl
+from use_cases.crawl_municipalities.index import BULK_MESH, MESH
+
+
+def test_bulk_mesh_lost_to_an_expired_lease_falls_back_to_single_meshes(tmp_path, monkeypatch):
+    path = str(tmp_path / "queue.sqlite")
+    with JobQueue(path) as queue:
+        queue.enqueue([(BULK_MESH[0], '28', BULK_MESH[1], {'abbreviation': 'SE', 'municipalities': ['2800100', '2800200']})])
+        # O job derruba o worker em todas as tentativas: o lease expira sem fail() ser chamado.
+        for _ in range(queue.max_attempts):
+            assert len(queue.claim('dead-worker', lease_seconds=-1)) == 1
+
+    mesh = {'type': 'Feature', 'geometry': None, 'properties': {}}
+    monkeypatch.setattr(crawl, 'fetch_geojson_mesh', lambda kind, locality_id: {'features': [mesh]})
+    assert crawl._work_thread(path) == 2
+
+    with JobQueue(path) as queue:
+        assert queue.counts()[FAILED] == 1 and queue.counts()[DONE] == 2
+        assert [locality_id for locality_id, _, _ in queue.results(MESH[1], MESH[0])] == ['2800100', '2800200']
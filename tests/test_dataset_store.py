@@ -0,0 +1,83 @@
+import os
+
+import shapely
+from shapely.geometry import mapping
+
+from shared import dataset_store
+from shared.dataset_store import DatasetStore, prefer_store, upsert_into_store
+from shared.file_utils import save_geojson
+from shared.layer_loader import load_layer
+
+
+def _municipalities(uf, codes, **extra):
+    return [
+        {'type': 'Feature', 'geometry': mapping(shapely.box(i, 0, i + 1, 1)),
+         'properties': {'codarea': str(code), 'name': f"M{code}", 'state_abbreviation': uf, **extra}}
+        for i, code in enumerate(codes)
+    ]
+
+
+def _setup(tmp_path):
+    store_path = str(tmp_path / "store.gpkg")
+    loose = str(tmp_path / "2-complete-data-municipalities-pe.geojson")
+    features = _municipalities('PE', [2600001, 2600002])
+    save_geojson(features, loose)
+    # O arquivo solto é mais antigo que o banco, como logo após um fetch.
+    os.utime(loose, (1_000_000_000, 1_000_000_000))
+    upsert_into_store('municipalities', features, store_path)
+    return store_path, loose
+
+
+def test_upsert_replaces_rows_by_key(tmp_path):
+    store_path, _ = _setup(tmp_path)
+    upsert_into_store('municipalities', _municipalities('PE', [2600002, 2600003]), store_path)
+    upsert_into_store('municipalities', _municipalities('SE', [2800001]), store_path)
+    store = DatasetStore(store_path)
+    assert store.count('municipalities') == 4
+    assert store.count('municipalities', state_abbreviation='PE') == 3
+    assert sorted(store.read('municipalities', state_abbreviation='SE')['codarea']) == ['2800001']
+
+
+def test_upsert_with_new_column_rewrites_schema(tmp_path):
+    store_path, _ = _setup(tmp_path)
+    upsert_into_store('municipalities', _municipalities('PE', [2600001], casos=7), store_path)
+    gdf = DatasetStore(store_path).read('municipalities', columns=['codarea', 'casos'], state_abbreviation='PE')
+    casos = gdf.set_index('codarea')['casos']
+    assert casos['2600001'] == 7
+    assert casos.isna()['2600002']
+
+
+def test_prefer_store_uses_store_when_up_to_date(tmp_path):
+    store_path, loose = _setup(tmp_path)
+    caminhos = prefer_store({'municipios': loose, 'saida': 'x.png'}, store_path, 'PE')
+    assert caminhos['municipios'] == DatasetStore(store_path).layer_path('municipalities', state_abbreviation='PE')
+    assert caminhos['saida'] == 'x.png'
+    # UF sem linhas no banco: fica o arquivo solto.
+    assert prefer_store({'municipios': loose}, store_path, 'SE')['municipios'] == loose
+
+
+def test_prefer_store_falls_back_to_newer_or_richer_file(tmp_path):
+    store_path, loose = _setup(tmp_path)
+    assert prefer_store({'municipios': loose}, store_path, 'PE', columns=['casos'])['municipios'] == loose
+
+    # Coluna nova gravada no GeoJSON depois do banco (ex: Opção 15).
+    save_geojson(_municipalities('PE', [2600001, 2600002], casos=3), loose)
+    caminhos = prefer_store({'municipios': loose}, store_path, 'PE')
+    assert caminhos['municipios'] == loose
+    assert 'casos' in load_layer(caminhos['municipios'], columns=['casos']).columns
+
+
+def test_failed_append_keeps_the_old_rows(tmp_path, monkeypatch):
+    store_path, _ = _setup(tmp_path)
+    original = dataset_store.pyogrio.write_dataframe
+
+    def write_half_and_fail(gdf, *args, **kwargs):
+        original(gdf.iloc[:1], *args, **kwargs)
+        raise OSError("disk full")
+
+    monkeypatch.setattr(dataset_store.pyogrio, 'write_dataframe', write_half_and_fail)
+    upsert_into_store('municipalities', _municipalities('PE', [2600002, 2600003], name='novo'), store_path)
+    monkeypatch.undo()
+
+    gdf = DatasetStore(store_path).read('municipalities', columns=['codarea', 'name'], state_abbreviation='PE')
+    assert sorted(zip(gdf['codarea'], gdf['name'])) == [('2600001', 'M2600001'), ('2600002', 'M2600002')]
@@ -0,0 +1,70 @@
+import numpy as np
+import shapely
+from shapely.geometry import mapping
+
+from shared.feature_accumulator import FeatureAccumulator
+from shared.feature_enrichment import enrich_features
+from shared.geometry_validation import validate_features, VALID_PROPERTY
+
+BOWTIE = shapely.from_wkt('POLYGON ((0 0, 1 1, 1 0, 0 1, 0 0))')
+COLLAPSED = shapely.from_wkt('POLYGON ((0 0, 1 1, 2 2, 0 0))')
+SQUARE = shapely.box(0, 0, 1, 1)
+
+
+def _feature(geometry, code):
+    return {'type': 'Feature', 'geometry': mapping(geometry), 'properties': {'codarea': str(code)}}
+
+
+def test_typed_columns_fill_missing_values():
+    accumulator = FeatureAccumulator(schema={'population': 'int64', 'density': 'float64'})
+    accumulator.append(_feature(SQUARE, 1), population=10)
+    accumulator.append(_feature(SQUARE, 2), density=1.5)
+    assert accumulator.column('population').tolist() == [10, 0]
+    assert np.isnan(accumulator.column('density')[0])
+    assert [f['properties']['density'] for f in accumulator] == [None, 1.5]
+
+
+def test_chunked_validation_with_collapsed_polygons():
+    # Cada bloco (uma UF no crawl) é validado separadamente, com colapsados antes de outros inválidos.
+    chunks = [
+        [SQUARE, COLLAPSED, BOWTIE],
+        [COLLAPSED, BOWTIE, BOWTIE, SQUARE],
+        [BOWTIE, COLLAPSED],
+    ]
+    code = 0
+    for chunk in chunks:
+        accumulator = FeatureAccumulator(schema={'population': 'int64'})
+        for geometry in chunk:
+            accumulator.append(_feature(geometry, code), population=code)
+            code += 1
+        validate_features(accumulator)
+
+        repaired = accumulator.geometries()
+        assert accumulator.column(VALID_PROPERTY).tolist() == [g is SQUARE for g in chunk]
+        for original, result in zip(chunk, repaired):
+            if original is COLLAPSED:
+                assert result is None
+            else:
+                assert result.is_valid and np.isclose(result.area, original.area if original is SQUARE else 0.5)
+        assert len(list(accumulator)) == len(chunk)
+
+
+def test_missing_population_stays_missing():
+    # Uma população que falhou não vira 0: a coluna float guarda NaN e a densidade fica vazia.
+    accumulator = FeatureAccumulator(schema={'population': 'float64'})
+    for code, population in enumerate([None, 0, 100]):
+        accumulator.append(_feature(SQUARE, code), population=population)
+    enrich_features(accumulator, population_property='population')
+    properties = [f['properties'] for f in accumulator]
+    assert [p['population'] for p in properties] == [None, 0.0, 100.0]
+    assert properties[0]['population_density'] is None
+    assert properties[1]['population_density'] == 0.0
+
+
+def test_missing_population_in_an_undeclared_column():
+    # Sem esquema a coluna guarda os valores Python: None é ausência, 0 é população real.
+    accumulator = FeatureAccumulator()
+    for code, population in enumerate([None, 0]):
+        accumulator.append(_feature(SQUARE, code), population=population)
+    enrich_features(accumulator, population_property='population')
+    assert [f['properties']['population_density'] for f in accumulator] == [None, 0.0]
@@ -0,0 +1,45 @@
+import geopandas as gpd
+import shapely
+
+from shared.geometry_store import attach_geometry_store, build_geometry_store
+from shared.layer_loader import clear_layer_cache, load_layer
+
+
+def _layer(tmp_path):
+    path = str(tmp_path / "layer.geojson")
+    gpd.GeoDataFrame(
+        {'codarea': ['2800100', '2800200'], 'name': ['A', 'B']},
+        geometry=[shapely.box(0, 0, 1, 1), shapely.box(1, 0, 2, 1)], crs="EPSG:4326",
+    ).to_file(path, driver="GeoJSON")
+    return path
+
+
+def _buffer_addresses(gdf):
+    addresses = set()
+    for name in gdf.columns:
+        arrow = getattr(gdf[name].array, '_pa_array', None)
+        if arrow is not None:
+            addresses.update(b.address for chunk in arrow.chunks for b in chunk.buffers() if b is not None)
+    return addresses
+
+
+def test_loaded_store_does_not_reference_the_mapped_file(tmp_path):
+    store_path = build_geometry_store(_layer(tmp_path))
+    with attach_geometry_store(store_path) as store:
+        mapped = {b.address for column in store.table.columns for chunk in column.chunks for b in chunk.buffers() if b is not None}
+        gdf = store.to_geodataframe()
+        assert not mapped & _buffer_addresses(gdf)
+
+    clear_layer_cache()
+    gdf = load_layer(store_path, columns=['codarea', 'name'])
+    assert gdf['codarea'].tolist() == ['2800100', '2800200'] and gdf['name'].tolist() == ['A', 'B']
+
+
+def test_store_repairs_geometries_without_dropping_parts(tmp_path):
+    path = str(tmp_path / "bowtie.geojson")
+    bowtie = shapely.from_wkt('POLYGON ((0 0, 1 1, 1 0, 0 1, 0 0))')
+    gpd.GeoDataFrame({'codarea': ['1']}, geometry=[bowtie], crs="EPSG:4326").to_file(path, driver="GeoJSON")
+    with attach_geometry_store(build_geometry_store(path)) as store:
+        (geometry,) = store.to_geodataframe().geometry
+    # buffer(0) guardaria só um dos dois triângulos (área 0.25).
+    assert geometry.is_valid and abs(geometry.area - 0.5) < 1e-9
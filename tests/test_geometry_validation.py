@@ -0,0 +1,37 @@
+import numpy as np
+import shapely
+
+from shared.geometry_validation import repair_geometries
+
+BOWTIE = shapely.from_wkt('POLYGON ((0 0, 1 1, 1 0, 0 1, 0 0))')
+# Polígono colapsado: make_valid devolve só uma linha, sem parte poligonal.
+COLLAPSED = shapely.from_wkt('POLYGON ((0 0, 1 1, 2 2, 0 0))')
+SQUARE = shapely.box(0, 0, 1, 1)
+
+
+def test_valid_geometries_are_untouched():
+    repaired, valid, reasons, area_change = repair_geometries(np.array([SQUARE, None], dtype=object))
+    assert valid[0] and repaired[0] is SQUARE
+    assert repaired[1] is None
+    assert reasons[0] is None
+    assert np.all(area_change == 0)
+
+
+def test_bowtie_keeps_both_lobes():
+    repaired, valid, reasons, area_change = repair_geometries(np.array([BOWTIE], dtype=object))
+    assert not valid[0]
+    assert 'Self-intersection' in reasons[0]
+    assert repaired[0].is_valid
+    assert shapely.get_type_id(repaired[0]) == 6
+    assert np.isclose(repaired[0].area, 0.5)
+
+
+def test_collapsed_polygon_mixed_with_bowties():
+    for geometries in ([BOWTIE, COLLAPSED, BOWTIE], [COLLAPSED, BOWTIE], [COLLAPSED], [BOWTIE, COLLAPSED]):
+        repaired, valid, _, _ = repair_geometries(np.array(geometries, dtype=object))
+        assert not valid.any()
+        for original, result in zip(geometries, repaired):
+            if original is COLLAPSED:
+                assert result is None
+            else:
+                assert result.is_valid and np.isclose(result.area, 0.5)
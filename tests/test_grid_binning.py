@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+import shapely
+
+from shared.grid_binning import GridBinning, grid_cells
+
+# Dois "municípios" retangulares lado a lado (CRS de área igual, em metros).
+MUNICIPALITIES = np.array([shapely.box(0, 0, 30_000, 40_000), shapely.box(30_000, 0, 70_000, 40_000)], dtype=object)
+MASK = shapely.union_all(MUNICIPALITIES)
+
+
+@pytest.mark.parametrize('kind', ['hex', 'square'])
+def test_cells_cover_the_mask_with_equal_areas(kind):
+    cells = grid_cells(shapely.bounds(MASK), kind, 10_000)
+    assert np.allclose(shapely.area(cells), 10_000 ** 2)
+    # Sobram só lascas de arredondamento entre hexágonos vizinhos.
+    assert shapely.difference(MASK, shapely.union_all(cells)).area < 1e-3
+
+
+@pytest.mark.parametrize('kind', ['hex', 'square'])
+def test_apportion_conserves_totals_and_areas(kind):
+    grid = GridBinning.build(MASK, MUNICIPALITIES, [10, 20], kind, 10_000)
+    assert shapely.area(grid.cells).sum() == pytest.approx(MASK.area)
+    assert grid.covered_area.sum() == pytest.approx(MASK.area)
+
+    population = grid.align([20, 10], [8_000.0, 3_000.0])
+    assert population.tolist() == [3_000.0, 8_000.0]
+    assert grid.apportion(population, extensive=True).sum() == pytest.approx(11_000.0)
+
+
+def test_intensive_values_ignore_missing_sources():
+    grid = GridBinning.build(MASK, MUNICIPALITIES, [10, 20], 'square', 10_000)
+    # Município 20 sem dado: as células só dele ficam NaN, e as mistas usam só o município 10.
+    rates = grid.align([10, 20], [5.0, np.nan])
+    result = grid.apportion(rates, extensive=False)
+    only_20 = grid.apportion(grid.align([10, 20], [0.0, 1.0]), extensive=True) > 0
+    only_20 &= grid.apportion(grid.align([10, 20], [1.0, 0.0]), extensive=True) == 0
+    assert only_20.any() and np.all(np.isnan(result[only_20]))
+    assert np.allclose(result[~only_20], 5.0)
+    # Extensiva: o NaN não soma nada.
+    assert grid.apportion(grid.align([10, 20], [100.0, np.nan])).sum() == pytest.approx(100.0)
+
+
+def test_grid_persistence(tmp_path):
+    grid = GridBinning.build(MASK, MUNICIPALITIES, [10, 20], 'hex', 10_000, version='v1')
+    grid.save(str(tmp_path / "grid.npz"))
+    loaded = GridBinning.load(str(tmp_path / "grid.npz"))
+    assert loaded.version == 'v1' and len(loaded) == len(grid)
+    assert np.allclose(loaded.apportion([1.0, 2.0]), grid.apportion([1.0, 2.0]))
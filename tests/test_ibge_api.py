@@ -0,0 +1,61 @@
+import threading
+import time
+import types
+
+import requests
+
+from shared import ibge_api
+from shared.ibge_api import CircuitBreaker
+
+
+class _Response:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.headers = {}
+        self.content = b'{"ok": true}' if payload is None else payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(str(self.status_code))
+
+
+def _fast_clock(monkeypatch):
+    # Esperas encurtadas: o teste percorre abrir -> meio-aberto -> aberto -> fechado em milissegundos.
+    fake_time = types.SimpleNamespace(monotonic=time.monotonic, perf_counter=time.perf_counter,
+                                      sleep=lambda seconds: time.sleep(min(seconds, 0.01)))
+    monkeypatch.setattr(ibge_api, 'time', fake_time)
+
+
+def test_breaker_opens_and_closes():
+    breaker = CircuitBreaker(failure_threshold=2, open_seconds=0.01)
+    breaker.record(success=False)
+    assert breaker.state == 'closed'
+    breaker.record(success=False)
+    assert breaker.state == 'open'
+    time.sleep(0.02)
+    breaker.wait_until_allowed()
+    assert breaker.state == 'half-open'
+    breaker.record(success=False)
+    assert breaker.state == 'open' and breaker.open_seconds == 0.02
+    time.sleep(0.03)
+    breaker.wait_until_allowed()
+    breaker.record(success=True)
+    assert breaker.state == 'closed' and breaker.open_seconds == 0.01
+
+
+def test_throttled_probe_releases_the_circuit(monkeypatch):
+    _fast_clock(monkeypatch)
+    breaker = CircuitBreaker(failure_threshold=2, open_seconds=0.01)
+    monkeypatch.setattr(ibge_api, '_BREAKER', breaker)
+    responses = iter([_Response(503), _Response(503), _Response(429), _Response(200)])
+    monkeypatch.setattr(ibge_api.requests, 'get', lambda *args, **kwargs: next(responses))
+
+    result = {}
+    worker = threading.Thread(target=lambda: result.update(data=ibge_api._fetch_request("http://example")), daemon=True)
+    worker.start()
+    worker.join(timeout=10)
+    assert not worker.is_alive(), "the request hung waiting for a probe that was never released"
+    assert result['data'] == {'ok': True}
+    assert breaker.state == 'closed'
+    # O 429 não conta como falha: o tempo aberto não dobrou.
+    assert breaker.open_seconds == 0.01
@@ -0,0 +1,74 @@
+import time
+
+from shared.job_queue import JobQueue, PENDING, LEASED, DONE, FAILED
+
+
+def _queue(tmp_path, **kwargs):
+    return JobQueue(str(tmp_path / "queue.sqlite"), **kwargs)
+
+
+def test_enqueue_is_idempotent(tmp_path):
+    with _queue(tmp_path) as queue:
+        assert queue.enqueue([('municipio', 1, 'malha', None), ('municipio', 2, 'malha', {'uf': 'PE'})]) == 2
+        assert queue.enqueue([('municipio', 1, 'malha', None), ('municipio', 3, 'malha', None)]) == 1
+        assert queue.counts()[PENDING] == 3
+
+
+def test_a_leased_job_is_not_handed_out_twice(tmp_path):
+    with _queue(tmp_path) as queue:
+        queue.enqueue([('municipio', i, 'malha', None) for i in range(3)])
+        first = queue.claim('worker-a', limit=2)
+        second = queue.claim('worker-b', limit=5)
+        assert len(first) == 2 and len(second) == 1
+        assert {j.locality_id for j in first}.isdisjoint(j.locality_id for j in second)
+        assert queue.claim('worker-c') == []
+        assert queue.counts()[LEASED] == 3
+
+
+def test_expired_lease_is_reclaimed_and_old_worker_loses_it(tmp_path):
+    with _queue(tmp_path) as queue:
+        queue.enqueue([('municipio', 1, 'malha', None)])
+        (job,) = queue.claim('worker-a', lease_seconds=0.01)
+        time.sleep(0.05)
+        (reclaimed,) = queue.claim('worker-b')
+        assert reclaimed.attempts == 2
+        # O primeiro worker perdeu a concessão: o resultado dele é recusado.
+        assert not queue.complete(job, {'late': True}, worker_id='worker-a')
+        assert queue.complete(reclaimed, {'ok': True}, worker_id='worker-b')
+        assert queue.counts()[DONE] == 1
+        assert queue.result('municipio', 1, 'malha') == {'ok': True}
+
+
+def test_failed_attempts_respect_max_attempts(tmp_path):
+    with _queue(tmp_path, max_attempts=2) as queue:
+        queue.enqueue([('municipio', 1, 'malha', None)])
+        (job,) = queue.claim('w')
+        assert queue.fail(job, 'timeout', worker_id='w')
+        assert queue.counts()[PENDING] == 1
+        (job,) = queue.claim('w')
+        assert queue.fail(job, 'timeout', worker_id='w')
+        assert queue.counts()[FAILED] == 1
+        assert queue.claim('w') == []
+        assert queue.retry_failed() == 1
+        assert queue.counts()[PENDING] == 1
+
+
+def test_expired_lease_on_last_attempt_becomes_failed(tmp_path):
+    with _queue(tmp_path, max_attempts=2) as queue:
+        queue.enqueue([('municipio', 1, 'malha', None)])
+        for _ in range(2):
+            assert len(queue.claim('w', lease_seconds=0.01)) == 1
+            time.sleep(0.05)
+        # O job derruba o worker toda vez: não volta à fila.
+        assert queue.claim('w') == []
+        assert queue.counts()[FAILED] == 1
+
+
+def test_results_survive_reopening(tmp_path):
+    with _queue(tmp_path) as queue:
+        queue.enqueue([('municipio', 7, 'populacao', {'name': 'X'})])
+        (job,) = queue.claim('w')
+        queue.complete(job, 1234, worker_id='w')
+    with _queue(tmp_path) as queue:
+        assert list(queue.results('populacao')) == [('7', {'name': 'X'}, 1234)]
+        assert list(queue.jobs('populacao')) == [('7', {'name': 'X'}, DONE)]
@@ -0,0 +1,53 @@
+import io
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from shared.map_components.labels import place_labels, plot_labels
+
+
+def _display_boxes(ax, collection):
+    """The display-space bounding box of each drawn label."""
+    offsets = collection.get_offset_transform().transform(collection.get_offsets())
+    boxes = []
+    for path, offset in zip(collection.get_paths(), offsets):
+        vertices = collection.get_transform().transform(path.vertices) + offset
+        boxes.append((*vertices.min(axis=0), *vertices.max(axis=0)))
+    return np.array(boxes)
+
+
+def test_place_labels_skips_overlaps_by_priority():
+    boxes = np.array([
+        [[0, 0, 10, 10]],
+        [[5, 5, 15, 15]],  # sobrepõe o primeiro
+        [[20, 0, 30, 10]],
+        [[95, 0, 105, 10]],  # sai da área
+    ], dtype=np.float64)
+    placed, positions = place_labels(boxes, [1, 2, 0, 5], (0, 0, 100, 100))
+    assert sorted(placed.tolist()) == [1, 2]
+    assert positions.tolist() == [0, 0]
+
+
+def test_placed_labels_do_not_overlap_after_savefig():
+    # Mapa largo com aspecto igual: o ajuste de aspecto encolhe o eixo em x só na hora do desenho.
+    xs = np.arange(10) * 10.0
+    cells = shapely.box(xs, 0, xs + 2, 2)
+    gdf = gpd.GeoDataFrame({'name': [f"Municipio {i}" for i in range(10)]}, geometry=cells)
+    fig, ax = plt.subplots(figsize=(10, 3), dpi=100)
+    ax.set_aspect('equal')
+    ax.set_xlim(0, 100)
+    ax.set_ylim(-40, 42)
+    drawn = plot_labels(ax, gdf, fontsize=8)
+    fig.savefig(io.BytesIO(), format='png', dpi=fig.dpi)
+
+    assert 0 < drawn < 10
+    boxes = _display_boxes(ax, ax.collections[-1])
+    for i in range(len(boxes)):
+        for j in range(i + 1, len(boxes)):
+            a, b = boxes[i], boxes[j]
+            assert not (a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]), (i, j)
+    plt.close(fig)
@@ -0,0 +1,21 @@
+import pandas as pd
+
+from shared.locality_catalog import LocalityCatalog
+
+
+def test_to_mapping_keeps_missing_regions_missing():
+    rows = [
+        {'municipality_id': '2800100', 'municipality_name': 'Aracaju',
+         'immediate_region_id': '280001', 'immediate_region_name': 'Aracaju',
+         'intermediate_region_id': '2801', 'intermediate_region_name': 'Aracaju',
+         'state_id': '28', 'state_abbreviation': 'SE', 'state_name': 'Sergipe'},
+        {'municipality_id': '2800200', 'municipality_name': 'Sem Região',
+         'immediate_region_id': None, 'immediate_region_name': None,
+         'intermediate_region_id': None, 'intermediate_region_name': None,
+         'state_id': '28', 'state_abbreviation': 'SE', 'state_name': 'Sergipe'},
+    ]
+    downloaded = pd.DataFrame(rows)
+    mapping = LocalityCatalog.from_mapping(downloaded).to_mapping()
+    # Ids ausentes voltam ausentes (não "-1"), como no download.
+    pd.testing.assert_frame_equal(mapping, downloaded, check_dtype=False)
+    assert mapping['immediate_region_id'].isna().tolist() == [False, True]
@@ -0,0 +1,41 @@
+import pandas as pd
+
+from shared.locality_catalog import LocalityCatalog
+from shared.name_resolver import MunicipalityNameResolver, normalize_names, AMBIGUOUS, NOT_FOUND
+
+STATES = {'26': ('PE', 'Pernambuco'), '28': ('SE', 'Sergipe')}
+
+
+def _resolver(municipalities):
+    rows = []
+    for code, name in municipalities:
+        state_abbreviation, state_name = STATES[str(code)[:2]]
+        rows.append({
+            'municipality_id': str(code), 'municipality_name': name,
+            'immediate_region_id': None, 'immediate_region_name': None,
+            'intermediate_region_id': None, 'intermediate_region_name': None,
+            'state_id': str(code)[:2], 'state_abbreviation': state_abbreviation, 'state_name': state_name,
+        })
+    return MunicipalityNameResolver(LocalityCatalog.from_mapping(pd.DataFrame(rows)))
+
+
+def test_normalize_names():
+    assert normalize_names(["SÃO JOÃO DEL-REI", "Sao  Joao del Rei "]).tolist() == ["sao joao del rei"] * 2
+
+
+def test_exact_matches_with_and_without_uf():
+    resolver = _resolver([(2600100, "Santa Cruz"), (2800100, "Santa Cruz"), (2600200, "Recife")])
+    assert resolver.resolve("RECIFE") == 2600200
+    assert resolver.resolve("Santa Cruz") == AMBIGUOUS
+    assert resolver.resolve("Santa Cruz", "se") == 2800100
+    assert resolver.resolve("Xique-Xique") == NOT_FOUND
+
+
+def test_fuzzy_tie_is_ambiguous_only_across_states():
+    # "Sao Bento" fica igualmente perto de "Sao Bento X" e "Sao Bento Y".
+    same_state = _resolver([(2600100, "Sao Bento X"), (2600200, "Sao Bento Y")])
+    assert same_state.resolve("Sao Bento") == 2600100
+
+    other_states = _resolver([(2600100, "Sao Bento X"), (2800100, "Sao Bento Y")])
+    assert other_states.resolve("Sao Bento") == AMBIGUOUS
+    assert other_states.resolve("Sao Bento", "SE") == 2800100
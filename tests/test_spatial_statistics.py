@@ -0,0 +1,96 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+from shared.spatial_statistics import (
+    ContiguityGraph, global_morans_i, local_morans_i, LISA_NOT_SIGNIFICANT, LISA_HIGH_HIGH, LISA_LOW_LOW,
+)
+
+
+def _grid(columns, rows, size=1000.0):
+    x, y = (a.ravel() for a in np.meshgrid(np.arange(columns) * size, np.arange(rows) * size))
+    return shapely.box(x, y, x + size, y + size)
+
+
+def test_queen_and_rook_degrees():
+    cells = _grid(3, 3)
+    queen = ContiguityGraph.build(cells, np.arange(9), 'queen')
+    rook = ContiguityGraph.build(cells, np.arange(9), 'rook')
+    assert queen.degree.tolist() == [3, 5, 3, 5, 8, 5, 3, 5, 3]
+    assert rook.degree.tolist() == [2, 3, 2, 3, 4, 3, 2, 3, 2]
+    assert sorted(rook.indices[rook.indptr[4]:rook.indptr[5]].tolist()) == [1, 3, 5, 7]
+
+
+def test_graph_persistence(tmp_path):
+    graph = ContiguityGraph.build(_grid(4, 2), np.arange(100, 108), 'queen', version='v1')
+    graph.save(str(tmp_path / "graph.npz"))
+    loaded = ContiguityGraph.load(str(tmp_path / "graph.npz"))
+    assert loaded.version == 'v1' and loaded.rule == 'queen'
+    assert np.array_equal(loaded.codes, graph.codes)
+    assert np.array_equal(loaded.indptr, graph.indptr) and np.array_equal(loaded.indices, graph.indices)
+
+
+def test_morans_i_matches_hand_computation():
+    # Quatro células em linha, valores 1..4: z = [-1.5, -0.5, 0.5, 1.5], zᵀz = 5,
+    # defasagens (pesos padronizados por linha) = [-0.5, -0.5, 0.5, 0.5], zᵀWz = 2 -> I = 2 / 5.
+    graph = ContiguityGraph.build(_grid(4, 1), np.arange(4), 'rook')
+    values = np.array([1.0, 2.0, 3.0, 4.0])
+    result = global_morans_i(graph, values, permutations=99, seed=1)
+    assert result['I'] == pytest.approx(0.4)
+    assert result['expected_I'] == pytest.approx(-1 / 3)
+    assert 0 < result['p_value'] <= 1
+
+    # Iᵢ = zᵢ · lagᵢ / m2, com m2 = zᵀz / n = 1.25.
+    local = local_morans_i(graph, values, permutations=99, seed=1)
+    assert local['I'] == pytest.approx([0.6, 0.2, 0.2, 0.6])
+    assert local['lag'] == pytest.approx([2.0, 2.0, 3.0, 3.0])
+    assert np.nansum(local['I']) / 4 == pytest.approx(result['I'])
+
+
+def test_global_test_detects_clustering():
+    cells = _grid(10, 10)
+    values = np.repeat(np.arange(10.0), 10) + np.random.default_rng(0).random(100)
+    result = global_morans_i(ContiguityGraph.build(cells, np.arange(100), 'queen'), values, permutations=199, seed=0)
+    assert result['I'] > 0.5
+    assert result['p_value'] == pytest.approx(1 / 200)
+
+
+def test_local_clusters_and_mean_values():
+    cells = _grid(10, 10)
+    values = np.zeros(100)
+    values[:30] = -1.0  # três linhas de baixo: LL
+    values[70:] = 1.0  # três linhas de cima: HH; o meio fica exatamente na média
+    local = local_morans_i(ContiguityGraph.build(cells, np.arange(100), 'queen'), values, permutations=199, seed=0)
+    assert np.all(local['cluster'][30:70] == LISA_NOT_SIGNIFICANT)
+    assert np.all(local['p_value'][30:70] == 1.0)
+    assert np.all(local['cluster'][:20] == LISA_LOW_LOW)
+    assert np.all(local['cluster'][80:] == LISA_HIGH_HIGH)
+
+
+def test_missing_values_are_excluded():
+    graph = ContiguityGraph.build(_grid(4, 1), np.arange(4), 'rook')
+    local = local_morans_i(graph, np.array([1.0, np.nan, 3.0, 4.0]), permutations=9)
+    assert np.isnan(local['I'][1]) and local['cluster'][1] == LISA_NOT_SIGNIFICANT
+    assert graph.align([3, 0, 9], [30.0, 0.0, 90.0])[[0, 3]].tolist() == [0.0, 30.0]
+
+
+def test_graph_cache_survives_attribute_rewrites(tmp_path, monkeypatch):
+    path = str(tmp_path / "municipalities.geojson")
+    cells = gpd.GeoDataFrame({'codarea': [str(c) for c in range(100, 104)]}, geometry=list(_grid(2, 2, size=1.0)), crs="EPSG:4326")
+    cells.to_file(path, driver="GeoJSON")
+    cache_path = str(tmp_path / "graph.npz")
+    first = ContiguityGraph.build_or_load(cache_path, [path])
+
+    builds = []
+    original = ContiguityGraph.from_layers.__func__
+    monkeypatch.setattr(ContiguityGraph, 'from_layers', classmethod(lambda cls, *a, **k: builds.append(a) or original(cls, *a, **k)))
+    # A análise regrava o arquivo com novas colunas: o grafo persistido continua valendo.
+    cells.assign(lisa_cluster=[0, 1, 2, 3]).to_file(path, driver="GeoJSON")
+    assert ContiguityGraph.build_or_load(cache_path, [path]).version == first.version
+    assert builds == []
+
+    # Geometrias novas, grafo novo.
+    cells.set_geometry(cells.geometry.translate(10, 0)).to_file(path, driver="GeoJSON")
+    assert ContiguityGraph.build_or_load(cache_path, [path]).version != first.version
+    assert len(builds) == 1
@@ -0,0 +1,167 @@
+# use_cases/aggregate_points/index.py
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from shared.file_utils import open_dataset, resolve_dataset_path, save_geojson
+from shared.json_codec import iter_features
+from shared.locality_catalog import get_locality_catalog
+from shared.name_resolver import MunicipalityNameResolver
+from shared.spatial_locator import MunicipalityLocator
+
+try:
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+AGGREGATIONS = ('count', 'sum', 'count_rate', 'sum_rate')
+
+
+def _iter_chunks(input_path: str, columns: list, chunk_size: int):
+    """Yields the input file as DataFrames of at most chunk_size rows, reading only the needed columns."""
+    if input_path.lower().endswith('.parquet'):
+        if not PARQUET_AVAILABLE:
+            raise RuntimeError("The 'pyarrow' package is required to read Parquet files.")
+        parquet_file = pq.ParquetFile(input_path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(input_path, usecols=columns, chunksize=chunk_size)
+
+
+class AggregatePointsUseCase:
+    """
+    Use Case that aggregates a large table of records (points or coded records)
+    per municipality and writes the result as a new property of the municipality
+    GeoJSON, ready to be used as the choropleth column.
+
+    The input is streamed in chunks and every chunk is reduced with np.bincount
+    into per-municipality accumulators, so memory depends on the chunk size and
+    the number of municipalities, never on the size of the input.
+    """
+
+    def execute(self, input_path: str, municipalities_filename: str, output_column: str, aggregation: str = 'count',
+                value_column: str = None, lon_column: str = 'lon', lat_column: str = 'lat', code_column: str = None,
+                name_column: str = None, uf_column: str = None, rate_per: int = 100_000, chunk_size: int = 500_000, output_filename: str = None,
+                locator_cache_path: str = None):
+        """
+        Executes the aggregation.
+
+        :param input_path: The records file (.csv or .parquet).
+        :param municipalities_filename: The municipality GeoJSON (from FetchMunicipalitiesUseCase).
+        :param output_column: The name of the new property (e.g. 'cases_per_100k'), written in
+            lower case, since the map controllers lower-case the column they are given.
+        :param aggregation: 'count', 'sum', 'count_rate' or 'sum_rate' (rates are per `rate_per` inhabitants).
+        :param value_column: The column summed by 'sum' and 'sum_rate'.
+        :param lon_column: The longitude column (used when code_column is not given).
+        :param lat_column: The latitude column (used when code_column is not given).
+        :param code_column: A column with the IBGE municipality code (7 digits, or the 6-digit
+            code without the check digit used by DATASUS). When given, no spatial join is done.
+        :param name_column: A column with the municipality name, resolved to the IBGE code
+            (accent-insensitive, with fuzzy matching). Used when code_column is not given.
+        :param uf_column: A column with the state abbreviation, used to disambiguate names.
+        :param rate_per: The population base of the rates.
+        :param chunk_size: The number of records read at a time.
+        :param output_filename: Where to save the GeoJSON. Defaults to overwriting municipalities_filename.
+        :param locator_cache_path: Where to persist the point-in-polygon locator used by the lon/lat
+            join (see MunicipalityLocator.build_or_load). Defaults to building it in memory.
+        """
+        output_column = output_column.strip().lower()
+        if aggregation not in AGGREGATIONS:
+            print(f"ERROR: Unknown aggregation '{aggregation}'. Use one of: {', '.join(AGGREGATIONS)}.")
+            return
+        needs_value = aggregation in ('sum', 'sum_rate')
+        if needs_value and not value_column:
+            print(f"ERROR: The aggregation '{aggregation}' requires a value column.")
+            return
+
+        municipalities_filename = resolve_dataset_path(municipalities_filename)
+        with open_dataset(municipalities_filename, binary=True) as f:
+            features = list(iter_features(f))
+
+        # Índice ordenado dos códigos: cada registro vira uma posição 0..n-1 via searchsorted.
+        # Feições sem codarea ficam fora do índice: um -1 nelas casaria com os registros sem município.
+        codes = np.array([int(feature['properties'].get('codarea') or -1) for feature in features], dtype=np.int64)
+        indexed = np.flatnonzero(codes >= 0)
+        if len(indexed) == 0:
+            print(f"ERROR: No municipality with a 'codarea' in {municipalities_filename}.")
+            return
+        order = indexed[np.argsort(codes[indexed])]
+        sorted_codes = codes[order]
+        sorted_short_codes = sorted_codes // 10  # Códigos de 6 dígitos (sem o dígito verificador)
+
+        locator, resolver = None, None
+        if name_column and not code_column:
+            catalog = get_locality_catalog()
+            if catalog is None:
+                print("ERROR: The locality catalog is required to resolve municipality names.")
+                return
+            resolver = MunicipalityNameResolver(catalog)
+            columns = [name_column] + ([uf_column] if uf_column else [])
+        elif code_column:
+            columns = [code_column]
+        else:
+            if locator_cache_path:
+                locator = MunicipalityLocator.build_or_load(locator_cache_path, [municipalities_filename])
+            else:
+                locator = MunicipalityLocator.from_layers([municipalities_filename])
+            columns = [lon_column, lat_column]
+        if needs_value:
+            columns.append(value_column)
+
+        counts = np.zeros(len(features), dtype=np.int64)
+        sums = np.zeros(len(features), dtype=np.float64)
+        total_records, unmatched = 0, 0
+
+        print(f"\n--- Starting aggregation: {os.path.basename(input_path)} -> '{output_column}' ({aggregation}) ---")
+        for chunk in _iter_chunks(input_path, columns, chunk_size):
+            if resolver is not None or code_column:
+                if resolver is not None:
+                    record_codes = resolver.resolve_batch(chunk[name_column], chunk[uf_column] if uf_column else None)
+                else:
+                    record_codes = pd.to_numeric(chunk[code_column], errors='coerce').fillna(-1).to_numpy(dtype=np.int64)
+                short = (record_codes >= 0) & (record_codes < 1_000_000)
+                positions = np.where(
+                    short,
+                    np.searchsorted(sorted_short_codes, record_codes),
+                    np.searchsorted(sorted_codes, record_codes)
+                ).clip(0, len(sorted_codes) - 1)
+                matched = np.where(short, sorted_short_codes[positions], sorted_codes[positions]) == record_codes
+            else:
+                lon = pd.to_numeric(chunk[lon_column], errors='coerce').to_numpy(dtype=np.float64)
+                lat = pd.to_numeric(chunk[lat_column], errors='coerce').to_numpy(dtype=np.float64)
+                located = locator.locate(lon, lat, chunk_size=chunk_size)['municipality']
+                positions = np.searchsorted(sorted_codes, located).clip(0, len(sorted_codes) - 1)
+                matched = sorted_codes[positions] == located
+
+            index = order[positions[matched]]
+            counts += np.bincount(index, minlength=len(features))
+            if needs_value:
+                values = pd.to_numeric(chunk[value_column], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+                sums += np.bincount(index, weights=values[matched], minlength=len(features))
+
+            total_records += len(chunk)
+            unmatched += int((~matched).sum())
+            print(f"  -> {total_records:,} records processed ({unmatched:,} without municipality)")
+
+        result = sums if needs_value else counts.astype(np.float64)
+        if aggregation.endswith('_rate'):
+            population = np.array([float(feature['properties'].get('population') or 0) for feature in features])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                result = np.where(population > 0, result / population * rate_per, np.nan)
+
+        result[codes < 0] = np.nan  # Sem codarea, sem agregado
+        for feature, value in zip(features, result):
+            if np.isnan(value):
+                feature['properties'][output_column] = None
+            elif aggregation == 'count':
+                feature['properties'][output_column] = int(value)
+            else:
+                feature['properties'][output_column] = float(value)
+
+        output_filename = output_filename or municipalities_filename
+        save_geojson(features, output_filename)
+        print(f"\n✅ Process finished. Column '{output_column}' saved at: {output_filename}")
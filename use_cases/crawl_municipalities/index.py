@@ -0,0 +1,218 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from shared.ibge_api import fetch_states, fetch_municipalities_by_state, fetch_geojson_mesh, fetch_bulk_mesh, fetch_population, max_concurrency
+from shared.dataset_store import upsert_into_store
+from shared.feature_accumulator import FeatureAccumulator
+from shared.feature_enrichment import enrich_features
+from shared.geometry_validation import validate_features
+from shared.job_queue import JobQueue, DONE, FAILED, LEASED, PENDING
+from shared.locality_catalog import get_locality_catalog
+
+# Endpoints da fila: (tipo de localidade, endpoint).
+BULK_MESH = ('estado', 'malha-municipios')
+MESH = ('municipio', 'malha')
+POPULATION = ('municipio', 'populacao')
+
+IDLE_POLL_SECONDS = 2.0
+PROGRESS_SECONDS = 5.0
+
+
+def _handle_job(queue: JobQueue, job):
+    """Runs one job and returns its result. Raises on failure (the job goes back to the queue)."""
+    endpoint = (job.locality_type, job.endpoint)
+    if endpoint == BULK_MESH:
+        features = fetch_bulk_mesh(job.locality_id)
+        if features is None:
+            raise RuntimeError("bulk mesh request failed")
+        # Municípios ausentes da resposta em lote viram jobs de malha individual.
+        received = {str(f['properties'].get('codarea')) for f in features}
+        missing = [m for m in job.payload['municipalities'] if m not in received]
+        if missing:
+            queue.enqueue((MESH[0], m, MESH[1], None) for m in missing)
+        return features
+    if endpoint == MESH:
+        mesh = fetch_geojson_mesh("municipios", job.locality_id)
+        if not (mesh and 'features' in mesh and mesh['features']):
+            raise RuntimeError("mesh request failed")
+        return mesh['features'][0]
+    if endpoint == POPULATION:
+        population = fetch_population("N6", job.locality_id)
+        if population is None:
+            raise RuntimeError("population request failed")
+        return population
+    raise ValueError(f"Unknown job endpoint: {endpoint}")
+
+
+def _enqueue_mesh_fallbacks(queue: JobQueue) -> int:
+    """
+    Without its bulk mesh, a state is downloaded municipality by municipality:
+    every failed bulk job gets per-municipality mesh jobs. It covers failures
+    recorded by a worker and jobs failed by claim (lease expired on the last
+    attempt); jobs already in the queue are kept, so it is safe to call again.
+    Returns the number of new jobs.
+    """
+    fallbacks = [
+        (MESH[0], m, MESH[1], None)
+        for _, payload, status in queue.jobs(BULK_MESH[1], BULK_MESH[0]) if status == FAILED
+        for m in payload['municipalities']
+    ]
+    return queue.enqueue(fallbacks) if fallbacks else 0
+
+
+def _work_thread(queue_path: str) -> int:
+    """Claims and runs jobs until the queue is drained. Returns the number of jobs done."""
+    done = 0
+    with JobQueue(queue_path) as queue:
+        while True:
+            jobs = queue.claim()
+            if not jobs:
+                if _enqueue_mesh_fallbacks(queue):
+                    continue
+                counts = queue.counts()
+                if counts[PENDING] == 0 and counts[LEASED] == 0:
+                    return done
+                # Jobs com outros workers: espera terminarem (ou o lease expirar, se o worker morreu).
+                time.sleep(IDLE_POLL_SECONDS)
+                continue
+            job = jobs[0]
+            try:
+                result = _handle_job(queue, job)
+            except Exception as e:
+                queue.fail(job, e)
+                if (job.locality_type, job.endpoint) == BULK_MESH and job.attempts >= queue.max_attempts:
+                    _enqueue_mesh_fallbacks(queue)
+                continue
+            if queue.complete(job, result):
+                done += 1
+
+
+def run_worker(queue_path: str, threads: int = None) -> int:
+    """
+    Works on a crawl queue with a pool of threads (the adaptive controller of
+    ibge_api limits the concurrent requests). Any number of these may run at
+    once, in other processes or on other hosts sharing the queue file.
+
+    :return: The number of jobs completed by this worker.
+    """
+    threads = threads or max_concurrency()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return sum(executor.map(_work_thread, [queue_path] * threads))
+
+
+class CrawlMunicipalitiesUseCase:
+    """
+    Use Case that crawls the meshes and populations of the municipalities of
+    many states (all of Brazil by default) through a durable SQLite job queue.
+
+    Every request is a job, and every result is committed as soon as it
+    arrives, so a crawl interrupted at any point resumes where it stopped
+    when executed again with the same queue file. The per-state municipality
+    files are assembled at the end from the stored results.
+    """
+
+    def execute(self, queue_path: str, output_dir: str, states: list = None, processes: int = 1, assemble: bool = True,
+                store_path: str = None, retry_failed: bool = False):
+        """
+        Seeds the queue, runs the workers and assembles the output files.
+
+        :param queue_path: The SQLite file of the queue (reused to resume a crawl).
+        :param output_dir: The folder of the '2-complete-data-municipalities-<uf>.geojson' files.
+        :param states: State abbreviations to crawl (e.g. ['PE', 'SE']). None crawls all of them.
+        :param processes: The number of worker processes on this host.
+        :param assemble: Whether to write the output files at the end.
+        :param store_path: Optional GeoPackage store (see shared.dataset_store) that also receives the municipalities.
+        :param retry_failed: Whether to put the jobs that failed in earlier runs back in the queue.
+        """
+        print("\n--- Starting resumable crawl: MUNICIPALITY DATA ---")
+        if not self.seed(queue_path, states):
+            return
+        if retry_failed:
+            with JobQueue(queue_path) as queue:
+                print(f"{queue.retry_failed()} failed jobs put back in the queue.")
+        self.work(queue_path, processes)
+        if assemble:
+            self.assemble(queue_path, output_dir, states, store_path)
+        print("\n✅ Process finished.")
+
+    def seed(self, queue_path: str, states: list = None) -> bool:
+        """
+        Adds the jobs of the requested states to the queue. Jobs already in the
+        queue are kept as they are, so seeding again never repeats finished work.
+        """
+        catalog = get_locality_catalog()
+        states_df = catalog.states() if catalog is not None else fetch_states()
+        if states_df is None:
+            print("Could not retrieve the list of states. Aborting.")
+            return False
+        if states:
+            states_df = states_df[states_df['abbreviation'].isin([s.upper() for s in states])]
+
+        jobs = []
+        for _, state in states_df.iterrows():
+            if catalog is not None and catalog.has_state(state['abbreviation']):
+                municipalities_df = catalog.municipalities_by_state(state['abbreviation'])
+            else:
+                municipalities_df = fetch_municipalities_by_state(state['abbreviation'])
+            if municipalities_df is None or municipalities_df.empty:
+                print(f"Could not retrieve the list of municipalities for {state['abbreviation']}. Skipping.")
+                continue
+            ids = municipalities_df['id'].astype(str).tolist()
+            jobs.append((BULK_MESH[0], state['id'], BULK_MESH[1], {'abbreviation': state['abbreviation'], 'municipalities': ids}))
+            payload = {'state_id': str(state['id']), 'state_abbreviation': state['abbreviation']}
+            jobs.extend((POPULATION[0], m['id'], POPULATION[1], {**payload, 'name': m['name']}) for _, m in municipalities_df.iterrows())
+
+        with JobQueue(queue_path) as queue:
+            added = queue.enqueue(jobs)
+            counts = queue.counts()
+        print(f"Queue '{os.path.basename(queue_path)}': {added} new jobs, {counts[DONE]} already done, {counts[PENDING]} pending.")
+        return True
+
+    def work(self, queue_path: str, processes: int = 1) -> None:
+        """Runs worker processes until the queue is drained, printing the progress."""
+        with ProcessPoolExecutor(max_workers=max(1, processes)) as executor:
+            futures = [executor.submit(run_worker, queue_path) for _ in range(max(1, processes))]
+            with JobQueue(queue_path) as queue:
+                while not all(f.done() for f in futures):
+                    counts = queue.counts()
+                    total = sum(counts.values())
+                    print(f"  {counts[DONE]}/{total} jobs done, {counts[LEASED]} running, {counts[FAILED]} failed")
+                    wait(futures, timeout=PROGRESS_SECONDS)
+            completed = sum(f.result() for f in futures)
+        print(f"Workers finished: {completed} jobs completed in this run.")
+
+    def assemble(self, queue_path: str, output_dir: str, states: list = None, store_path: str = None) -> None:
+        """Writes one municipality file per state from the results stored in the queue."""
+        wanted = {s.upper() for s in states} if states else None
+        with JobQueue(queue_path) as queue:
+            populations = {locality_id: population for locality_id, _, population in queue.results(POPULATION[1], POPULATION[0])}
+            municipalities = {}
+            for locality_id, payload, _ in queue.jobs(POPULATION[1], POPULATION[0]):
+                state = (payload['state_id'], payload['state_abbreviation'])
+                municipalities.setdefault(state, []).append((locality_id, payload['name']))
+
+            # Uma UF por vez: só as malhas de um estado ficam em memória.
+            for (state_id, abbreviation), state_municipalities in sorted(municipalities.items(), key=lambda item: item[0][1]):
+                if wanted is not None and abbreviation not in wanted:
+                    continue
+                bulk_features = queue.result(BULK_MESH[0], state_id, BULK_MESH[1]) or []
+                state_meshes = {str(f['properties'].get('codarea')): f for f in bulk_features}
+                accumulator = FeatureAccumulator(schema={'population': 'float64'})  # float: NaN marca população ausente
+                missing = 0
+                for municipality_id, name in state_municipalities:
+                    # Malhas individuais (fallback) são lidas do banco uma a uma, só para quem falta na malha do estado.
+                    feature = state_meshes.pop(municipality_id, None) or queue.result(MESH[0], municipality_id, MESH[1])
+                    if feature is None:
+                        missing += 1
+                        continue
+                    accumulator.append(feature, name=name, population=populations.get(municipality_id), state_abbreviation=abbreviation)
+                if not accumulator:
+                    print(f"\nWARNING: No mesh downloaded for {abbreviation}. File not written.")
+                    continue
+
+                print(f"\nAssembling {abbreviation}: {len(accumulator)} municipalities ({missing} without mesh).")
+                validate_features(accumulator)
+                enrich_features(accumulator, population_property='population')
+                accumulator.save(os.path.join(output_dir, f"2-complete-data-municipalities-{abbreviation.lower()}.geojson"))
+                upsert_into_store('municipalities', accumulator, store_path)
@@ -1,7 +1,15 @@
-import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 # Assuming the previous files were saved with the new english names
-from shared.ibge_api import fetch_states, fetch_regions_by_state, fetch_geojson_mesh
+from shared.ibge_api import fetch_states, fetch_regions_by_state, fetch_geojson_mesh, fetch_municipality_region_mapping
+from shared.ibge_api import get_request_metrics, max_concurrency
 from shared.file_utils import save_geojson
+from shared.dataset_store import upsert_into_store
+from shared.feature_accumulator import FeatureAccumulator
+from shared.feature_enrichment import enrich_features
+from shared.geometry_validation import validate_features
+from shared.locality_catalog import get_locality_catalog
+from shared.region_dissolver import dissolve_municipalities, find_municipality_files
 
 class FetchIntermediateRegionsUseCase:
     """
@@ -9,42 +17,100 @@ class FetchIntermediateRegionsUseCase:
     regions of Brazil and saves the result to a GeoJSON file.
     """
 
-    def execute(self, output_filename: str):
+    def execute(self, output_filename: str, mode: str = 'api', municipalities_dir: str = None, workers: int = None, store_path: str = None):
         """
         Executes the use case.
 
         :param output_filename: The name of the output GeoJSON file.
+        :param mode: 'api' downloads each region mesh; 'dissolve' builds the regions from the
+            municipality files already downloaded, with a single mapping request.
+        :param municipalities_dir: The folder with the municipality files (used by 'dissolve').
+        :param workers: The number of processes used by 'dissolve'. None uses every CPU.
+        :param store_path: Optional GeoPackage store (see shared.dataset_store) that also receives the features.
         """
-        states_df = fetch_states()
+        if mode == 'dissolve':
+            self._execute_dissolve(output_filename, municipalities_dir, workers, store_path)
+            return
+
+        catalog = get_locality_catalog()
+        states_df = catalog.states() if catalog is not None else fetch_states()
         if states_df is None:
             print("Could not retrieve the list of states. Aborting.")
             return
 
-        features = []
+        # Cada feição vira WKB + colunas assim que chega: a coleta não acumula dicts GeoJSON.
+        features = FeatureAccumulator()
         print("\n--- Starting data collection: BRAZIL'S INTERMEDIATE REGIONS ---")
-        for _, state in states_df.iterrows():
-            print(f"Processing state: {state['abbreviation']}")
-            # The string here was adjusted for the correct endpoint
-            regions_df = fetch_regions_by_state(state['id'], 'regioes-intermediarias')
-            if regions_df is None: continue
-
-            for _, region in regions_df.iterrows():
-                region_id, region_name = region['id'], region['name']
+        # As requisições rodam em paralelo; o controlador adaptativo do ibge_api decide quantas de cada vez.
+        with ThreadPoolExecutor(max_workers=max_concurrency()) as executor:
+            jobs = deque()
+            for _, state in states_df.iterrows():
+                if catalog is not None:
+                    regions_df = catalog.regions_by_state(state['id'], 'regioes-intermediarias')
+                else:
+                    regions_df = fetch_regions_by_state(state['id'], 'regioes-intermediarias')
+                if regions_df is None: continue
+                for _, region in regions_df.iterrows():
+                    future = executor.submit(self._fetch_region, region['id'], region['name'], state['abbreviation'])
+                    jobs.append((state['abbreviation'], region['name'], future))
+
+            current_state = None
+            # Consome as tarefas da fila: cada resposta é liberada assim que vira WKB + colunas.
+            while jobs:
+                abbreviation, region_name, future = jobs.popleft()
+                if abbreviation != current_state:
+                    print(f"Processing state: {abbreviation}")
+                    current_state = abbreviation
                 print(f"  Fetching mesh for {region_name}... ", end="", flush=True)
-                # And here as well
-                mesh = fetch_geojson_mesh('regioes-intermediarias', region_id)
-
-                if mesh and 'features' in mesh and mesh['features']:
-                    feature = mesh['features'][0]
-                    # The properties were also adjusted
-                    feature['properties']['intermediate_region_id'] = region_id
-                    feature['properties']['intermediate_region_name'] = region_name
-                    feature['properties']['state_abbreviation'] = state['abbreviation']
+                feature = future.result()
+                if feature is not None:
                     features.append(feature)
                     print("OK")
                 else:
                     print("FAILED to get mesh")
-                time.sleep(0.1)
-        
+
+        metrics = get_request_metrics()
+        print(f"\nRequests: {metrics['requests']} ({metrics['errors']} errors), concurrency limit: {metrics['limit']}")
+
+        validate_features(features)
+        enrich_features(features)
+        features.save(output_filename)
+        upsert_into_store('intermediate_regions', features, store_path)
+        print(f"\n✅ Process finished. File saved at: {output_filename}")
+
+    def _fetch_region(self, region_id: str, region_name: str, state_abbreviation: str):
+        """Fetches the mesh of one region. Returns the feature or None."""
+        mesh = fetch_geojson_mesh('regioes-intermediarias', region_id)
+        if not (mesh and 'features' in mesh and mesh['features']):
+            return None
+        feature = mesh['features'][0]
+        feature['properties']['intermediate_region_id'] = region_id
+        feature['properties']['intermediate_region_name'] = region_name
+        feature['properties']['state_abbreviation'] = state_abbreviation
+        return feature
+
+    def _execute_dissolve(self, output_filename: str, municipalities_dir: str, workers: int, store_path: str = None):
+        """Builds the intermediate regions by dissolving the downloaded municipalities."""
+        municipality_paths = find_municipality_files(municipalities_dir)
+        if not municipality_paths:
+            print("No municipality files found. Download the municipalities first. Aborting.")
+            return
+
+        catalog = get_locality_catalog()
+        region_mapping = catalog.to_mapping() if catalog is not None else fetch_municipality_region_mapping()
+        if region_mapping is None:
+            print("Could not retrieve the municipality-region mapping. Aborting.")
+            return
+
+        missing_states = sorted(set(region_mapping['state_abbreviation'].dropna()) - set(municipality_paths))
+        if missing_states:
+            print(f"WARNING: No municipality file for {', '.join(missing_states)}. Their regions will be missing.")
+
+        print("\n--- Starting local dissolve: BRAZIL'S INTERMEDIATE REGIONS ---")
+        features = dissolve_municipalities(municipality_paths, region_mapping, levels=('intermediate',), workers=workers)['intermediate']
+
+        validate_features(features)
+        enrich_features(features)
         save_geojson(features, output_filename)
-        print(f"\n✅ Process finished. File saved at: {output_filename}")
\ No newline at end of file
+        upsert_into_store('intermediate_regions', features, store_path)
+        print(f"\n✅ Process finished. File saved at: {output_filename}")
@@ -1,7 +1,12 @@
-import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 # Assuming the previous files were saved with the new english names
-from shared.ibge_api import fetch_municipalities_by_state, fetch_geojson_mesh, fetch_population
-from shared.file_utils import save_geojson
+from shared.ibge_api import fetch_municipalities_by_state, fetch_geojson_mesh, fetch_bulk_mesh, fetch_population, get_request_metrics, max_concurrency
+from shared.dataset_store import upsert_into_store
+from shared.feature_accumulator import FeatureAccumulator
+from shared.feature_enrichment import enrich_features
+from shared.geometry_validation import validate_features
+from shared.locality_catalog import get_locality_catalog
 
 class FetchMunicipalitiesUseCase:
     """
@@ -9,42 +14,77 @@ class FetchMunicipalitiesUseCase:
     for the municipalities of a given state.
     """
 
-    def execute(self, state_abbreviation: str, output_filename: str):
+    def execute(self, state_abbreviation: str, output_filename: str, store_path: str = None):
         """
         Executes the data fetching for the municipalities of a state.
 
         :param state_abbreviation: The state's abbreviation to be processed (e.g., 'PE').
         :param output_filename: The name of the output GeoJSON file.
+        :param store_path: Optional GeoPackage store (see shared.dataset_store) that also receives the features.
         """
-        municipalities_df = fetch_municipalities_by_state(state_abbreviation)
-        if municipalities_df is None:
+        catalog = get_locality_catalog()
+        if catalog is not None and catalog.has_state(state_abbreviation):
+            municipalities_df = catalog.municipalities_by_state(state_abbreviation)
+        else:
+            municipalities_df = fetch_municipalities_by_state(state_abbreviation)
+        if municipalities_df is None or municipalities_df.empty:
             print(f"Could not retrieve the list of municipalities for {state_abbreviation}.")
             return
 
-        features = []
+        # Cada feição vira WKB + colunas assim que chega: a coleta não acumula dicts GeoJSON.
+        features = FeatureAccumulator(schema={'population': 'float64'})  # float: NaN marca população ausente
         print(f"\n--- Starting data collection: MUNICIPALITY DATA FOR {state_abbreviation.upper()} ---")
-        for _, municipality in municipalities_df.iterrows():
-            municipality_id, name = municipality['id'], municipality['name']
-            print(f"  Processing {name} ({municipality_id})... ", end="", flush=True)
-            
+        # Malhas de todos os municípios do estado numa única resposta (os dois primeiros dígitos são o código da UF).
+        state_id = str(municipalities_df['id'].iloc[0])[:2]
+        bulk_meshes = {str(f['properties'].get('codarea')): f for f in fetch_bulk_mesh(state_id) or []}
+        print(f"  {len(bulk_meshes)} municipality meshes received in a single request.")
+
+        # As requisições rodam em paralelo; o controlador adaptativo do ibge_api decide quantas de cada vez.
+        with ThreadPoolExecutor(max_workers=max_concurrency()) as executor:
+            futures = deque([
+                (municipality['id'], municipality['name'], executor.submit(self._fetch_municipality, municipality['id'], municipality['name'], bulk_meshes.get(municipality['id'])))
+                for _, municipality in municipalities_df.iterrows()
+            ])
+            bulk_meshes.clear()  # Cada tarefa já guarda a sua malha; o dicionário não precisa segurá-las.
+            # Consome as tarefas da fila: cada resposta é liberada assim que vira WKB + colunas.
+            while futures:
+                municipality_id, name, future = futures.popleft()
+                print(f"  Processing {name} ({municipality_id})... ", end="", flush=True)
+                feature = future.result()
+                if feature is not None:
+                    # A UF acompanha cada município: no banco, é o índice das consultas por estado.
+                    features.append(feature, state_abbreviation=state_abbreviation.upper())
+                    print("OK")
+                else:
+                    print("FAILED to get mesh")
+
+        metrics = get_request_metrics()
+        print(f"\nRequests: {metrics['requests']} ({metrics['errors']} errors), concurrency limit: {metrics['limit']}")
+
+        validate_features(features)
+        enrich_features(features, population_property='population')
+        features.save(output_filename)
+        upsert_into_store('municipalities', features, store_path)
+        print(f"\n✅ Process finished. File saved at: {output_filename}")
+
+    def _fetch_municipality(self, municipality_id: str, name: str, bulk_feature: dict = None):
+        """
+        Fetches the population (and the mesh, if it was not in the bulk response)
+        of one municipality. Returns the feature or None.
+        """
+        if bulk_feature is not None:
+            feature = bulk_feature
+        else:
             mesh = fetch_geojson_mesh("municipios", municipality_id)
-            population_value = fetch_population("N6", municipality_id)
-
-            if mesh and 'features' in mesh and mesh['features']:
-                feature = mesh['features'][0]
-                feature["properties"]["name"] = name
-                
-                # Same safe conversion logic for the population
-                try:
-                    feature["properties"]["population"] = int(population_value)
-                except (ValueError, TypeError):
-                    feature["properties"]["population"] = 0
-                    
-                features.append(feature)
-                print("OK")
-            else:
-                print("FAILED to get mesh")
-            time.sleep(0.1)
-        
-        save_geojson(features, output_filename)
-        print(f"\n✅ Process finished. File saved at: {output_filename}")
\ No newline at end of file
+            if not (mesh and 'features' in mesh and mesh['features']):
+                return None
+            feature = mesh['features'][0]
+        population_value = fetch_population("N6", municipality_id)
+        feature["properties"]["name"] = name
+
+        # Same safe conversion logic for the population
+        try:
+            feature["properties"]["population"] = int(population_value)
+        except (ValueError, TypeError):
+            feature["properties"]["population"] = None
+        return feature
@@ -1,9 +1,14 @@
 # use_cases/fetch_states/index.py
 
-import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 # Assuming the previous files were saved with the new english names
-from shared.ibge_api import fetch_states, fetch_geojson_mesh, fetch_population
-from shared.file_utils import save_geojson
+from shared.ibge_api import fetch_states, fetch_geojson_mesh, fetch_population, get_request_metrics, max_concurrency
+from shared.dataset_store import upsert_into_store
+from shared.feature_accumulator import FeatureAccumulator
+from shared.feature_enrichment import enrich_features
+from shared.geometry_validation import validate_features
+from shared.locality_catalog import get_locality_catalog
 
 class FetchStatesUseCase:
     """
@@ -11,45 +16,65 @@ class FetchStatesUseCase:
     for all states of Brazil and saves the result to a GeoJSON file.
     """
     
-    def execute(self, output_filename: str):
+    def execute(self, output_filename: str, store_path: str = None):
         """
         Executes the use case.
 
         :param output_filename: The name of the output GeoJSON file.
+        :param store_path: Optional GeoPackage store (see shared.dataset_store) that also receives the features.
         """
-        states_df = fetch_states()
+        catalog = get_locality_catalog()
+        states_df = catalog.states() if catalog is not None else fetch_states()
         if states_df is None:
             print("Could not retrieve the list of states. Aborting.")
             return
 
-        features = []
+        # Cada feição vira WKB + colunas assim que chega: a coleta não acumula dicts GeoJSON.
+        features = FeatureAccumulator(schema={'population_2021': 'float64'})  # float: NaN marca população ausente
         print("\n--- Starting data collection: COMPLETE DATA BY STATE ---")
-        for _, state in states_df.iterrows():
-            state_id, abbreviation, name = state['id'], state['abbreviation'], state['name']
-            print(f"Processing {name} ({abbreviation})... ", end="", flush=True)
-            
-            mesh = fetch_geojson_mesh("estados", state_id)
-            population_value = fetch_population("N3", state_id)
-
-            if mesh and 'features' in mesh and mesh['features']:
-                feature = mesh['features'][0]
-                feature['properties']['abbreviation'] = abbreviation
-                feature['properties']['name'] = name
-                
-                # --- FIXED CODE ---
-                # Safe conversion logic for the population
-                try:
-                    # Tries to convert the value to an integer. Works for ints (e.g., 5) and strings (e.g., "5").
-                    feature['properties']['population_2021'] = int(population_value)
-                except (ValueError, TypeError):
-                    # If the conversion fails (e.g., value is None or an empty string), use 0.
-                    feature['properties']['population_2021'] = 0
-                
-                features.append(feature)
-                print("OK")
-            else:
-                print("FAILED to get mesh")
-            time.sleep(0.1)
-
-        save_geojson(features, output_filename)
-        print(f"\n✅ Process finished. File saved at: {output_filename}")
\ No newline at end of file
+        # As requisições rodam em paralelo; o controlador adaptativo do ibge_api decide quantas de cada vez.
+        with ThreadPoolExecutor(max_workers=max_concurrency()) as executor:
+            futures = deque([
+                (state['abbreviation'], state['name'], executor.submit(self._fetch_state, state['id'], state['abbreviation'], state['name']))
+                for _, state in states_df.iterrows()
+            ])
+            # Consome as tarefas da fila: cada resposta é liberada assim que vira WKB + colunas.
+            while futures:
+                abbreviation, name, future = futures.popleft()
+                print(f"Processing {name} ({abbreviation})... ", end="", flush=True)
+                feature = future.result()
+                if feature is not None:
+                    features.append(feature)
+                    print("OK")
+                else:
+                    print("FAILED to get mesh")
+
+        metrics = get_request_metrics()
+        print(f"\nRequests: {metrics['requests']} ({metrics['errors']} errors), concurrency limit: {metrics['limit']}")
+
+        validate_features(features)
+        enrich_features(features, population_property='population_2021')
+        features.save(output_filename)
+        upsert_into_store('states', features, store_path)
+        print(f"\n✅ Process finished. File saved at: {output_filename}")
+
+    def _fetch_state(self, state_id: str, abbreviation: str, name: str):
+        """Fetches the mesh and population of one state. Returns the feature or None."""
+        mesh = fetch_geojson_mesh("estados", state_id)
+        population_value = fetch_population("N3", state_id)
+
+        if not (mesh and 'features' in mesh and mesh['features']):
+            return None
+        feature = mesh['features'][0]
+        feature['properties']['abbreviation'] = abbreviation
+        feature['properties']['name'] = name
+
+        # --- FIXED CODE ---
+        # Safe conversion logic for the population
+        try:
+            # Tries to convert the value to an integer. Works for ints (e.g., 5) and strings (e.g., "5").
+            feature['properties']['population_2021'] = int(population_value)
+        except (ValueError, TypeError):
+            # If the conversion fails (e.g., value is None or an empty string), keep it missing (not 0).
+            feature['properties']['population_2021'] = None
+        return feature
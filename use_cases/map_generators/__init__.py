@@ -16,6 +16,10 @@ from .generate_state_regional_map import execute as gerar_mapa_regional_estado
 # --- ADIÇÃO NOVA ---
 # Importa e expõe o nosso novo arquiteto flexível
 from .generate_clipped_regions_map import execute as gerar_mapa_regioes_recortadas
+from .generate_tiles import execute as gerar_tiles
+from .generate_national_municipalities_map import execute as gerar_mapa_nacional_municipios
+from .generate_dot_density_map import execute as gerar_mapa_densidade_pontos
+from .generate_grid_map import execute as gerar_mapa_grade
 
 __all__ = [
     'gerar_mapa_destaque',
@@ -24,4 +28,8 @@ __all__ = [
     'gerar_mapa_municipios_coropleth',
     'gerar_mapa_regional_estado',
     'gerar_mapa_regioes_recortadas', 
+    'gerar_tiles',
+    'gerar_mapa_nacional_municipios',
+    'gerar_mapa_densidade_pontos',
+    'gerar_mapa_grade',
 ]
\ No newline at end of file
@@ -15,10 +15,15 @@ import matplotlib.pyplot as plt
 from shared.map_components import (
     create_base_map,
     plot_states_layer,
-    plot_polygons_layer
+    plot_polygons_layer,
+    draft_tolerance,
+    simplify_layer,
+    save_map
 )
+from shared.layer_loader import load_layer
+from shared.geometry_validation import ensure_valid
 
-def execute(uf: str, caminhos: dict, region_type: str) -> None:
+def execute(uf: str, caminhos: dict, region_type: str, draft: bool = False) -> None:
     """
     Generates and saves a map showing a specific type of regional division
     for a given Brazilian state.
@@ -27,6 +32,8 @@ def execute(uf: str, caminhos: dict, region_type: str) -> None:
         uf (str): The abbreviation of the state (e.g., "PE").
         caminhos (dict): A dictionary containing all necessary file paths.
         region_type (str): The type of region to plot ('imediatas' or 'intermediarias').
+        draft (bool, optional): Fast preview (lower DPI, simplified geometry, cheaper
+            encoding) with the same layout as the final render. Defaults to False.
     """
     
     # --- STAGE 0: PARAMETER VALIDATION ---
@@ -46,14 +53,18 @@ def execute(uf: str, caminhos: dict, region_type: str) -> None:
     # --- STAGE 1: DATA PREPARATION ---
     print("  -> Preparando dados geográficos...")
     try:
-        gdf_estados = gpd.read_file(caminhos['estados']).to_crs(projecao)
+        gdf_estados = load_layer(caminhos['estados'], projecao, columns=['abbreviation'])
         mascara_estado = gdf_estados[gdf_estados['abbreviation'] == uf.upper()].copy()
         if mascara_estado.empty: 
             print(f"  -> ERRO: Estado '{uf}' não encontrado. Abortando."); return
-        mascara_estado['geometry'] = mascara_estado.geometry.buffer(0)
+        mascara_estado = ensure_valid(mascara_estado, caminhos['estados'])
+        tolerancia = draft_tolerance(mascara_estado.total_bounds) if draft else None
+        gdf_estados = simplify_layer(gdf_estados, tolerancia)
 
-        gdf_regioes = gpd.read_file(caminho_regiao).to_crs(projecao)
-        gdf_regioes['geometry'] = gdf_regioes.geometry.buffer(0)
+        # Lê apenas as regiões que tocam o estado, sem colunas de atributos.
+        gdf_regioes = load_layer(caminho_regiao, projecao, mask=mascara_estado.geometry.union_all(), columns=[])
+        gdf_regioes = ensure_valid(gdf_regioes, caminho_regiao)
+        gdf_regioes = simplify_layer(gdf_regioes, tolerancia)
         
         regioes_recortadas = gpd.clip(gdf_regioes, mascara_estado)
         if regioes_recortadas.empty:
@@ -71,7 +82,11 @@ def execute(uf: str, caminhos: dict, region_type: str) -> None:
     Z_REGIOES_RECORTADAS = 3
     Z_BORDA_FINAL = 4
 
-    fig, ax = create_base_map(caminhos['sulamerica'])
+    minx, miny, maxx, maxy = mascara_estado.total_bounds
+    x_buffer, y_buffer = (maxx - minx) * 0.10, (maxy - miny) * 0.10
+    extent = (minx - x_buffer, miny - y_buffer, maxx + x_buffer, maxy + y_buffer)
+
+    fig, ax = create_base_map(caminhos['sulamerica'], simplify_tolerance=tolerancia, bbox=extent)
     plot_states_layer(ax, gdf_estados, zorder=Z_BASE_ESTADOS)
     
     if not regioes_recortadas.empty:
@@ -82,10 +97,8 @@ def execute(uf: str, caminhos: dict, region_type: str) -> None:
     # --- STAGE 3: FINALIZATION & ZOOM ---
     print("  -> Finalizando o mapa...")
     
-    minx, miny, maxx, maxy = mascara_estado.total_bounds
-    x_buffer, y_buffer = (maxx - minx) * 0.10, (maxy - miny) * 0.10
-    ax.set_xlim(minx - x_buffer, maxx + x_buffer)
-    ax.set_ylim(miny - y_buffer, maxy + y_buffer)
+    ax.set_xlim(extent[0], extent[2])
+    ax.set_ylim(extent[1], extent[3])
 
     ax.set_title(f"Regiões {region_type.capitalize()} de {uf}", fontsize=16, color='black')
     fig.patch.set_facecolor('white')
@@ -95,6 +108,6 @@ def execute(uf: str, caminhos: dict, region_type: str) -> None:
     # e usa o dicionário 'caminhos' como os outros controladores.
     caminho_saida = caminhos['saida']
     
-    plt.savefig(caminho_saida, dpi=300, bbox_inches='tight', pad_inches=0.05)
+    save_map(fig, caminho_saida, draft=draft, pad_inches=0.05)
     print(f"--- Tarefa Concluída! Mapa salvo como '{os.path.basename(caminho_saida)}' ---")
     plt.close(fig)
\ No newline at end of file
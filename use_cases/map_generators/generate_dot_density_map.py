@@ -0,0 +1,125 @@
+# use_cases/map_generators/generate_dot_density_map.py
+
+"""
+Use case orchestrator for generating a dot-density map of a state's
+population (one dot per N inhabitants).
+
+This script is responsible for:
+1. Preparing geographic data (loading states and municipalities, clipping).
+2. Sampling the dots in a vectorized way from a triangulation of each municipality.
+3. Drawing all dots as a single scatter artist over the base layers.
+4. Finalizing and saving the map artifact.
+"""
+
+import os
+import geopandas as gpd
+import matplotlib.pyplot as plt
+
+from shared.map_components import (
+    create_base_map,
+    plot_states_layer,
+    plot_polygons_layer,
+    draft_tolerance,
+    simplify_layer,
+    save_map
+)
+from shared.map_components.dots import dot_counts, sample_points_in_polygons, plot_dot_layer
+from shared.layer_loader import load_layer
+from shared.geometry_validation import ensure_valid
+
+def execute(uf: str, caminhos: dict, pessoas_por_ponto: int = 100, coluna: str = 'population',
+            semente: int = 42, tamanho_ponto: float = 0.3, draft: bool = False) -> None:
+    """
+    Generates and saves a dot-density map of a state's municipalities.
+
+    Args:
+        uf (str): The abbreviation of the state (e.g., "SP").
+        caminhos (dict): A dictionary containing all necessary file paths.
+        pessoas_por_ponto (int, optional): How many units of `coluna` each dot
+            represents. Defaults to 100.
+        coluna (str, optional): The municipality count column. Defaults to 'population'.
+        semente (int, optional): The random seed; the same seed always draws the
+            same dots. Defaults to 42.
+        tamanho_ponto (float, optional): The dot area in points². Defaults to 0.3.
+        draft (bool, optional): Fast preview (lower DPI, simplified geometry, cheaper
+            encoding) with the same layout as the final render. Defaults to False.
+    """
+    print(f"\n--- Use Case: GENERATING DOT-DENSITY MAP FOR {uf} ---")
+    if pessoas_por_ponto <= 0:
+        print("  -> ERROR: The number of people per dot must be positive.")
+        return
+
+    projecao: str = "epsg:3857"
+
+    # --- STAGE 1: DATA PREPARATION ---
+    print("  -> Preparing geographic data...")
+    try:
+        gdf_estados = load_layer(caminhos['estados'], projecao, columns=['abbreviation'])
+        mascara_estado = gdf_estados[gdf_estados['abbreviation'] == uf.upper()].copy()
+        if mascara_estado.empty:
+            print(f"  -> ERROR: State '{uf}' not found. Aborting.")
+            return
+        mascara_estado = ensure_valid(mascara_estado, caminhos['estados'])
+        tolerancia = draft_tolerance(mascara_estado.total_bounds) if draft else None
+        gdf_estados = simplify_layer(gdf_estados, tolerancia)
+    except Exception as e:
+        print(f"  -> ERROR: Failed to load states file. Error: {e}")
+        return
+
+    # The extent: the state's bounds plus a 10% margin.
+    minx, miny, maxx, maxy = mascara_estado.total_bounds
+    x_buffer = (maxx - minx) * 0.10
+    y_buffer = (maxy - miny) * 0.10
+    extent = (minx - x_buffer, miny - y_buffer, maxx + x_buffer, maxy + y_buffer)
+
+    print(f"  -> Loading and clipping municipalities for {uf}...")
+    try:
+        gdf_municipios = load_layer(caminhos['municipios'], projecao, mask=mascara_estado.geometry.union_all(), columns=[coluna])
+        gdf_municipios = ensure_valid(gdf_municipios, caminhos['municipios'])
+        if coluna not in gdf_municipios.columns:
+            print(f"  -> ERROR: Column '{coluna}' not found in the municipality file.")
+            return
+        # Os pontos são sorteados na geometria completa; a simplificação vale apenas para o desenho.
+        municipios_do_estado = gpd.clip(gdf_municipios, mascara_estado)
+        if municipios_do_estado.empty:
+            print("  -> WARNING: No municipalities found after clipping.")
+            return
+    except Exception as e:
+        print(f"  -> ERROR: Failed to load or process municipality file. Error: {e}")
+        return
+
+    # --- STAGE 2: DOT SAMPLING ---
+    contagens = dot_counts(municipios_do_estado[coluna].to_numpy(), pessoas_por_ponto, seed=semente)
+    pontos, _ = sample_points_in_polygons(municipios_do_estado.geometry.values, contagens, seed=semente)
+    print(f"  -> {len(pontos):,} dots sampled (1 dot = {pessoas_por_ponto:,} {coluna}).")
+
+    # --- STAGE 3: MAP ORCHESTRATION ---
+    print("\n  -> Orchestrating map layer plotting with manual z-order...")
+    Z_BASE_ESTADOS = 2
+    Z_MUNICIPIOS = 3
+    Z_PONTOS = 4
+
+    fig, ax = create_base_map(caminhos['sulamerica'], simplify_tolerance=tolerancia, bbox=extent)
+    plot_states_layer(ax, gdf_estados, zorder=Z_BASE_ESTADOS)
+    plot_polygons_layer(
+        ax,
+        simplify_layer(municipios_do_estado, tolerancia),
+        color='#f5f5f5',
+        edgecolor='#d3d3d3',
+        linewidth=0.3,
+        zorder=Z_MUNICIPIOS
+    )
+    plot_dot_layer(ax, pontos, size=tamanho_ponto, zorder=Z_PONTOS)
+
+    # --- STAGE 4: FINALIZATION ---
+    print("  -> Finalizing map (zoom, title, and saving)...")
+    ax.set_xlim(extent[0], extent[2])
+    ax.set_ylim(extent[1], extent[3])
+    ax.set_title(f"Densidade de '{coluna.capitalize()}' em {uf}", fontsize=16, color='black')
+    ax.text(0.99, 0.01, f"1 ponto = {pessoas_por_ponto:,} {coluna}".replace(',', '.'), transform=ax.transAxes,
+            ha='right', va='bottom', fontsize=9, bbox={'facecolor': 'white', 'alpha': 0.8, 'edgecolor': 'none'})
+    fig.patch.set_facecolor('white')
+
+    save_map(fig, caminhos['saida'], draft=draft, pad_inches=0.05)
+    print(f"--- Task Complete! Map saved as '{os.path.basename(caminhos['saida'])}' ---")
+    plt.close(fig)
@@ -0,0 +1,115 @@
+# use_cases/map_generators/generate_grid_map.py
+
+"""
+Use case orchestrator for generating an equal-area grid map (hexagons or
+squares) of a municipality variable for a state.
+
+Municipality sizes vary by orders of magnitude, so a municipality choropleth
+is dominated by the largest polygons. Here the values are apportioned, by
+shared area, into equal-area cells. This script is responsible for:
+1. Building (or loading from cache) the state's grid and its sparse overlap
+   with the municipalities.
+2. Apportioning the chosen column into the cells (a sparse matrix-vector product).
+3. Plotting the cells with the shared choropleth component.
+4. Finalizing and saving the map artifact.
+"""
+
+import os
+import matplotlib.pyplot as plt
+import pandas as pd
+
+from shared.map_components import (
+    create_base_map,
+    plot_states_layer,
+    plot_choropleth_layer,
+    draft_tolerance,
+    simplify_layer,
+    save_map
+)
+from shared.grid_binning import GridBinning, GRID_KINDS
+from shared.layer_loader import load_layer
+
+def execute(uf: str, coluna: str, caminhos: dict, formato: str = 'hex', tamanho_km: float = 10.0,
+            extensiva: bool = True, draft: bool = False) -> None:
+    """
+    Generates and saves a hexagonal or square grid map of a municipality column.
+
+    Args:
+        uf (str): The abbreviation of the state (e.g., "SP").
+        coluna (str): The municipality data column to map.
+        caminhos (dict): A dictionary containing all necessary file paths; an optional
+            'grade' entry is the .npz cache of the grid.
+        formato (str, optional): 'hex' or 'square'. Defaults to 'hex'.
+        tamanho_km (float, optional): The side of a square with the area of one cell,
+            in km (hex and square cells of the same size have the same area). Defaults to 10.0.
+        extensiva (bool, optional): True for counts (e.g. population), mapped as a
+            density per km²; False for rates and averages, mapped as the area-weighted
+            mean of the municipalities in each cell. Defaults to True.
+        draft (bool, optional): Fast preview (lower DPI, simplified geometry, cheaper
+            encoding) with the same layout as the final render. Defaults to False.
+    """
+    print(f"\n--- Use Case: GENERATING {formato.upper()} GRID MAP FOR {uf} ---")
+    if formato not in GRID_KINDS:
+        print(f"  -> ERROR: Invalid grid format '{formato}'. Use 'hex' or 'square'.")
+        return
+
+    projecao: str = "epsg:3857"
+
+    # --- STAGE 1: DATA PREPARATION ---
+    print("  -> Preparing geographic data...")
+    gdf_estados = load_layer(caminhos['estados'], projecao, columns=['abbreviation'])
+    mascara_estado = gdf_estados[gdf_estados['abbreviation'] == uf.upper()]
+    if mascara_estado.empty:
+        print(f"  -> ERROR: State '{uf}' not found. Aborting.")
+        return
+    tolerancia = draft_tolerance(mascara_estado.total_bounds) if draft else None
+    gdf_estados = simplify_layer(gdf_estados, tolerancia)
+
+    # A grade e a sobreposição com os municípios são calculadas uma vez por (estado, formato, tamanho).
+    try:
+        grade = GridBinning.build_or_load(caminhos.get('grade'), uf, caminhos['estados'], caminhos['municipios'], formato, tamanho_km)
+        municipios = load_layer(caminhos['municipios'], columns=['codarea', coluna])
+    except Exception as e:
+        print(f"  -> ERROR: Failed to build the grid. Error: {e}")
+        return
+    if coluna not in municipios.columns:
+        print(f"  -> ERROR: Column '{coluna}' not found in the municipality file.")
+        return
+    print(f"  -> {len(grade)} cells of {tamanho_km:g} km over {len(grade.source_codes)} municipalities.")
+
+    # --- STAGE 2: APPORTIONMENT ---
+    municipios = municipios[municipios['codarea'].notna()]
+    # Valores ausentes ficam NaN: não entram nas médias (intensivas) nem nos totais (extensivas).
+    valores = grade.align(municipios['codarea'].astype('int64'), pd.to_numeric(municipios[coluna], errors='coerce'))
+    if extensiva:
+        coluna_grade = f"{coluna}_per_km2"
+        dados = grade.apportion(valores, extensive=True) / grade.cell_areas_km2()
+    else:
+        coluna_grade = coluna
+        dados = grade.apportion(valores, extensive=False)
+    gdf_grade = grade.to_geodataframe({coluna_grade: dados}, crs=projecao)
+
+    # --- STAGE 3: MAP ORCHESTRATION ---
+    print("\n  -> Orchestrating map layer plotting with manual z-order...")
+    Z_BASE_ESTADOS = 2
+    Z_GRADE = 3
+
+    minx, miny, maxx, maxy = mascara_estado.total_bounds
+    x_buffer = (maxx - minx) * 0.10
+    y_buffer = (maxy - miny) * 0.10
+    extent = (minx - x_buffer, miny - y_buffer, maxx + x_buffer, maxy + y_buffer)
+
+    fig, ax = create_base_map(caminhos['sulamerica'], simplify_tolerance=tolerancia, bbox=extent)
+    plot_states_layer(ax, gdf_estados, zorder=Z_BASE_ESTADOS)
+    plot_choropleth_layer(ax, gdf_grade, data_column=coluna_grade, linewidth=0.1, edgecolor='white', zorder=Z_GRADE)
+
+    # --- STAGE 4: FINALIZATION ---
+    print("  -> Finalizing map (zoom, title, and saving)...")
+    ax.set_xlim(extent[0], extent[2])
+    ax.set_ylim(extent[1], extent[3])
+    ax.set_title(f"Grade de '{coluna_grade.capitalize()}' para {uf} ({tamanho_km:g} km)", fontsize=16, color='black')
+    fig.patch.set_facecolor('white')
+
+    save_map(fig, caminhos['saida'], draft=draft, pad_inches=0.05)
+    print(f"--- Task Complete! Map saved as '{os.path.basename(caminhos['saida'])}' ---")
+    plt.close(fig)
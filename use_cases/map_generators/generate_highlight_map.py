@@ -11,24 +11,29 @@ This script is responsible for:
 """
 
 import os
-import geopandas as gpd
 import matplotlib.pyplot as plt
 
 # 1. Imports são limpos e vêm da nossa biblioteca de componentes centralizada.
 from shared.map_components import (
     create_base_map,
     plot_states_layer,
-    plot_highlight_layer
+    plot_highlight_layer,
+    draft_tolerance,
+    simplify_layer,
+    save_map
 )
+from shared.layer_loader import load_layer
 
 
-def execute(uf: str, caminhos: dict) -> None:
+def execute(uf: str, caminhos: dict, draft: bool = False) -> None:
     """
     Generates and saves a map highlighting a specific Brazilian state.
 
     Args:
         uf (str): The abbreviation of the state to highlight (e.g., "SP").
         caminhos (dict): A dictionary containing all necessary file paths.
+        draft (bool, optional): Fast preview (lower DPI, simplified geometry, cheaper
+            encoding) with the same layout as the final render. Defaults to False.
     """
     print(f"\n--- Use Case: GENERATING HIGHLIGHT MAP FOR {uf} ---")
     
@@ -37,7 +42,9 @@ def execute(uf: str, caminhos: dict) -> None:
     # --- ETAPA 1: PREPARAÇÃO DOS DADOS ---
     # O "arquiteto" agora é responsável por carregar os dados que serão usados.
     print("  -> Preparing geographic data...")
-    gdf_estados = gpd.read_file(caminhos['estados']).to_crs(projecao)
+    gdf_estados = load_layer(caminhos['estados'], projecao, columns=['abbreviation'])
+    tolerancia = draft_tolerance(gdf_estados.total_bounds) if draft else None
+    gdf_estados = simplify_layer(gdf_estados, tolerancia)
 
     # --- ETAPA 2: ORQUESTRAÇÃO DO DESENHO DO MAPA ---
     print("  -> Orchestrating map layer plotting with manual z-order...")
@@ -48,7 +55,7 @@ def execute(uf: str, caminhos: dict) -> None:
 
     # 2. A "caixa-preta" foi substituída por uma sequência explícita de chamadas.
     # Cada passo da construção do mapa agora é claro e legível.
-    fig, ax = create_base_map(caminhos['sulamerica'])
+    fig, ax = create_base_map(caminhos['sulamerica'], simplify_tolerance=tolerancia)
     plot_states_layer(ax, gdf_estados, zorder=Z_BASE_ESTADOS)
     plot_highlight_layer(ax, gdf_estados, uf, zorder=Z_DESTAQUE_VERMELHO)
     
@@ -59,7 +66,7 @@ def execute(uf: str, caminhos: dict) -> None:
     ax.set_title(f'Destaque para o estado de {uf}', fontsize=16, color='white')
 
     # Salvando o resultado final
-    plt.savefig(caminhos['saida'], dpi=300, bbox_inches='tight')
+    save_map(fig, caminhos['saida'], draft=draft)
     print(f"--- Task Complete! Map saved as '{os.path.basename(caminhos['saida'])}' ---")
     
     # Fechando a figura para liberar memória
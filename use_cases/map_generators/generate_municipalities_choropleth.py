@@ -17,12 +17,26 @@ import matplotlib.pyplot as plt
 
 # Imports from our new, clean, and professional component library
 from shared.map_components import (
+    COUNTRY_FILL_COLOR,
+    COUNTRY_BORDER_COLOR,
+    STATE_FILL_COLOR,
+    STATE_BORDER_COLOR,
     create_base_map,
     plot_states_layer,
-    plot_choropleth_layer
+    plot_choropleth_layer,
+    plot_choropleth_raster,
+    plot_labels,
+    FINAL_DPI,
+    DRAFT_DPI,
+    MAP_FIGSIZE,
+    draft_tolerance,
+    simplify_layer,
+    save_map
 )
+from shared.layer_loader import load_layer
+from shared.geometry_validation import ensure_valid
 
-def execute(uf: str, coluna: str, caminhos: dict) -> None:
+def execute(uf: str, coluna: str, caminhos: dict, backend: str = 'vector', draft: bool = False, rotulos: bool = False) -> None:
     """
     Generates and saves a choropleth map for a state's municipalities.
 
@@ -30,8 +44,17 @@ def execute(uf: str, coluna: str, caminhos: dict) -> None:
         uf (str): The abbreviation of the state (e.g., "SP").
         coluna (str): The name of the data column to use for coloring.
         caminhos (dict): A dictionary containing all necessary file paths.
+        backend (str, optional): 'vector' (Matplotlib patches) or 'raster' (cached
+            NumPy label images, much faster for many variants). Defaults to 'vector'.
+        draft (bool, optional): Fast preview (lower DPI, simplified geometry, cheaper
+            encoding) with the same layout as the final render. Defaults to False.
+        rotulos (bool, optional): Label the municipalities by name, placing the most
+            populous first and skipping labels that would overlap. Defaults to False.
     """
     print(f"\n--- Use Case: GENERATING MUNICIPALITY CHOROPLETH MAP FOR {uf} ---")
+    if backend not in ('vector', 'raster'):
+        print(f"  -> ERROR: Invalid backend '{backend}'. Use 'vector' or 'raster'.")
+        return
     
     projecao: str = "epsg:3857"
 
@@ -39,18 +62,28 @@ def execute(uf: str, coluna: str, caminhos: dict) -> None:
     print("  -> Preparing geographic data...")
     
     # Load states data once, it will be used for masking and zooming.
-    gdf_estados = gpd.read_file(caminhos['estados']).to_crs(projecao)
+    gdf_estados = load_layer(caminhos['estados'], projecao, columns=['abbreviation'])
     mascara_estado = gdf_estados[gdf_estados['abbreviation'] == uf.upper()].copy()
     if mascara_estado.empty:
         print(f"  -> ERROR: State '{uf}' not found. Aborting.")
         return
-    mascara_estado['geometry'] = mascara_estado.geometry.buffer(0)
+    mascara_estado = ensure_valid(mascara_estado, caminhos['estados'])
+    tolerancia = draft_tolerance(mascara_estado.total_bounds) if draft else None
+    gdf_estados = simplify_layer(gdf_estados, tolerancia)
+
+    # The zoom extent: the state's bounds plus a 10% margin.
+    minx, miny, maxx, maxy = mascara_estado.total_bounds
+    x_buffer = (maxx - minx) * 0.10
+    y_buffer = (maxy - miny) * 0.10
+    extent = (minx - x_buffer, miny - y_buffer, maxx + x_buffer, maxy + y_buffer)
 
     # Load and clip the municipalities data for the selected state.
+    # Only features touching the state are read, with the single data column needed.
     print(f"  -> Loading and clipping municipalities for {uf}...")
     try:
-        gdf_municipios = gpd.read_file(caminhos['municipios']).to_crs(projecao)
-        gdf_municipios['geometry'] = gdf_municipios.geometry.buffer(0)
+        gdf_municipios = load_layer(caminhos['municipios'], projecao, mask=mascara_estado.geometry.union_all(), columns=[coluna, 'name', 'population'] if rotulos else [coluna])
+        gdf_municipios = ensure_valid(gdf_municipios, caminhos['municipios'])
+        gdf_municipios = simplify_layer(gdf_municipios, tolerancia)
         municipios_do_estado = gpd.clip(gdf_municipios, mascara_estado)
         if municipios_do_estado.empty:
             print("  -> WARNING: No municipalities found after clipping.")
@@ -60,37 +93,48 @@ def execute(uf: str, coluna: str, caminhos: dict) -> None:
         return
 
     # --- STAGE 2: MAP ORCHESTRATION ---
-    print("\n  -> Orchestrating map layer plotting...")
+    print(f"\n  -> Orchestrating map layer plotting ({backend} backend)...")
     
     # Stacking order plan
     Z_BASE_ESTADOS = 2
     Z_COROPLETH = 3
 
-    # 2.1. Create the base map: ocean and South America
-    fig, ax = create_base_map(caminhos['sulamerica'])
-    
-    # 2.2. Plot all Brazilian states with a neutral color as a background
-    plot_states_layer(ax, gdf_estados, zorder=Z_BASE_ESTADOS)
-    
-    # 2.3. Plot the rich choropleth layer on top
-    # The component handles data validation, coloring, and the legend internally.
-    plot_choropleth_layer(ax, municipios_do_estado, data_column=coluna, zorder=Z_COROPLETH)
+    if backend == 'raster':
+        # 2.R. Base map, states and choropleth become a single cached NumPy image;
+        # Matplotlib only draws the image, the title and the legend.
+        fig, ax = plt.subplots(1, 1, figsize=MAP_FIGSIZE)
+        ax.set_axis_off()
+        base_layers = [
+            (simplify_layer(load_layer(caminhos['sulamerica'], projecao, bbox=extent), tolerancia), COUNTRY_FILL_COLOR, COUNTRY_BORDER_COLOR),
+            (gdf_estados, STATE_FILL_COLOR, STATE_BORDER_COLOR),
+        ]
+        plot_choropleth_raster(ax, municipios_do_estado, data_column=coluna, extent=extent, base_layers=base_layers, background='white', dpi=DRAFT_DPI if draft else FINAL_DPI, zorder=Z_COROPLETH)
+    else:
+        # 2.1. Create the base map: ocean and South America
+        fig, ax = create_base_map(caminhos['sulamerica'], simplify_tolerance=tolerancia, bbox=extent)
+        
+        # 2.2. Plot all Brazilian states with a neutral color as a background
+        plot_states_layer(ax, gdf_estados, zorder=Z_BASE_ESTADOS)
+        
+        # 2.3. Plot the rich choropleth layer on top
+        # The component handles data validation, coloring, and the legend internally.
+        plot_choropleth_layer(ax, municipios_do_estado, data_column=coluna, zorder=Z_COROPLETH)
 
     # --- STAGE 3: FINALIZATION & ZOOM ---
     print("  -> Finalizing map (zoom, title, and saving)...")
     
     # 3.1. Apply zoom to the state's bounds
-    minx, miny, maxx, maxy = mascara_estado.total_bounds
-    x_buffer = (maxx - minx) * 0.10
-    y_buffer = (maxy - miny) * 0.10
-    ax.set_xlim(minx - x_buffer, maxx + x_buffer)
-    ax.set_ylim(miny - y_buffer, maxy + y_buffer)
+    ax.set_xlim(extent[0], extent[2])
+    ax.set_ylim(extent[1], extent[3])
+    if rotulos:
+        # Os rótulos são posicionados na escala final do mapa (depois do zoom).
+        print(f"  -> {plot_labels(ax, municipios_do_estado, 'name', 'population')} municipality labels placed.")
 
     # 3.2. Set final touches and save
     ax.set_title(f"Mapa Coroplético de '{coluna.capitalize()}' para {uf}", fontsize=16, color='black')
     fig.patch.set_facecolor('white')
     ax.set_facecolor('white')
     
-    plt.savefig(caminhos['saida'], dpi=300, bbox_inches='tight', pad_inches=0.05)
+    save_map(fig, caminhos['saida'], draft=draft, pad_inches=0.05)
     print(f"--- Task Complete! Map saved as '{os.path.basename(caminhos['saida'])}' ---")
     plt.close(fig)
\ No newline at end of file
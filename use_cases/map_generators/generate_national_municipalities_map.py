@@ -0,0 +1,98 @@
+# use_cases/map_generators/generate_national_municipalities_map.py
+
+"""
+Use case orchestrator for a nationwide map of all Brazilian municipalities.
+
+This script is responsible for:
+1. Loading every downloaded municipality file as a single layer.
+2. Building (or loading from cache) the deduplicated border network, where
+   each shared border exists once and knows its level in the hierarchy.
+3. Plotting the fills without edges (plain or choropleth) and the whole
+   border network as a single LineCollection.
+4. Finalizing and saving the map artifact.
+"""
+
+import os
+import pandas as pd
+import matplotlib.pyplot as plt
+
+from shared.map_components import (
+    STATE_FILL_COLOR,
+    create_base_map,
+    plot_choropleth_layer,
+    draft_tolerance,
+    simplify_layer,
+    save_map
+)
+from shared.map_components.borders import BorderNetwork, plot_border_network
+from shared.layer_loader import load_layer
+from shared.locality_catalog import get_locality_catalog
+
+def execute(caminhos: dict, coluna: str = None, draft: bool = False) -> None:
+    """
+    Generates and saves a map of all municipalities in the downloaded files.
+
+    Args:
+        caminhos (dict): The file paths: 'sulamerica', 'estados', 'municipios' (a list of
+            municipality files), 'rede_fronteiras' (the border network cache) and 'saida'.
+        coluna (str, optional): A municipality data column for a choropleth fill.
+            Defaults to None (a plain fill).
+        draft (bool, optional): Fast preview (lower DPI, simplified geometry, cheaper
+            encoding) with the same layout as the final render. Defaults to False.
+    """
+    print("\n--- Use Case: GENERATING NATIONWIDE MUNICIPALITIES MAP ---")
+    projecao: str = "epsg:3857"
+
+    # --- STAGE 1: DATA PREPARATION ---
+    print("  -> Preparing geographic data...")
+    try:
+        colunas = [coluna] if coluna else []
+        gdf_municipios = pd.concat([load_layer(path, projecao, columns=colunas) for path in caminhos['municipios']], ignore_index=True)
+        gdf_estados = load_layer(caminhos['estados'], projecao, columns=[])
+    except Exception as e:
+        print(f"  -> ERROR: Failed to load the municipality files. Error: {e}")
+        return
+    print(f"  -> {len(gdf_municipios)} municipalities loaded from {len(caminhos['municipios'])} file(s).")
+
+    # The extent: all loaded municipalities plus a 3% margin.
+    minx, miny, maxx, maxy = gdf_municipios.total_bounds
+    x_buffer, y_buffer = (maxx - minx) * 0.03, (maxy - miny) * 0.03
+    extent = (minx - x_buffer, miny - y_buffer, maxx + x_buffer, maxy + y_buffer)
+    tolerancia = draft_tolerance(extent) if draft else None
+
+    # The border network is built once and reused until a municipality file changes.
+    print("  -> Loading the border network...")
+    catalogo = get_locality_catalog(download=False)
+    rede = BorderNetwork.build_or_load(caminhos['rede_fronteiras'], caminhos['municipios'], projecao, catalog=catalogo)
+    print(f"  -> {len(rede)} unique border lines.")
+
+    # --- STAGE 2: MAP ORCHESTRATION ---
+    print("\n  -> Orchestrating map layer plotting...")
+    Z_ESTADOS = 2
+    Z_MUNICIPIOS = 3
+    Z_FRONTEIRAS = 4
+
+    # 2.1. Base map; states give a background to municipalities without data.
+    fig, ax = create_base_map(caminhos['sulamerica'], simplify_tolerance=tolerancia, bbox=extent)
+    simplify_layer(gdf_estados, tolerancia).plot(ax=ax, color=STATE_FILL_COLOR, linewidth=0, zorder=Z_ESTADOS)
+
+    # 2.2. Fills without edges: the borders come from the network, each drawn once.
+    gdf_municipios = simplify_layer(gdf_municipios, tolerancia)
+    if coluna:
+        plot_choropleth_layer(ax, gdf_municipios, data_column=coluna, linewidth=0, edgecolor='none', zorder=Z_MUNICIPIOS)
+    else:
+        gdf_municipios.plot(ax=ax, color=STATE_FILL_COLOR, linewidth=0, zorder=Z_MUNICIPIOS)
+
+    # 2.3. Every border (municipality, region and state) in one LineCollection.
+    plot_border_network(ax, rede, tolerance=tolerancia, zorder=Z_FRONTEIRAS)
+
+    # --- STAGE 3: FINALIZATION ---
+    print("  -> Finalizing map (zoom, title, and saving)...")
+    ax.set_xlim(extent[0], extent[2])
+    ax.set_ylim(extent[1], extent[3])
+    titulo = f"Municípios do Brasil por '{coluna.capitalize()}'" if coluna else "Municípios do Brasil"
+    ax.set_title(titulo, fontsize=16, color='black')
+
+    save_map(fig, caminhos['saida'], draft=draft, pad_inches=0.05)
+    print(f"--- Task Complete! Map saved as '{os.path.basename(caminhos['saida'])}' ---")
+    plt.close(fig)
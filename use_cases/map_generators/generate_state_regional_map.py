@@ -16,17 +16,28 @@ from shared.map_components import (
     create_base_map,
     plot_states_layer,
     plot_highlight_layer,
-    plot_polygons_layer
+    plot_polygons_layer,
+    plot_labels,
+    draft_tolerance,
+    simplify_layer,
+    save_map
 )
+from shared.file_utils import dataset_exists
+from shared.layer_loader import load_layer
+from shared.geometry_validation import ensure_valid
 
 
-def execute(uf: str, caminhos: dict) -> None:
+def execute(uf: str, caminhos: dict, draft: bool = False, rotulos: bool = False) -> None:
     """
     Generates and saves a map showing the regional divisions for a given state.
 
     Args:
         uf (str): The abbreviation of the state (e.g., "SP").
         caminhos (dict): A dictionary containing all necessary file paths.
+        draft (bool, optional): Fast preview (lower DPI, simplified geometry, cheaper
+            encoding) with the same layout as the final render. Defaults to False.
+        rotulos (bool, optional): Label the immediate regions by name, skipping labels
+            that would overlap. Defaults to False.
     """
     print(f"\n--- Use Case: GENERATING REGIONAL DIVISIONS MAP FOR {uf} ---")
     
@@ -34,18 +45,23 @@ def execute(uf: str, caminhos: dict) -> None:
 
     # --- STAGE 1: DATA PREPARATION ---
     print("  -> Preparing geographic data...")
-    gdf_estados = gpd.read_file(caminhos['estados']).to_crs(projecao)
+    gdf_estados = load_layer(caminhos['estados'], projecao, columns=['abbreviation'])
     mascara_estado = gdf_estados[gdf_estados['abbreviation'] == uf.upper()].copy()
     if mascara_estado.empty: 
         print(f"  -> ERROR: State '{uf}' not found. Aborting."); return
-    mascara_estado['geometry'] = mascara_estado.geometry.buffer(0)
+    mascara_estado = ensure_valid(mascara_estado, caminhos['estados'])
+    tolerancia = draft_tolerance(mascara_estado.total_bounds) if draft else None
+    gdf_estados = simplify_layer(gdf_estados, tolerancia)
+    # Das camadas maiores, lê-se apenas o que toca o estado, sem colunas de atributos.
+    geometria_estado = mascara_estado.geometry.union_all()
 
     municipios_recortados = None
     caminho_municipios = caminhos.get('municipios')
-    if caminho_municipios and os.path.exists(caminho_municipios):
+    if caminho_municipios and dataset_exists(caminho_municipios):
         try:
-            gdf_municipios = gpd.read_file(caminho_municipios).to_crs(projecao)
-            gdf_municipios['geometry'] = gdf_municipios.geometry.buffer(0)
+            gdf_municipios = load_layer(caminho_municipios, projecao, mask=geometria_estado, columns=[])
+            gdf_municipios = ensure_valid(gdf_municipios, caminho_municipios)
+            gdf_municipios = simplify_layer(gdf_municipios, tolerancia)
             recorte_tentativa = gpd.clip(gdf_municipios, mascara_estado)
             if not recorte_tentativa.empty:
                 municipios_recortados = recorte_tentativa
@@ -55,12 +71,14 @@ def execute(uf: str, caminhos: dict) -> None:
     else:
         print("  -> Municipality data not found.")
 
-    gdf_imediatas = gpd.read_file(caminhos['imediatas']).to_crs(projecao)
-    gdf_imediatas['geometry'] = gdf_imediatas.geometry.buffer(0)
+    gdf_imediatas = load_layer(caminhos['imediatas'], projecao, mask=geometria_estado, columns=['immediate_region_name'] if rotulos else [])
+    gdf_imediatas = ensure_valid(gdf_imediatas, caminhos['imediatas'])
+    gdf_imediatas = simplify_layer(gdf_imediatas, tolerancia)
     imediatas_recortadas = gpd.clip(gdf_imediatas, mascara_estado)
     
-    gdf_intermediarias = gpd.read_file(caminhos['intermediarias']).to_crs(projecao)
-    gdf_intermediarias['geometry'] = gdf_intermediarias.geometry.buffer(0)
+    gdf_intermediarias = load_layer(caminhos['intermediarias'], projecao, mask=geometria_estado, columns=[])
+    gdf_intermediarias = ensure_valid(gdf_intermediarias, caminhos['intermediarias'])
+    gdf_intermediarias = simplify_layer(gdf_intermediarias, tolerancia)
     intermediarias_recortadas = gpd.clip(gdf_intermediarias, mascara_estado)
 
     # --- STAGE 2: MAP ORCHESTRATION WITH EXPLICIT Z-ORDER ---
@@ -74,8 +92,11 @@ def execute(uf: str, caminhos: dict) -> None:
     Z_LINHAS_REGIOES = 5
     Z_BORDA_FINAL = 6
 
-    # 2.1. Create the base canvas (already has zorder=1)
-    fig, ax = create_base_map(caminhos['sulamerica'])
+    # 2.1. Create the base canvas (already has zorder=1), reading only the countries in view
+    minx, miny, maxx, maxy = mascara_estado.total_bounds
+    x_margin, y_margin = (maxx - minx) * 0.05, (maxy - miny) * 0.05
+    extent = (minx - x_margin, miny - y_margin, maxx + x_margin, maxy + y_margin)
+    fig, ax = create_base_map(caminhos['sulamerica'], simplify_tolerance=tolerancia, bbox=extent)
     
     # 2.2. Plot base layers with explicit z-order
     plot_states_layer(ax, gdf_estados, zorder=Z_BASE_ESTADOS)
@@ -101,9 +122,11 @@ def execute(uf: str, caminhos: dict) -> None:
     
     # --- STAGE 3: FINALIZATION ---
     print("  -> Finalizing map (legend, title, and saving)...")
-    minx, miny, maxx, maxy = mascara_estado.total_bounds
-    ax.set_xlim(minx - (maxx - minx) * 0.05, maxx + (maxx - minx) * 0.05)
-    ax.set_ylim(miny - (maxy - miny) * 0.05, maxy + (maxy - miny) * 0.05)
+    ax.set_xlim(extent[0], extent[2])
+    ax.set_ylim(extent[1], extent[3])
+    if rotulos:
+        # Regiões maiores têm prioridade; os rótulos são posicionados na escala final do mapa.
+        plot_labels(ax, imediatas_recortadas, 'immediate_region_name', fontsize=7.0, zorder=Z_BORDA_FINAL + 1)
 
     legenda_intermediaria = mlines.Line2D([], [], color='#d00000', lw=1.8, label='Região Intermediária')
     legenda_imediata = mlines.Line2D([], [], color=region_line_color, lw=1.0, label='Região Imediata')
@@ -111,6 +134,6 @@ def execute(uf: str, caminhos: dict) -> None:
 
     ax.set_title(f"Divisões Regionais de {uf}", fontsize=16, color='black')
     
-    plt.savefig(caminhos['saida'], dpi=300, bbox_inches='tight', pad_inches=0.05)
+    save_map(fig, caminhos['saida'], draft=draft, pad_inches=0.05)
     print(f"--- Task Complete! Map saved as '{os.path.basename(caminhos['saida'])}' ---")
     plt.close(fig)
\ No newline at end of file
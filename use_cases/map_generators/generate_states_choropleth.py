@@ -11,24 +11,40 @@ This script is responsible for:
 """
 
 import os
-import geopandas as gpd
 import matplotlib.pyplot as plt
 
 # Imports from our new, clean, and professional component library
 from shared.map_components import (
+    OCEAN_COLOR,
+    COUNTRY_FILL_COLOR,
+    COUNTRY_BORDER_COLOR,
     create_base_map,
-    plot_choropleth_layer
+    plot_choropleth_layer,
+    plot_choropleth_raster,
+    FINAL_DPI,
+    DRAFT_DPI,
+    draft_tolerance,
+    simplify_layer,
+    save_map
 )
+from shared.layer_loader import load_layer
 
-def execute(coluna: str, caminhos: dict) -> None:
+def execute(coluna: str, caminhos: dict, backend: str = 'vector', draft: bool = False) -> None:
     """
     Generates and saves a choropleth map of Brazilian states.
 
     Args:
         coluna (str): The name of the data column to use for coloring.
         caminhos (dict): A dictionary containing all necessary file paths.
+        backend (str, optional): 'vector' (Matplotlib patches) or 'raster' (cached
+            NumPy label images, much faster for many variants). Defaults to 'vector'.
+        draft (bool, optional): Fast preview (lower DPI, simplified geometry, cheaper
+            encoding) with the same layout as the final render. Defaults to False.
     """
     print(f"\n--- Use Case: GENERATING STATES CHOROPLETH MAP BY '{coluna}' ---")
+    if backend not in ('vector', 'raster'):
+        print(f"  -> ERROR: Invalid backend '{backend}'. Use 'vector' or 'raster'.")
+        return
     
     projecao: str = "epsg:3857"
 
@@ -36,36 +52,60 @@ def execute(coluna: str, caminhos: dict) -> None:
     # The "architect" is responsible for loading the data it will orchestrate.
     print("  -> Preparing geographic data...")
     try:
-        gdf_estados = gpd.read_file(caminhos['estados']).to_crs(projecao)
+        gdf_estados = load_layer(caminhos['estados'], projecao, columns=[coluna])
+        tolerancia = draft_tolerance(gdf_estados.total_bounds) if draft else None
+        gdf_estados = simplify_layer(gdf_estados, tolerancia)
         print("  -> States data successfully prepared.")
     except Exception as e:
         print(f"  -> ERROR: Failed to load states file. Error: {e}")
         return
 
     # --- STAGE 2: MAP ORCHESTRATION ---
-    print("\n  -> Orchestrating map layer plotting...")
+    print(f"\n  -> Orchestrating map layer plotting ({backend} backend)...")
     
     # Stacking order plan: The choropleth layer goes on top of the base map.
     Z_COROPLETH = 2
 
-    # 2.1. Create the base map: ocean and South America
-    fig, ax = create_base_map(caminhos['sulamerica'])
-    
-    # 2.2. Plot the rich choropleth layer on top using our powerful component
-    # The component handles data validation, coloring, and the legend internally.
-    plot_choropleth_layer(
-        ax, 
-        geodataframe=gdf_estados, 
-        data_column=coluna, 
-        cmap='plasma', # Using the 'plasma' colormap as in the original script
-        zorder=Z_COROPLETH
-    )
+    if backend == 'raster':
+        # 2.R. South America and the choropleth become a single cached NumPy image,
+        # framed like the autoscaled vector map (continent bounds plus a 5% margin).
+        fig, ax = plt.subplots(1, 1, figsize=(10, 12))
+        fig.patch.set_facecolor(OCEAN_COLOR)
+        ax.set_axis_off()
+        gdf_sulamerica = simplify_layer(load_layer(caminhos['sulamerica'], projecao), tolerancia)
+        minx, miny, maxx, maxy = gdf_sulamerica.total_bounds
+        x_margin, y_margin = (maxx - minx) * 0.05, (maxy - miny) * 0.05
+        extent = (minx - x_margin, miny - y_margin, maxx + x_margin, maxy + y_margin)
+        plot_choropleth_raster(
+            ax,
+            geodataframe=gdf_estados,
+            data_column=coluna,
+            extent=extent,
+            base_layers=[(gdf_sulamerica, COUNTRY_FILL_COLOR, COUNTRY_BORDER_COLOR)],
+            background=OCEAN_COLOR,
+            cmap='plasma',
+            dpi=DRAFT_DPI if draft else FINAL_DPI,
+            zorder=Z_COROPLETH
+        )
+    else:
+        # 2.1. Create the base map: ocean and South America
+        fig, ax = create_base_map(caminhos['sulamerica'], simplify_tolerance=tolerancia)
+        
+        # 2.2. Plot the rich choropleth layer on top using our powerful component
+        # The component handles data validation, coloring, and the legend internally.
+        plot_choropleth_layer(
+            ax, 
+            geodataframe=gdf_estados, 
+            data_column=coluna, 
+            cmap='plasma', # Using the 'plasma' colormap as in the original script
+            zorder=Z_COROPLETH
+        )
 
     # --- STAGE 3: FINALIZATION ---
     print("  -> Finalizing and saving the map...")
     
     ax.set_title(f"Mapa Coroplético dos Estados por '{coluna.capitalize()}'", fontsize=16, color='black')
     
-    plt.savefig(caminhos['saida'], dpi=300, bbox_inches='tight', pad_inches=0.05)
+    save_map(fig, caminhos['saida'], draft=draft, pad_inches=0.05)
     print(f"--- Task Complete! Map saved as '{os.path.basename(caminhos['saida'])}' ---")
     plt.close(fig)
\ No newline at end of file
@@ -0,0 +1,164 @@
+# use_cases/map_generators/generate_tiles.py
+
+"""
+Use case orchestrator for generating an XYZ tile pyramid (MBTiles) from the
+fetched layers.
+
+This script is responsible for:
+1. Computing the tiles that cover Brazil for each requested zoom level.
+2. Converting each layer once into a memory-mapped geometry store, so worker
+   processes share a single copy of the data instead of parsing it each.
+3. Distributing the tiles across worker processes, where each worker decodes
+   only the features touching a tile, simplifies them for the zoom, clips them
+   and renders PNG or Mapbox Vector Tiles using the shared tile components.
+4. Writing the results to an MBTiles file, skipping tiles whose content did
+   not change since the previous run.
+"""
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import geopandas as gpd
+import pandas as pd
+
+from shared.geometry_store import ARROW_AVAILABLE, attach_geometry_store, build_geometry_store
+from shared.layer_loader import load_layer
+from shared.map_components import DEFAULT_PROJECTION
+from shared.map_components.tiles import (
+    MVT_AVAILABLE,
+    TILE_LAYER_ORDER,
+    MBTilesWriter,
+    RasterTileRenderer,
+    clip_layers_to_tile,
+    encode_vector_tile,
+    meters_per_pixel,
+    prepare_layers_for_zoom,
+    tile_bounds,
+    tile_fingerprint,
+    tiles_covering
+)
+
+# Estado de cada processo de trabalho (preenchido uma única vez pelo initializer).
+_WORKER_STATE: dict = {}
+
+
+def _init_worker(store_paths: dict, tile_format: str) -> None:
+    """Attaches (zero-copy) to the geometry stores once per worker process."""
+    _WORKER_STATE['stores'] = {name: [attach_geometry_store(p) for p in paths] for name, paths in store_paths.items()}
+    _WORKER_STATE['format'] = tile_format
+    _WORKER_STATE['renderer'] = RasterTileRenderer() if tile_format == 'png' else None
+
+
+def _tile_layers(zoom: int, x: int, y: int, buffer_pixels: int = 4) -> dict:
+    """Decodes only the features touching a tile and simplifies them for its zoom."""
+    minx, miny, maxx, maxy = tile_bounds(zoom, x, y)
+    pad = meters_per_pixel(zoom) * buffer_pixels
+    bbox = (minx - pad, miny - pad, maxx + pad, maxy + pad)
+
+    layers = {}
+    for name, stores in _WORKER_STATE['stores'].items():
+        frames = [store.to_geodataframe(bbox=bbox) for store in stores]
+        frames = [frame for frame in frames if not frame.empty]
+        if frames:
+            layers[name] = gpd.GeoDataFrame(pd.concat(frames, ignore_index=True), crs=DEFAULT_PROJECTION)
+    return prepare_layers_for_zoom(layers, zoom)
+
+
+def _render_tile(task: tuple) -> tuple:
+    """
+    Renders a single tile inside a worker.
+
+    Returns (zoom, x, y, status, fingerprint, data), where status is
+    'empty', 'unchanged' or 'rendered'.
+    """
+    zoom, x, y, previous_fingerprint = task
+    tile_format = _WORKER_STATE['format']
+
+    clipped = clip_layers_to_tile(_tile_layers(zoom, x, y), zoom, x, y)
+    if not clipped:
+        return zoom, x, y, 'empty', None, None
+
+    fingerprint = tile_fingerprint(clipped, tile_format)
+    if fingerprint == previous_fingerprint:
+        return zoom, x, y, 'unchanged', fingerprint, None
+
+    bounds = tile_bounds(zoom, x, y)
+    if tile_format == 'png':
+        data = _WORKER_STATE['renderer'].render(clipped, bounds)
+    else:
+        data = encode_vector_tile(clipped, bounds)
+    return zoom, x, y, 'rendered', fingerprint, data
+
+
+def execute(caminhos: dict, zoom_min: int = 3, zoom_max: int = 8, formato: str = 'png', workers: int = None) -> None:
+    """
+    Generates (or incrementally updates) an MBTiles pyramid for Brazil.
+
+    Args:
+        caminhos (dict): File paths. 'estados' and 'saida' (the .mbtiles file) are
+            required; 'sulamerica', 'municipios' (a path or a list of per-state paths),
+            'imediatas' and 'intermediarias' are optional layers.
+        zoom_min (int, optional): The first zoom level. Defaults to 3.
+        zoom_max (int, optional): The last zoom level (inclusive). Defaults to 8.
+        formato (str, optional): 'png' for raster tiles or 'pbf' for vector tiles. Defaults to 'png'.
+        workers (int, optional): Number of worker processes. Defaults to the CPU count.
+    """
+    print(f"\n--- Use Case: GENERATING {formato.upper()} TILES (z{zoom_min}-z{zoom_max}) ---")
+
+    if formato not in ('png', 'pbf'):
+        print(f"  -> ERROR: Invalid format '{formato}'. Use 'png' or 'pbf'.")
+        return
+    if formato == 'pbf' and not MVT_AVAILABLE:
+        print("  -> ERROR: The 'mapbox-vector-tile' package is required for vector tiles.")
+        return
+    if not ARROW_AVAILABLE:
+        print("  -> ERROR: The 'pyarrow' package is required to share layers between workers.")
+        return
+
+    # --- STAGE 1: DATA PREPARATION ---
+    print("  -> Preparing layers (shared geometry stores) and tile grid...")
+    layer_paths = {name: caminhos[name] for name in TILE_LAYER_ORDER if caminhos.get(name)}
+    # Cada camada (ou lista de arquivos por estado) vira um store Arrow, reconstruído só se a fonte mudou.
+    store_paths = {
+        name: [build_geometry_store(p, projection=DEFAULT_PROJECTION) for p in ([paths] if isinstance(paths, str) else paths)]
+        for name, paths in layer_paths.items()
+    }
+    gdf_estados = load_layer(caminhos['estados'])
+    brazil_bounds = gdf_estados.to_crs(DEFAULT_PROJECTION).total_bounds
+    lon_min, lat_min, lon_max, lat_max = gdf_estados.to_crs("epsg:4326").total_bounds
+
+    # --- STAGE 2: PARALLEL RENDERING ---
+    counts = {'rendered': 0, 'unchanged': 0, 'empty': 0}
+    with MBTilesWriter(caminhos['saida']) as writer, ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(store_paths, formato)
+    ) as executor:
+        for zoom in range(zoom_min, zoom_max + 1):
+            previous = writer.fingerprints(zoom)
+            tasks = [(zoom, x, y, previous.get((x, y))) for x, y in tiles_covering(brazil_bounds, zoom)]
+            print(f"  -> Zoom {zoom}: {len(tasks)} candidate tiles...")
+
+            for z, x, y, status, fingerprint, data in executor.map(_render_tile, tasks, chunksize=16):
+                counts[status] += 1
+                if status == 'rendered':
+                    writer.write_tile(z, x, y, data, fingerprint)
+                elif status == 'empty' and (x, y) in previous:
+                    writer.write_tile(z, x, y, None, None)
+            writer.commit()
+
+        # --- STAGE 3: FINALIZATION ---
+        metadata = {
+            'name': os.path.splitext(os.path.basename(caminhos['saida']))[0],
+            'format': formato,
+            'type': 'overlay',
+            'minzoom': zoom_min,
+            'maxzoom': zoom_max,
+            'bounds': f"{lon_min:.6f},{lat_min:.6f},{lon_max:.6f},{lat_max:.6f}",
+        }
+        if formato == 'pbf':
+            vector_layers = [{'id': name, 'fields': {}, 'minzoom': zoom_min, 'maxzoom': zoom_max} for name in layer_paths]
+            metadata['json'] = json.dumps({'vector_layers': vector_layers})
+        writer.set_metadata(metadata)
+
+    print(f"  -> Tiles rendered: {counts['rendered']} | unchanged (skipped): {counts['unchanged']} | empty: {counts['empty']}")
+    print(f"--- Task Complete! Tiles saved in '{os.path.basename(caminhos['saida'])}' ---")
@@ -20,16 +20,26 @@ from shared.map_components import (
     create_base_map,
     plot_states_layer,
     plot_highlight_layer,
-    plot_polygons_layer
+    plot_polygons_layer,
+    plot_labels,
+    draft_tolerance,
+    simplify_layer,
+    save_map
 )
+from shared.layer_loader import load_layer
+from shared.geometry_validation import ensure_valid
 
-def execute(uf: str, caminhos: dict) -> None:
+def execute(uf: str, caminhos: dict, draft: bool = False, rotulos: bool = False) -> None:
     """
     Generates and saves a map zoomed in on a state's municipalities.
 
     Args:
         uf (str): The abbreviation of the state (e.g., "SP").
         caminhos (dict): A dictionary containing all necessary file paths.
+        draft (bool, optional): Fast preview (lower DPI, simplified geometry, cheaper
+            encoding) with the same layout as the final render. Defaults to False.
+        rotulos (bool, optional): Label the municipalities by name, placing the most
+            populous first and skipping labels that would overlap. Defaults to False.
     """
     print(f"\n--- Use Case: GENERATING ZOOM MAP FOR {uf} ---")
     
@@ -40,21 +50,31 @@ def execute(uf: str, caminhos: dict) -> None:
 
     # Load states data once; it's used for the mask, highlight, and zoom.
     try:
-        gdf_estados = gpd.read_file(caminhos['estados']).to_crs(projecao)
+        gdf_estados = load_layer(caminhos['estados'], projecao, columns=['abbreviation'])
         mascara_estado = gdf_estados[gdf_estados['abbreviation'] == uf.upper()].copy()
         if mascara_estado.empty:
             print(f"  -> ERROR: State '{uf}' not found. Aborting.")
             return
-        mascara_estado['geometry'] = mascara_estado.geometry.buffer(0)
+        mascara_estado = ensure_valid(mascara_estado, caminhos['estados'])
+        tolerancia = draft_tolerance(mascara_estado.total_bounds) if draft else None
+        gdf_estados = simplify_layer(gdf_estados, tolerancia)
     except Exception as e:
         print(f"  -> ERROR: Failed to load states file. Error: {e}")
         return
 
+    # The zoom extent: the state's bounds plus a 10% margin.
+    minx, miny, maxx, maxy = mascara_estado.total_bounds
+    x_buffer = (maxx - minx) * 0.10
+    y_buffer = (maxy - miny) * 0.10
+    extent = (minx - x_buffer, miny - y_buffer, maxx + x_buffer, maxy + y_buffer)
+
     # Load, clean, and clip the municipalities for the selected state.
+    # Only features touching the state are read, and only the label columns (if any).
     print(f"  -> Loading and clipping municipalities for {uf}...")
     try:
-        gdf_municipios = gpd.read_file(caminhos['municipios']).to_crs(projecao)
-        gdf_municipios['geometry'] = gdf_municipios.geometry.buffer(0)
+        gdf_municipios = load_layer(caminhos['municipios'], projecao, mask=mascara_estado.geometry.union_all(), columns=['name', 'population'] if rotulos else [])
+        gdf_municipios = ensure_valid(gdf_municipios, caminhos['municipios'])
+        gdf_municipios = simplify_layer(gdf_municipios, tolerancia)
         municipios_do_estado = gpd.clip(gdf_municipios, mascara_estado)
         if municipios_do_estado.empty:
             print("  -> WARNING: No municipalities found after clipping.")
@@ -72,7 +92,7 @@ def execute(uf: str, caminhos: dict) -> None:
     Z_MUNICIPIOS = 4
 
     # 2.1. Create the base canvas
-    fig, ax = create_base_map(caminhos['sulamerica'])
+    fig, ax = create_base_map(caminhos['sulamerica'], simplify_tolerance=tolerancia, bbox=extent)
     
     # 2.2. Plot the base layers
     plot_states_layer(ax, gdf_estados, zorder=Z_BASE_ESTADOS)
@@ -95,17 +115,17 @@ def execute(uf: str, caminhos: dict) -> None:
     print("  -> Finalizing map (zoom, title, and saving)...")
     
     # 3.1. Apply zoom to the state's bounds
-    minx, miny, maxx, maxy = mascara_estado.total_bounds
-    x_buffer = (maxx - minx) * 0.10
-    y_buffer = (maxy - miny) * 0.10
-    ax.set_xlim(minx - x_buffer, maxx + x_buffer)
-    ax.set_ylim(miny - y_buffer, maxy + y_buffer)
+    ax.set_xlim(extent[0], extent[2])
+    ax.set_ylim(extent[1], extent[3])
+    if rotulos:
+        # Os rótulos são posicionados na escala final do mapa (depois do zoom).
+        print(f"  -> {plot_labels(ax, municipios_do_estado, 'name', 'population')} municipality labels placed.")
 
     # 3.2. Set final touches and save
     ax.set_title(f'Municípios de {uf}', fontsize=16, color='black')
     fig.patch.set_facecolor('white')
     ax.set_facecolor('white')
     
-    plt.savefig(caminhos['saida'], dpi=300, bbox_inches='tight')
+    save_map(fig, caminhos['saida'], draft=draft)
     print(f"--- Task Complete! Map saved as '{os.path.basename(caminhos['saida'])}' ---")
     plt.close(fig)
\ No newline at end of file
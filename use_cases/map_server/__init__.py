@@ -0,0 +1,2 @@
+# Expõe a classe para fora deste sub-pacote
+from .index import MapServerUseCase
@@ -0,0 +1,234 @@
+# use_cases/map_server/index.py
+
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import matplotlib
+matplotlib.use('Agg')  # O servidor nunca abre janelas: renderiza apenas para arquivos.
+
+from shared.file_utils import GEOJSON_SUFFIXES, resolve_dataset_path
+from shared.layer_loader import load_layer, dataset_version, set_layer_cache_size
+from shared.locality_catalog import get_locality_catalog
+from shared.map_components import DEFAULT_PROJECTION
+from use_cases.map_generators import (
+    gerar_mapa_destaque,
+    gerar_mapa_zoom,
+    gerar_mapa_municipios_coropleth,
+    gerar_mapa_estados_coropleth,
+    gerar_mapa_regional_estado,
+    gerar_mapa_regioes_recortadas
+)
+
+
+class RenderCache:
+    """
+    Thread-safe LRU cache of rendered images, bounded by the total size in bytes.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data: bytes):
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= len(self._entries.pop(key))
+            self._entries[key] = data
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.total_bytes, 'hits': self.hits, 'misses': self.misses}
+
+
+class MapServerUseCase:
+    """
+    Use Case that serves the map generators over a local HTTP service.
+
+    Every layer (states, municipalities, regions and South America) is loaded
+    once and stays resident in memory, and rendered images are cached by
+    request parameters plus the version of the data files they depend on.
+
+    Endpoints:
+        /map/highlight/{uf}
+        /map/zoom/{uf}
+        /map/choropleth/{uf}/{column}   (uf = BR renders the states choropleth)
+        /map/regions/{uf}/{type}        (type = imediatas, intermediarias or divisoes)
+        /health
+
+    Every map endpoint accepts '?draft=1' for a fast low-resolution preview.
+    """
+
+    def __init__(self, output_dir: str, shared_dir: str, cache_max_mb: int = 256):
+        """
+        :param output_dir: The folder with the fetched GeoJSON files.
+        :param shared_dir: The folder with 'south_america.geojson'.
+        :param cache_max_mb: The maximum size of the rendered image cache, in MB.
+        """
+        self.output_dir = output_dir
+        self.shared_dir = shared_dir
+        self.cache = RenderCache(cache_max_mb * 1024 * 1024)
+        # O pyplot não é thread-safe: as renderizações são serializadas, os acertos de cache não.
+        self._render_lock = threading.Lock()
+
+    def _caminhos(self, uf: str = None) -> dict:
+        caminhos = {
+            'sulamerica': os.path.join(self.shared_dir, "south_america.geojson"),
+            'estados': os.path.join(self.output_dir, "1-complete-data-states.geojson"),
+            'imediatas': os.path.join(self.output_dir, "3-immediate-regions.geojson"),
+            'intermediarias': os.path.join(self.output_dir, "4-intermediate-regions.geojson"),
+        }
+        if uf:
+            caminhos['municipios'] = os.path.join(self.output_dir, f"2-complete-data-municipalities-{uf.lower()}.geojson")
+        # Aceita cópias comprimidas (.gz/.zst) quando o .geojson não existe.
+        return {key: resolve_dataset_path(path) for key, path in caminhos.items()}
+
+    def _preload(self):
+        """Loads every available layer into the resident layer cache."""
+        paths = list(self._caminhos().values())
+        paths += [
+            os.path.join(self.output_dir, f) for f in os.listdir(self.output_dir)
+            if f.startswith("2-complete-data-municipalities-") and f.endswith(GEOJSON_SUFFIXES)
+        ]
+        paths = [p for p in paths if os.path.exists(p)]
+        set_layer_cache_size(len(paths) + 8)
+        for path in paths:
+            print(f"  Loading {os.path.basename(path)}... ", end="", flush=True)
+            load_layer(path, DEFAULT_PROJECTION)
+            print("OK")
+
+    def _route(self, parts: list, draft: bool):
+        """
+        Resolves a request path into (render function, required dependency keys,
+        optional dependency keys). The render function receives the 'caminhos'
+        dict (with 'saida' set); optional layers are drawn only when they exist.
+        """
+        if len(parts) == 3 and parts[:2] == ['map', 'highlight']:
+            uf = parts[2].upper()
+            return (lambda c: gerar_mapa_destaque(uf, c, draft=draft)), ['sulamerica', 'estados'], []
+        if len(parts) == 3 and parts[:2] == ['map', 'zoom']:
+            uf = parts[2].upper()
+            return (lambda c: gerar_mapa_zoom(uf, c, draft=draft)), ['sulamerica', 'estados', 'municipios'], []
+        if len(parts) == 4 and parts[:2] == ['map', 'choropleth']:
+            uf, coluna = parts[2].upper(), parts[3]
+            if uf == 'BR':
+                return (lambda c: gerar_mapa_estados_coropleth(coluna, c, draft=draft)), ['sulamerica', 'estados'], []
+            return (lambda c: gerar_mapa_municipios_coropleth(uf, coluna, c, draft=draft)), ['sulamerica', 'estados', 'municipios'], []
+        if len(parts) == 4 and parts[:2] == ['map', 'regions']:
+            uf, region_type = parts[2].upper(), parts[3].lower()
+            if region_type in ('imediatas', 'intermediarias'):
+                return (lambda c: gerar_mapa_regioes_recortadas(uf=uf, caminhos=c, region_type=region_type, draft=draft)), ['sulamerica', 'estados', region_type], []
+            if region_type == 'divisoes':
+                return (lambda c: gerar_mapa_regional_estado(uf, c, draft=draft)), ['sulamerica', 'estados', 'imediatas', 'intermediarias'], ['municipios']
+        return None, None, None
+
+    def render(self, path: str) -> tuple:
+        """
+        Returns (HTTP status, body, content type, cache status) for a request path.
+        """
+        url = urlsplit(path)
+        parts = [p for p in url.path.split('/') if p]
+        draft = parse_qs(url.query).get('draft', ['0'])[0].lower() in ('1', 'true', 'yes')
+        if parts == ['health']:
+            body = json.dumps({'status': 'ok', 'cache': self.cache.stats()}).encode()
+            return 200, body, 'application/json', '-'
+
+        render_fn, dependencies, optional = self._route(parts, draft)
+        if render_fn is None:
+            return 404, b'Unknown endpoint', 'text/plain', '-'
+
+        uf = parts[2] if parts[2].upper() != 'BR' else None
+        catalog = get_locality_catalog(download=False)
+        if uf and catalog is not None and not catalog.has_state(uf):
+            return 404, f"Unknown state: {uf}".encode(), 'text/plain', '-'
+        caminhos = self._caminhos(uf)
+        missing = [key for key in dependencies if not os.path.exists(caminhos[key])]
+        if missing:
+            return 404, f"Missing data files: {', '.join(missing)}".encode(), 'text/plain', '-'
+
+        # As camadas opcionais entram na versão: criá-las (ou alterá-las) muda o mapa.
+        key = (tuple(parts), draft, dataset_version(caminhos[k] for k in dependencies + optional))
+        data = self.cache.get(key)
+        if data is not None:
+            return 200, data, 'image/png', 'HIT'
+
+        with self._render_lock:
+            # Outra requisição pode ter renderizado a mesma imagem enquanto esperávamos.
+            data = self.cache.get(key)
+            if data is not None:
+                return 200, data, 'image/png', 'HIT'
+
+            fd, caminhos['saida'] = tempfile.mkstemp(suffix='.png')
+            os.close(fd)
+            try:
+                render_fn(caminhos)
+                with open(caminhos['saida'], 'rb') as f:
+                    data = f.read()
+            finally:
+                os.remove(caminhos['saida'])
+
+        if not data:
+            return 500, b'Map could not be generated (see server log)', 'text/plain', 'MISS'
+        self.cache.put(key, data)
+        return 200, data, 'image/png', 'MISS'
+
+    def execute(self, host: str = '127.0.0.1', port: int = 8000):
+        """
+        Preloads the layers and serves requests until interrupted (Ctrl+C).
+
+        :param host: The interface to bind.
+        :param port: The TCP port to listen on.
+        """
+        print("\n--- Starting local map server: preloading layers ---")
+        self._preload()
+        use_case = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                start = time.perf_counter()
+                try:
+                    status, body, content_type, cache_status = use_case.render(self.path)
+                except Exception as e:
+                    status, body, content_type, cache_status = 500, f"Error: {e}".encode(), 'text/plain', '-'
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('X-Cache', cache_status)
+                self.end_headers()
+                self.wfile.write(body)
+                print(f"  {self.command} {self.path} -> {status} [{cache_status}] {(time.perf_counter() - start) * 1000:.1f} ms")
+
+            def log_message(self, format, *args):
+                pass  # O log resumido acima já cobre cada requisição.
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        print(f"\n✅ Map server listening on http://{host}:{port}/ (Ctrl+C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\nStopping map server...")
+        finally:
+            server.server_close()
@@ -0,0 +1,106 @@
+# use_cases/spatial_analysis/index.py
+
+import os
+
+import numpy as np
+
+from shared.dataset_store import upsert_into_store
+from shared.file_utils import open_dataset, resolve_dataset_path, save_geojson
+from shared.json_codec import iter_features
+from shared.spatial_statistics import ContiguityGraph, CONTIGUITY_RULES, LISA_LABELS, global_morans_i, local_morans_i
+
+
+class SpatialAnalysisUseCase:
+    """
+    Use Case that measures the spatial autocorrelation of a municipality column
+    (global Moran's I) and finds its local clusters and outliers (LISA), writing
+    the results as new properties of the municipality GeoJSON(s).
+
+    The contiguity graph is built once per set of files and rule (and persisted
+    at `cache_path`), so analysing another column only repeats the sparse algebra.
+    The cluster property ('{column}_lisa_cluster': 1 High-High, 2 Low-High,
+    3 Low-Low, 4 High-Low, 0 not significant) can be mapped with Option 9.
+    """
+
+    def execute(self, municipalities_filenames: list, column: str, rule: str = 'queen', permutations: int = 999,
+                significance: float = 0.05, seed: int = 0, cache_path: str = None, output_filename: str = None,
+                store_path: str = None):
+        """
+        Executes the analysis.
+
+        :param municipalities_filenames: The municipality GeoJSON(s) (from FetchMunicipalitiesUseCase);
+            several files (e.g. every state) are analysed as one nationwide graph.
+        :param column: The numeric property to analyse (e.g. 'population').
+        :param rule: 'queen' (neighbors share any boundary point) or 'rook' (a boundary segment).
+        :param permutations: The number of random permutations of the significance tests.
+        :param significance: The p-value up to which a local cluster is reported.
+        :param seed: The random seed; the same inputs and seed always give the same p-values.
+        :param cache_path: Where to persist the contiguity graph (.npz). Defaults to no persistence.
+        :param output_filename: Where to save the GeoJSON when a single file is analysed.
+            Defaults to overwriting the input file(s).
+        :param store_path: The GeoPackage store to upsert the updated municipalities into, so
+            the maps that read from it see the new columns. Defaults to no store.
+        """
+        if rule not in CONTIGUITY_RULES:
+            print(f"ERROR: Unknown contiguity rule '{rule}'. Use one of: {', '.join(CONTIGUITY_RULES)}.")
+            return
+        if isinstance(municipalities_filenames, str):
+            municipalities_filenames = [municipalities_filenames]
+        municipalities_filenames = [resolve_dataset_path(path) for path in municipalities_filenames]
+
+        print(f"\n--- Starting spatial analysis of '{column}' ({len(municipalities_filenames)} file(s), {rule} contiguity) ---")
+        graph = ContiguityGraph.build_or_load(cache_path, municipalities_filenames, rule)
+        isolated = int((graph.degree == 0).sum())
+        print(f"  -> {len(graph):,} municipalities, {len(graph.indices) // 2:,} neighbor pairs ({isolated} without neighbors)")
+
+        features_per_file = []
+        codes, values = [], []
+        for path in municipalities_filenames:
+            with open_dataset(path, binary=True) as f:
+                features = list(iter_features(f))
+            features_per_file.append(features)
+            for feature in features:
+                properties = feature['properties']
+                value = properties.get(column)
+                codes.append(int(properties.get('codarea') or -1))
+                values.append(float(value) if isinstance(value, (int, float)) else np.nan)
+        if all(np.isnan(values)):
+            print(f"ERROR: Column '{column}' not found (or not numeric) in the municipality file(s).")
+            return
+
+        x = graph.align(codes, values)
+        try:
+            global_result = global_morans_i(graph, x, permutations=permutations, seed=seed)
+            local_result = local_morans_i(graph, x, permutations=permutations, seed=seed, significance=significance)
+        except ValueError as e:
+            print(f"ERROR: {e}")
+            return
+        print(f"  -> Global Moran's I = {global_result['I']:.4f} (expected {global_result['expected_I']:.4f}, "
+              f"pseudo p-value {global_result['p_value']:.4f}, {permutations} permutations)")
+        clusters = np.bincount(local_result['cluster'], minlength=len(LISA_LABELS))
+        print("  -> LISA clusters (p <= {:g}): {}".format(
+            significance, ", ".join(f"{LISA_LABELS[code]}: {clusters[code]}" for code in sorted(LISA_LABELS) if code)))
+
+        # Posição de cada feição no grafo (códigos ordenados + searchsorted, como na agregação de registros).
+        order = np.argsort(graph.codes)
+        outputs = {
+            f"{column}_lag": local_result['lag'],
+            f"{column}_lisa_i": local_result['I'],
+            f"{column}_lisa_p": local_result['p_value'],
+        }
+        for path, features in zip(municipalities_filenames, features_per_file):
+            feature_codes = np.array([int(feature['properties'].get('codarea') or -1) for feature in features], dtype=np.int64)
+            positions = order[np.searchsorted(graph.codes, feature_codes, sorter=order).clip(0, len(order) - 1)]
+            matched = graph.codes[positions] == feature_codes
+            for feature, position, found in zip(features, positions, matched):
+                properties = feature['properties']
+                for name, result in outputs.items():
+                    properties[name] = float(result[position]) if found and not np.isnan(result[position]) else None
+                properties[f"{column}_lisa_cluster"] = int(local_result['cluster'][position]) if found else 0
+
+            target = output_filename if output_filename and len(municipalities_filenames) == 1 else path
+            save_geojson(features, target)
+            upsert_into_store('municipalities', features, store_path)
+            print(f"  -> Saved: {os.path.basename(target)}")
+
+        print(f"\n✅ Process finished. Columns '{column}_lag', '{column}_lisa_i', '{column}_lisa_p' and '{column}_lisa_cluster' saved.")